@@ -0,0 +1,159 @@
+import io
+import time
+import threading
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+
+class BandwidthScheduler:
+    """Shapes upload traffic to a global cap and per-platform caps (bytes/s, 0 = unlimited).
+
+    Every chunk of every request body books its own time slot on the global link and on its
+    platform's link, in arrival order. Transfers interleave chunk by chunk, so ten concurrent
+    uploads each get about a tenth of the line and one huge video can't starve the rest.
+    """
+
+    CHUNK = 64 * 1024
+    REPORT_INTERVAL = 2.0  # Seconds between progress lines for one transfer
+    REPORT_MIN_BYTES = 1024 * 1024  # Smaller bodies (API calls, thumbnails) only count towards the caps
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_rate = 0
+        self.rates = {}
+        self.next_free = {}  # link -> monotonic time its next byte may go out
+        self.local = threading.local()
+
+    def configure(self, total_rate=0, rates=None):
+        with self.lock:
+            self.total_rate = total_rate or 0
+            self.rates = {key: rate for key, rate in (rates or {}).items() if rate}
+
+    def reserve(self, key, nbytes, stop=None):
+        """Block until nbytes may be sent on key's link; returns the seconds spent waiting"""
+        with self.lock:
+            now = time.monotonic()
+            links = [(link, rate) for link, rate in [(None, self.total_rate), (key, self.rates.get(key, 0))] if rate]
+            if not links:
+                return 0.0
+            start = max([now] + [self.next_free.get(link, 0) for link, _ in links])
+            for link, rate in links:
+                self.next_free[link] = start + nbytes / rate
+        waited = start - now
+        while True:
+            remaining = start - time.monotonic()
+            if remaining <= 0:
+                return max(0.0, waited)
+            if stop and stop():
+                raise IOError("upload cancelled")
+            time.sleep(min(remaining, 0.2))
+
+    @contextmanager
+    def label(self, name, status=None, stop=None):
+        """Name the transfers this thread starts and say where their progress goes and when they stop.
+
+        Kept per thread rather than per session, so a session can outlive the run that logged it in.
+        """
+        previous = getattr(self.local, 'context', None)
+        self.local.context = (name, status, stop)
+        try:
+            yield
+        finally:
+            self.local.context = previous
+
+    def transfer(self, key, total, status=None, stop=None):
+        name, context_status, context_stop = getattr(self.local, 'context', None) or (None, None, None)
+        return Transfer(self, key, name or key, total, context_status or status, context_stop or stop)
+
+    def session(self, key, status=None, stop=None, session=None):
+        """A requests session (new, or an SDK's own) whose request bodies go through this scheduler"""
+        session = session or requests.Session()
+        adapter = MeteredAdapter(self, key, status, stop)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+class Transfer:
+    """Paces one upload through the scheduler and reports its rate and ETA"""
+
+    def __init__(self, scheduler, key, label, total, status, stop):
+        self.scheduler = scheduler
+        self.key = key
+        self.label = label
+        self.total = total
+        self.status = status if total >= scheduler.REPORT_MIN_BYTES else None
+        self.stop = stop
+        self.sent = 0
+        self.throttled = 0.0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.lock = threading.Lock()  # Multipart uploads send parts from several threads
+
+    def send(self, nbytes):
+        waited = self.scheduler.reserve(self.key, nbytes, self.stop)
+        with self.lock:
+            self.throttled += waited
+            self.sent += nbytes
+            now = time.monotonic()
+            if not (self.status and now - self.last_report >= self.scheduler.REPORT_INTERVAL and self.sent < self.total):
+                return
+            self.last_report = now
+            rate = self.sent / max(now - self.started, 1e-6)
+            eta = (self.total - self.sent) / rate if rate else 0
+            self.status(f"↑ {self.label} ({self.key}): {self.sent/1024/1024:.1f}/{self.total/1024/1024:.1f}MB "
+                        f"at {rate/1024/1024:.2f}MB/s, ETA {eta:.0f}s")
+
+    def finish(self):
+        if self.status:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            line = (f"↑ {self.label} ({self.key}): {self.sent/1024/1024:.1f}MB in {elapsed:.1f}s "
+                    f"({self.sent/elapsed/1024/1024:.2f}MB/s")
+            if self.throttled >= 0.1:
+                line += f", {self.throttled:.1f}s held back by bandwidth caps"
+            self.status(line + ")")
+
+class MeteredBody:
+    """File-like request body that paces and counts every chunk as the connection reads it"""
+
+    def __init__(self, source, length, transfer):
+        self.source = source
+        self.length = length
+        self.transfer = transfer
+        self.done = False
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.transfer.scheduler.CHUNK:
+            size = self.transfer.scheduler.CHUNK
+        data = self.source.read(size)
+        if data:
+            self.transfer.send(len(data))
+        elif not self.done:
+            self.done = True
+            self.transfer.finish()
+        return data
+
+class MeteredAdapter(HTTPAdapter):
+    def __init__(self, scheduler, key, status=None, stop=None):
+        super().__init__()
+        self.scheduler = scheduler
+        self.key = key
+        self.status = status
+        self.stop = stop
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if isinstance(body, bytes):
+            transfer = self.scheduler.transfer(self.key, len(body), self.status, self.stop)
+            request.body = MeteredBody(io.BytesIO(body), len(body), transfer)
+        elif hasattr(body, 'read') and request.headers.get('Content-Length'):
+            length = int(request.headers['Content-Length'])
+            transfer = self.scheduler.transfer(self.key, length, self.status, self.stop)
+            request.body = MeteredBody(body, length, transfer)
+        return super().send(request, **kwargs)
+
+UPLOAD_SCHEDULER = BandwidthScheduler()
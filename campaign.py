@@ -0,0 +1,261 @@
+import os
+import csv
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QThread, Qt, pyqtSignal
+from poster import PostWorker, RateLimiter
+
+PLATFORM_NAMES = ['Twitter', 'Bluesky', 'Discord', 'Instagram', 'Reddit']
+DISCORD_MODES = ['attachments', 'embed', 'separate']
+
+class CampaignManifest:
+    """Posts listed in a CSV or JSONL file, one row per post"""
+
+    @staticmethod
+    def load(path):
+        rows = []
+        if os.path.splitext(path)[1].lower() in ['.jsonl', '.ndjson']:
+            with open(path, 'r', encoding='utf-8') as f:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        raw = json.loads(line)
+                    except ValueError as e:
+                        raw = {'error': f"invalid JSON: {e}"}
+                    rows.append(CampaignManifest.normalize_row(raw, number, path))
+        else:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                # Row numbers count the header line so they match what a spreadsheet shows
+                for number, raw in enumerate(csv.DictReader(f), 2):
+                    rows.append(CampaignManifest.normalize_row(raw, number, path))
+        return rows
+
+    @staticmethod
+    def split_list(value, separators):
+        """Lists come as JSON arrays or as separated strings in CSV cells"""
+        if isinstance(value, list):
+            return [str(item).strip() for item in value if str(item).strip()]
+        value = value or ''
+        for separator in separators[1:]:
+            value = value.replace(separator, separators[0])
+        return [item.strip() for item in value.split(separators[0]) if item.strip()]
+
+    @staticmethod
+    def normalize_row(raw, number, manifest_path):
+        row = {
+            'id': str(raw.get('id') or number),
+            'text': (raw.get('text') or '').strip(),
+            'media': [],
+            'platforms': [],
+            'discord_mode': (raw.get('discord_mode') or 'attachments').strip().lower(),
+            'discord_nitro': str(raw.get('discord_nitro', '')).strip().lower() in ['1', 'true', 'yes'],
+            # Post even to accounts the history says already have this exact post
+            'post_anyway': str(raw.get('post_anyway', '')).strip().lower() in ['1', 'true', 'yes'],
+            'time': None,
+            'error': raw.get('error')
+        }
+
+        # Relative media paths are relative to the manifest, so a content drop can be moved as a folder
+        base = os.path.dirname(os.path.abspath(manifest_path))
+        for path in CampaignManifest.split_list(raw.get('media'), [';', '|']):
+            row['media'].append(path if os.path.isabs(path) else os.path.join(base, path))
+
+        names = {name.lower(): name for name in PLATFORM_NAMES}
+        for platform in CampaignManifest.split_list(raw.get('platforms'), [',', ';']):
+            if platform.lower() not in names:
+                row['error'] = row['error'] or f"unknown platform '{platform}'"
+            else:
+                row['platforms'].append(names[platform.lower()])
+
+        if raw.get('time'):
+            try:
+                row['time'] = datetime.fromisoformat(str(raw['time']).strip())
+                if row['time'].tzinfo is not None:
+                    # Times with an offset are compared with local wall-clock times everywhere else
+                    row['time'] = row['time'].astimezone().replace(tzinfo=None)
+            except ValueError:
+                row['error'] = row['error'] or f"invalid time '{raw['time']}'"
+
+        if row['discord_mode'] not in DISCORD_MODES:
+            row['error'] = row['error'] or f"unknown discord_mode '{row['discord_mode']}'"
+        if not row['text'] and not row['error']:
+            row['error'] = "no text"
+        if not row['platforms'] and not row['error']:
+            row['error'] = "no platforms"
+        missing = [path for path in row['media'] if not os.path.exists(path)]
+        if missing and not row['error']:
+            row['error'] = f"missing media {os.path.basename(missing[0])}"
+        return row
+
+class CampaignProgress:
+    """Per-row outcomes saved next to the manifest, so an interrupted campaign resumes where it stopped"""
+
+    def __init__(self, manifest_path):
+        self.path = manifest_path + '.progress.json'
+        self.report_path = manifest_path + '.report.csv'
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                self.rows = json.load(f)
+        except:
+            self.rows = {}
+
+    def done(self, row_id):
+        return self.rows.get(row_id, {}).get('status') == 'success'
+
+    def update(self, row_id, record):
+        with self.lock:
+            self.rows[row_id] = record
+            # Write to a temporary file and swap it in, so a crash never leaves half a file behind
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.rows, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def write_report(self, rows):
+        with self.lock:
+            with open(self.report_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['id', 'status', 'results', 'started_at', 'finished_at', 'error'])
+                for row in rows:
+                    record = self.rows.get(row['id'], {})
+                    results = "; ".join(f"{platform}={status}" for platform, status in record.get('results', {}).items())
+                    writer.writerow([
+                        row['id'], record.get('status', 'not run'), results,
+                        record.get('started_at', ''), record.get('finished_at', ''), record.get('error', '')
+                    ])
+        return self.report_path
+
+class CampaignRunner(QThread):
+    status_update = pyqtSignal(str)
+    row_finished = pyqtSignal(str, str)  # row id, status
+    progress = pyqtSignal(int, int)  # rows finished, rows to run
+    finished = pyqtSignal()
+
+    def __init__(self, manifest_path, credentials, max_concurrent=2, min_interval=5.0):
+        super().__init__()
+        self.manifest_path = manifest_path
+        self.credentials = credentials
+        self.max_concurrent = max_concurrent  # Posts in flight at once
+        self.min_interval = min_interval  # Seconds between post starts across the whole campaign
+        self.rate_limiter = RateLimiter()
+        self.completed = 0
+        self.count_lock = threading.Lock()
+        self.active_workers = set()
+
+    def cancel(self):
+        """Stop starting rows and cancel the posts in progress as well"""
+        self.requestInterruption()
+        with self.count_lock:
+            for worker in self.active_workers:
+                worker.cancel()
+
+    def run(self):
+        try:
+            self.run_campaign()
+        except Exception as e:
+            self.status_update.emit(f"✗ Campaign stopped by an unexpected error: {str(e)}")
+        finally:
+            self.finished.emit()
+
+    def run_campaign(self):
+        try:
+            rows = CampaignManifest.load(self.manifest_path)
+        except Exception as e:
+            self.status_update.emit(f"✗ Could not read campaign manifest: {str(e)}")
+            return
+
+        progress = CampaignProgress(self.manifest_path)
+        todo = [row for row in rows if not progress.done(row['id'])]
+        self.status_update.emit(
+            f"Campaign {os.path.basename(self.manifest_path)}: {len(rows)} rows, "
+            f"{len(rows) - len(todo)} already posted, {len(todo)} to run"
+        )
+        # Rows go out in the order they are due: invalid rows to be reported and untimed rows at once
+        # in file order, timed rows a staging lead before their time
+        def wake_time(row):
+            if row['error'] or not row['time']:
+                return datetime.min
+            return row['time'] - timedelta(seconds=PostWorker.STAGE_LEAD)
+        todo.sort(key=wake_time)
+        self.progress.emit(0, len(todo))
+
+        # Waiting is done here, so a pool thread only ever holds a row that is ready to run
+        slots = threading.Semaphore(self.max_concurrent)
+        with ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='campaign') as executor:
+            for row in todo:
+                if not self.sleep_until(wake_time(row)) or not self.acquire_slot(slots):
+                    break
+                if not row['error']:
+                    self.rate_limiter.wait('campaign', self.min_interval)
+                    if self.isInterruptionRequested():
+                        slots.release()
+                        break
+                future = executor.submit(self.run_row, row, progress, len(todo))
+                future.add_done_callback(lambda future: slots.release())
+
+        report_path = progress.write_report(rows)
+        if self.isInterruptionRequested():
+            self.status_update.emit("⚠ Campaign stopped, run it again to resume")
+        self.status_update.emit(f"Campaign report written to {report_path}")
+
+    def sleep_until(self, when):
+        """Sleep in short steps so stopping the campaign doesn't wait for a far-off row"""
+        while not self.isInterruptionRequested():
+            remaining = (when - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 1.0))
+        return False
+
+    def acquire_slot(self, slots):
+        """Wait for a free pool thread, giving up if the campaign is stopped"""
+        while not self.isInterruptionRequested():
+            if slots.acquire(timeout=1.0):
+                return True
+        return False
+
+    def run_row(self, row, progress, total):
+        record = {'status': 'failed', 'results': {}, 'started_at': datetime.now().isoformat(timespec='seconds')}
+        if row['error']:
+            record['status'] = 'invalid'
+            record['error'] = row['error']
+            self.status_update.emit(f"✗ [{row['id']}] skipped: {row['error']}")
+        else:
+            self.status_update.emit(f"\n=== Campaign row {row['id']} ===")
+            try:
+                worker = PostWorker(
+                    row['text'], row['media'], row['platforms'], self.credentials,
+                    discord_nitro=row['discord_nitro'],
+                    discord_separate_messages=row['discord_mode'] == 'separate',
+                    discord_embed_mode=row['discord_mode'] == 'embed',
+                    scheduled_time=row['time'],
+                    post_anyway=row['post_anyway']
+                )
+                # Run the engine on this pool thread; direct connections deliver its signals right here
+                worker.status_update.connect(
+                    lambda message: self.status_update.emit(f"[{row['id']}] {message}"), Qt.ConnectionType.DirectConnection)
+                worker.results_ready.connect(record['results'].update, Qt.ConnectionType.DirectConnection)
+                with self.count_lock:
+                    self.active_workers.add(worker)
+                try:
+                    worker.run()
+                finally:
+                    with self.count_lock:
+                        self.active_workers.discard(worker)
+                if record['results'] and all(status in ['success', 'skipped'] for status in record['results'].values()):
+                    record['status'] = 'success'
+            except Exception as e:
+                record['error'] = str(e)
+                self.status_update.emit(f"✗ [{row['id']}] failed: {str(e)}")
+
+        record['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        progress.update(row['id'], record)
+        self.row_finished.emit(row['id'], record['status'])
+        with self.count_lock:
+            self.completed += 1
+            self.progress.emit(self.completed, total)
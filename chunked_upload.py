@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from run_metrics import note_retry
+
+class UploadExpired(Exception):
+    """The platform no longer knows an upload session, so the file has to be sent again from the start"""
+
+def with_retries(call, label, status=None, stop=None, retries=5, backoff=1.0):
+    """Run call(), retrying failures with exponential backoff and jitter.
+
+    UploadExpired and a true stop() are never retried; the last failure is raised once the
+    retries are used up.
+    """
+    for attempt in range(retries + 1):
+        if stop and stop():
+            raise IOError("upload cancelled")
+        try:
+            return call()
+        except UploadExpired:
+            raise
+        except Exception as e:
+            if attempt == retries or (stop and stop()):
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.75, 1.25)
+            note_retry()
+            if status:
+                status(f"⚠ {label} failed ({str(e)}), retrying in {delay:.0f}s ({attempt + 1}/{retries})")
+            end = time.monotonic() + delay
+            while time.monotonic() < end:
+                if stop and stop():
+                    raise IOError("upload cancelled")
+                time.sleep(min(0.2, end - time.monotonic()))
+
+class UploadSessions:
+    """Chunked uploads in flight, kept on disk so an interrupted transfer resumes where it stopped.
+
+    Entries are keyed by destination and file content and hold the platform's upload id, the
+    chunk size, when the platform forgets the upload, and the checksum of every chunk it has
+    acknowledged. The file is replaced atomically after each acknowledged chunk.
+    """
+
+    MAX_AGE = 24 * 3600  # For platforms that don't say how long they keep an unfinished upload
+
+    def __init__(self, path='upload_sessions.json'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def ensure_loaded(self):
+        """Read the file on first use, dropping expired uploads (called with the lock held)"""
+        if self.entries is not None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        now = time.time()
+        self.entries = {key: entry for key, entry in entries.items() if entry.get('expires', 0) > now}
+
+    def save(self):
+        """Called with the lock held"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self.lock:
+            self.ensure_loaded()
+            entry = self.entries.get(key)
+            if entry is None or entry.get('expires', 0) <= time.time():
+                return None
+            return json.loads(json.dumps(entry))
+
+    def put(self, key, entry):
+        try:
+            with self.lock:
+                self.ensure_loaded()
+                self.entries[key] = entry
+                self.save()
+        except OSError:
+            pass  # Only resuming is lost, the upload itself carries on
+
+    def drop(self, key):
+        try:
+            with self.lock:
+                self.ensure_loaded()
+                if self.entries.pop(key, None) is not None:
+                    self.save()
+        except OSError:
+            pass
+
+UPLOAD_SESSIONS = UploadSessions()
+
+class ResumableUpload:
+    """Sends a file in checksummed chunks through a platform's start/append/finish calls.
+
+    start(size) returns (upload id, expiry timestamp); append(upload_id, index, data) sends one
+    chunk and returns whatever finish needs to know about it; finish(upload_id, acks) completes
+    the upload and returns its result. Each call is retried on its own, so a dropped connection
+    costs one chunk. The state after each acknowledged chunk is saved, so an interrupted upload
+    of the same file to the same destination carries on from there. An append or finish raising
+    UploadExpired starts the upload over once.
+    """
+
+    def __init__(self, key, filepath, chunk_size, start, append, finish, status=None, stop=None, sessions=None):
+        self.key = key
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.start = start
+        self.append = append
+        self.finish = finish
+        self.status = status or (lambda message: None)
+        self.stop = stop
+        self.sessions = sessions or UPLOAD_SESSIONS
+
+    @staticmethod
+    def checksum(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def read_chunk(self, f, index):
+        f.seek(index * self.chunk_size)
+        return f.read(self.chunk_size)
+
+    def saved_entry(self, f, size):
+        """The saved state for this upload, trimmed to the chunks that still match the file"""
+        entry = self.sessions.get(self.key)
+        if entry is None:
+            return None
+        if entry['size'] != size or entry['chunk_size'] != self.chunk_size:
+            self.sessions.drop(self.key)
+            return None
+        for index, digest in enumerate(entry['checksums']):
+            if self.checksum(self.read_chunk(f, index)) != digest:
+                del entry['checksums'][index:]
+                del entry['acks'][index:]
+                break
+        return entry
+
+    def run(self):
+        name = os.path.basename(self.filepath)
+        size = os.path.getsize(self.filepath)
+        chunks = max(1, -(-size // self.chunk_size))
+        with open(self.filepath, 'rb') as f:
+            entry = self.saved_entry(f, size)
+            for attempt in range(2):
+                if entry is None:
+                    upload_id, expires = with_retries(lambda: self.start(size), f"Starting upload of {name}",
+                                                      self.status, self.stop)
+                    entry = {'upload': upload_id, 'size': size, 'chunk_size': self.chunk_size,
+                             'expires': expires, 'checksums': [], 'acks': []}
+                    self.sessions.put(self.key, entry)
+                elif entry['checksums']:
+                    done = len(entry['checksums'])
+                    self.status(f"Resuming upload of {name} at chunk {done + 1}/{chunks} "
+                                f"({min(done * self.chunk_size, size)/1024/1024:.1f}/{size/1024/1024:.1f}MB already sent)")
+                try:
+                    for index in range(len(entry['checksums']), chunks):
+                        data = self.read_chunk(f, index)
+                        ack = with_retries(lambda: self.append(entry['upload'], index, data),
+                                           f"Chunk {index + 1}/{chunks} of {name}", self.status, self.stop)
+                        entry['checksums'].append(self.checksum(data))
+                        entry['acks'].append(ack)
+                        self.sessions.put(self.key, entry)
+                    result = with_retries(lambda: self.finish(entry['upload'], entry['acks']),
+                                          f"Finishing upload of {name}", self.status, self.stop)
+                except UploadExpired as e:
+                    self.sessions.drop(self.key)
+                    if attempt:
+                        raise
+                    self.status(f"⚠ Upload session for {name} is gone ({str(e)}), sending it again")
+                    entry = None
+                    continue
+                self.sessions.drop(self.key)
+                return result
@@ -0,0 +1,148 @@
+import math
+import sqlite3
+import threading
+from datetime import datetime
+
+class CompressionModel:
+    """Predicts starting compression settings from how past encodes turned out.
+
+    Every trial encode is stored in compression_history.db with its input features and the size
+    it produced. Two small least-squares fits are refitted from the latest samples as they come in:
+
+    - JPEG: log(bytes per pixel) from quality, image entropy and log(pixel count)
+    - Video: log(actual size / size the bitrate asked for) from log(pixel count) and log(bitrate)
+
+    Until a kind has MIN_SAMPLES samples, predictions are None and callers keep their heuristics.
+    """
+
+    MIN_SAMPLES = 12
+    MAX_SAMPLES = 2000  # Most recent samples used for a fit, so the model follows the media as it changes
+    REFIT_EVERY = 10  # New samples before a kind is refitted
+    RIDGE = 1e-3  # Keeps the fit stable while samples are few or alike
+    SAFETY = 0.95  # Aim this far under a byte limit, predictions are not exact
+
+    def __init__(self, db_path='compression_history.db'):
+        self.db_path = db_path
+        self.conn = None
+        self.lock = threading.Lock()
+        self.weights = {}  # kind -> coefficients, or None when there isn't enough history yet
+        self.unfitted = {}  # kind -> samples recorded since the last fit
+
+    def ensure_open(self):
+        """Open the store on first use (called with the lock held)"""
+        if self.conn is not None:
+            return
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS samples (
+                kind TEXT NOT NULL,
+                entropy REAL,
+                pixels INTEGER NOT NULL,
+                duration REAL,
+                setting REAL NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS samples_kind ON samples (kind, rowid)")
+        self.conn.commit()
+
+    @staticmethod
+    def features(kind, entropy, pixels, duration, setting):
+        if kind == 'jpeg':
+            return [1.0, setting, entropy or 0.0, math.log(max(pixels, 1))]
+        return [1.0, math.log(max(pixels, 1)), math.log(max(setting, 1))]
+
+    @staticmethod
+    def target(kind, pixels, duration, setting, size):
+        if kind == 'jpeg':
+            return math.log(max(size, 1) / max(pixels, 1))
+        asked = setting * 1000 / 8 * max(duration or 0, 0.1)
+        return math.log(max(size, 1) / asked)
+
+    @staticmethod
+    def solve(rows, values, ridge):
+        """Least squares with a small ridge term, by Gaussian elimination on the normal equations"""
+        n = len(rows[0])
+        matrix = [[sum(row[i] * row[j] for row in rows) + (ridge if i == j and i > 0 else 0.0) for j in range(n)]
+                  + [sum(row[i] * value for row, value in zip(rows, values))] for i in range(n)]
+        for col in range(n):
+            pivot = max(range(col, n), key=lambda r: abs(matrix[r][col]))
+            if abs(matrix[pivot][col]) < 1e-12:
+                return None
+            matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+            for r in range(n):
+                if r != col:
+                    factor = matrix[r][col] / matrix[col][col]
+                    matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+        return [matrix[i][n] / matrix[i][i] for i in range(n)]
+
+    def record(self, kind, samples):
+        """Store samples of (entropy, pixels, duration, setting, size) for a kind ('jpeg' or 'video')"""
+        if not samples:
+            return
+        now = datetime.now().isoformat(timespec='seconds')
+        try:
+            with self.lock:
+                self.ensure_open()
+                self.conn.executemany(
+                    "INSERT INTO samples (kind, entropy, pixels, duration, setting, size, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(kind, entropy, pixels, duration, setting, size, now) for entropy, pixels, duration, setting, size in samples])
+                self.conn.commit()
+                self.unfitted[kind] = self.unfitted.get(kind, 0) + len(samples)
+        except sqlite3.Error:
+            pass  # Learning is an optimisation, compression never fails over it
+
+    def coefficients(self, kind):
+        try:
+            with self.lock:
+                if kind in self.weights and self.unfitted.get(kind, 0) < self.REFIT_EVERY:
+                    return self.weights[kind]
+                self.ensure_open()
+                samples = self.conn.execute("""
+                    SELECT entropy, pixels, duration, setting, size FROM samples
+                    WHERE kind = ? ORDER BY rowid DESC LIMIT ?
+                """, (kind, self.MAX_SAMPLES)).fetchall()
+                weights = None
+                if len(samples) >= self.MIN_SAMPLES:
+                    rows = [self.features(kind, *sample[:4]) for sample in samples]
+                    values = [self.target(kind, *sample[1:]) for sample in samples]
+                    weights = self.solve(rows, values, self.RIDGE)
+                self.weights[kind] = weights
+                self.unfitted[kind] = 0
+                return weights
+        except sqlite3.Error:
+            return None
+
+    def jpeg_log_bpp(self, weights, quality, entropy, pixels):
+        return sum(w * x for w, x in zip(weights, self.features('jpeg', entropy, pixels, None, quality)))
+
+    def jpeg_quality(self, max_size, entropy, pixels, min_quality=60, max_quality=95):
+        """Highest JPEG quality predicted to fit max_size at this pixel count, or None"""
+        weights = self.coefficients('jpeg')
+        if not weights or weights[1] <= 0:
+            return None  # Size has to grow with quality for the prediction to mean anything
+        base = self.jpeg_log_bpp(weights, 0, entropy, pixels)
+        quality = (math.log(max_size * self.SAFETY / max(pixels, 1)) - base) / weights[1]
+        return int(max(min_quality, min(max_quality, math.floor(quality))))
+
+    def jpeg_scale(self, max_size, entropy, pixels, quality=85):
+        """Scale of the full image predicted to fit max_size as a JPEG at quality, or None"""
+        weights = self.coefficients('jpeg')
+        if not weights:
+            return None
+        scale = 1.0
+        # Bytes per pixel depend on the pixel count being solved for, a few rounds settle it
+        for _ in range(3):
+            bpp = math.exp(self.jpeg_log_bpp(weights, quality, entropy, pixels * scale * scale))
+            scale = min(1.0, (max_size * self.SAFETY / bpp / max(pixels, 1)) ** 0.5)
+        return scale
+
+    def video_overshoot(self, pixels, kbps):
+        """Predicted actual size over the size a bitrate asks for (audio, container, rate control), or None"""
+        weights = self.coefficients('video')
+        if not weights:
+            return None
+        return math.exp(sum(w * x for w, x in zip(weights, self.features('video', None, pixels, None, kbps))))
+
+COMPRESSION_MODEL = CompressionModel()
@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import uuid
+import signal
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from PyQt6.QtCore import Qt
+from poster import PostWorker, ClientPool
+from campaign import CampaignManifest
+from memory_budget import MEMORY_GOVERNOR
+from run_journal import RUN_JOURNAL
+from chunked_upload import UPLOAD_SESSIONS
+
+class PostJob:
+    """One post submitted through the API, with the progress events it has produced so far"""
+
+    MAX_EVENTS = 2000
+
+    def __init__(self, job_id, row):
+        self.id = job_id
+        self.row = row
+        self.state = 'queued'  # queued / scheduled / running / done / cancelled
+        self.results = {}
+        self.error = None
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.started_at = None
+        self.finished_at = None
+        self.worker = None
+        self.timer = None
+        self.cancelled = False
+        self.events = []
+        self.first_seq = 0  # Sequence number of events[0] once old events are dropped
+        self.condition = threading.Condition()
+
+    def emit(self, kind, data):
+        with self.condition:
+            self.events.append({'seq': self.first_seq + len(self.events), 'type': kind,
+                                'time': datetime.now().isoformat(timespec='seconds'), 'data': data})
+            if len(self.events) > self.MAX_EVENTS:
+                drop = len(self.events) - self.MAX_EVENTS
+                self.events = self.events[drop:]
+                self.first_seq += drop
+            self.condition.notify_all()
+
+    def set_state(self, state):
+        self.state = state
+        if state == 'running':
+            self.started_at = datetime.now().isoformat(timespec='seconds')
+        elif state in ['done', 'cancelled']:
+            self.finished_at = datetime.now().isoformat(timespec='seconds')
+        self.emit('state', state)
+
+    def finished(self):
+        return self.state in ['done', 'cancelled']
+
+    def events_since(self, seq):
+        with self.condition:
+            return [event for event in self.events if event['seq'] >= seq]
+
+    def wait_for_events(self, seq, timeout):
+        with self.condition:
+            if self.first_seq + len(self.events) <= seq and not self.finished():
+                self.condition.wait(timeout)
+
+    def to_dict(self):
+        row = self.row
+        return {
+            'id': self.id,
+            'state': self.state,
+            'results': self.results,
+            'error': self.error,
+            'text': row['text'],
+            'media': row['media'],
+            'platforms': row['platforms'],
+            'time': row['time'].isoformat() if row['time'] else None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class PostingService:
+    """Runs submitted posts on a bounded pool of workers that share warm, logged-in clients"""
+
+    MAX_FINISHED_JOBS = 500  # Finished jobs kept for status queries
+
+    def __init__(self, credentials_path='social_credentials.json', max_workers=4):
+        self.credentials_path = credentials_path
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='post')
+        self.clients = ClientPool()
+        self.jobs = {}
+        self.order = []
+        self.lock = threading.Lock()
+
+    def load_credentials(self):
+        # Read per job, so credentials edited in the GUI apply without restarting the service
+        with open(self.credentials_path, 'r') as f:
+            return json.load(f)
+
+    def submit(self, payload):
+        """Validate a post request and queue it. Returns (job, created)"""
+        job_id = str(payload.get('id') or uuid.uuid4().hex[:12])
+        with self.lock:
+            if job_id in self.jobs:
+                # Resubmitting the same id (e.g. a retried webhook) returns the existing job
+                return self.jobs[job_id], False
+
+        # Relative media paths are resolved against the service's working directory
+        row = CampaignManifest.normalize_row(dict(payload, id=job_id), 1, os.path.join(os.getcwd(), 'api'))
+        if row['error']:
+            raise ValueError(row['error'])
+
+        job = PostJob(job_id, row)
+        with self.lock:
+            self.jobs[job_id] = job
+            self.order.append(job_id)
+            self.prune()
+
+        # Scheduled jobs start early enough to have everything uploaded when they are due
+        delay = (row['time'] - datetime.now()).total_seconds() - PostWorker.STAGE_LEAD if row['time'] else 0
+        if delay > 0:
+            # Until then they wait on a timer, not on a pool worker
+            job.set_state('scheduled')
+            job.timer = threading.Timer(delay, self.start, args=(job,))
+            job.timer.daemon = True
+            job.timer.start()
+        else:
+            self.start(job)
+        return job, True
+
+    def start(self, job):
+        if job.cancelled:
+            return
+        job.set_state('queued')
+        self.pool.submit(self.run_job, job)
+
+    def run_job(self, job):
+        if job.cancelled:
+            return
+        job.set_state('running')
+        row = job.row
+        try:
+            worker = PostWorker(
+                row['text'], row['media'], row['platforms'], self.load_credentials(),
+                discord_nitro=row['discord_nitro'],
+                discord_separate_messages=row['discord_mode'] == 'separate',
+                discord_embed_mode=row['discord_mode'] == 'embed',
+                scheduled_time=row['time'],
+                clients=self.clients,
+                post_anyway=row['post_anyway']
+            )
+            # The worker runs on this pool thread; direct connections deliver its signals right here
+            worker.status_update.connect(lambda message: job.emit('status', message), Qt.ConnectionType.DirectConnection)
+            worker.results_ready.connect(job.results.update, Qt.ConnectionType.DirectConnection)
+            job.worker = worker
+            if job.cancelled:
+                worker.cancel()
+            worker.run()
+        except Exception as e:
+            job.error = str(e)
+            job.emit('status', f"✗ Job failed: {str(e)}")
+        finally:
+            job.worker = None
+        job.emit('results', job.results)
+        job.set_state('cancelled' if job.cancelled else 'done')
+
+    def cancel(self, job):
+        job.cancelled = True
+        if job.timer:
+            job.timer.cancel()
+        if job.worker:
+            job.worker.cancel()
+        elif not job.finished() and job.state != 'running':
+            job.set_state('cancelled')
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self, limit=50):
+        with self.lock:
+            return [self.jobs[job_id] for job_id in reversed(self.order[-limit:])]
+
+    def prune(self):
+        # Called with the lock held; the oldest finished jobs go first
+        finished = [job_id for job_id in self.order if self.jobs[job_id].finished()]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+            self.order.remove(job_id)
+
+    def shutdown(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            if not job.finished():
+                self.cancel(job)
+        self.pool.shutdown(wait=True)
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Local REST API:
+
+    POST   /posts              submit {text, media, platforms, discord_mode, discord_nitro, post_anyway, time, id}
+    GET    /posts              recent jobs
+    GET    /posts/<id>         job status and per-platform results
+    GET    /posts/<id>/events  progress as server-sent events (?since=<seq> to resume a stream)
+    DELETE /posts/<id>         cancel
+    GET    /health             liveness and memory budget usage
+    """
+
+    server_version = "SocialPoster/1.0"
+    KEEPALIVE = 15  # Seconds between comments on an idle event stream, so proxies keep it open
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        token = self.server.api_token
+        if token and self.headers.get('Authorization') != f"Bearer {token}":
+            self.send_json(401, {'error': 'unauthorized'})
+            return False
+        return True
+
+    def route(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        job = None
+        if len(parts) >= 2 and parts[0] == 'posts':
+            job = self.server.service.get(parts[1])
+            if job is None:
+                self.send_json(404, {'error': f"no job {parts[1]}"})
+                return parts, None, False
+        return parts, job, True
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        parts, job, found = self.route()
+        if not found:
+            return
+        if parts == ['health']:
+            self.send_json(200, {'status': 'ok', 'memory': MEMORY_GOVERNOR.usage()})
+        elif parts == ['posts']:
+            self.send_json(200, {'jobs': [job.to_dict() for job in self.server.service.list()]})
+        elif len(parts) == 2 and parts[0] == 'posts':
+            self.send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'posts' and parts[2] == 'events':
+            self.stream_events(job)
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        if urlparse(self.path).path.rstrip('/') != '/posts':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+            job, created = self.server.service.submit(payload)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        self.send_json(202 if created else 200, job.to_dict())
+
+    def do_DELETE(self):
+        if not self.authorized():
+            return
+        parts, job, found = self.route()
+        if not found:
+            return
+        if len(parts) != 2:
+            self.send_json(404, {'error': 'not found'})
+            return
+        self.server.service.cancel(job)
+        self.send_json(202, job.to_dict())
+
+    def stream_events(self, job):
+        try:
+            seq = int(parse_qs(urlparse(self.path).query).get('since', ['0'])[0])
+        except ValueError:
+            seq = 0
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            while True:
+                events = job.events_since(seq)
+                for event in events:
+                    self.wfile.write(f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode('utf-8'))
+                    seq = event['seq'] + 1
+                if events:
+                    self.wfile.flush()
+                elif job.finished():
+                    return
+                else:
+                    job.wait_for_events(seq, self.KEEPALIVE)
+                    if not job.events_since(seq) and not job.finished():
+                        self.wfile.write(b": keepalive\n\n")
+                        self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away, the job carries on
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, api_token=None):
+        super().__init__(address, ApiHandler)
+        self.service = service
+        self.api_token = api_token
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless posting service with a local REST API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=4, help="posts running at once")
+    parser.add_argument('--credentials', default='social_credentials.json')
+    parser.add_argument('--token', default=os.environ.get('SOCIAL_POSTER_TOKEN'),
+                        help="require 'Authorization: Bearer <token>' (default: $SOCIAL_POSTER_TOKEN)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.credentials):
+        print(f"✗ {args.credentials} not found, set up credentials in the GUI first")
+        return 1
+    if args.host not in ['127.0.0.1', 'localhost', '::1'] and not args.token:
+        print("⚠ Listening beyond localhost without --token: anyone who can reach this port can post")
+
+    # The GUI may be open on the same folder; the service keeps its own journal and upload sessions
+    RUN_JOURNAL.path = 'run_journal.daemon.jsonl'
+    UPLOAD_SESSIONS.path = 'upload_sessions.daemon.json'
+    service = PostingService(args.credentials, args.workers)
+    server = ApiServer((args.host, args.port), service, args.token)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"Posting service on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Stopping, cancelling posts in progress...")
+        server.server_close()
+        service.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,57 @@
 import os
 import json
 from datetime import datetime
+from collections import OrderedDict
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QTextEdit, QPushButton, QLabel, 
                             QCheckBox, QLineEdit, QGroupBox, QMessageBox,
                             QFileDialog, QListWidget, QDateTimeEdit, QTabWidget,
-                            QDialog, QScrollArea)
-from PyQt6.QtCore import Qt, QDateTime
-from poster import PostWorker
+                            QDialog, QScrollArea, QListView, QAbstractItemView,
+                            QTableWidget, QTableWidgetItem, QToolTip, QSpinBox,
+                            QDoubleSpinBox, QInputDialog)
+from PyQt6.QtCore import (Qt, QDateTime, QSize, QThread, QObject, pyqtSignal,
+                          QAbstractListModel, QModelIndex, QThreadPool, QRunnable, QTimer, QRect, QEvent)
+from PyQt6.QtGui import QImage, QImageReader, QPixmap, QIcon, QPainter, QColor, QPen
+from poster import PostWorker, PRE_ENCODER
+from media_probe import ProbePool, MediaProbe, VIDEO_EXTENSIONS
+from media_library import MediaLibrary
+from campaign import CampaignRunner
+from run_journal import RUN_JOURNAL
+from memory_budget import MEMORY_GOVERNOR
+from run_metrics import MetricsStore
 
 class SocialPoster(QMainWindow):
+    HISTORY_RUNS = 20  # Runs summarised in the performance panel
+    
     def __init__(self):
         super().__init__()
         self.credentials = self.load_credentials()
+        self.apply_memory_budget()
         self.platform_prefs = self.load_platform_prefs()
         self.media_files = []
         self.platform_checks = {}
         self.discord_nitro_check = None
         self.discord_separate_check = None
         self.discord_embed_check = None
+        self.probe_pool = ProbePool()
+        self.probe_pool.probed.connect(self.on_media_probed)
+        self.probe_pool.failed.connect(self.on_media_probe_failed)
+        self.media_library = MediaLibrary()
+        self.library_model = MediaLibraryModel(self.media_library)
+        self.scan_worker = None
+        self.campaign_worker = None
+        # Media is encoded for the selected platforms while the post is composed, after edits settle
+        self.pre_encode_timer = QTimer(self)
+        self.pre_encode_timer.setSingleShot(True)
+        self.pre_encode_timer.setInterval(500)
+        self.pre_encode_timer.timeout.connect(self.update_pre_encoding)
         self.init_ui()
         self.apply_dark_theme()
+        # Pick up anything that changed in the watched folders since the last session
+        if self.media_library.folders():
+            self.rescan_library()
+        # Once the window is up, offer to finish a post cut off by a crash or restart
+        QTimer.singleShot(0, self.offer_interrupted_runs)
     
     def init_ui(self):
         self.setWindowTitle("Multi-Social Poster")
@@ -76,6 +107,10 @@ class SocialPoster(QMainWindow):
         self.datetime_edit.setEnabled(False)
         self.schedule_check.toggled.connect(self.datetime_edit.setEnabled)
         schedule_layout.addWidget(self.datetime_edit)
+        
+        self.post_anyway_check = QCheckBox("Post anyway")
+        self.post_anyway_check.setToolTip("Post again to accounts that already have this exact text and media")
+        schedule_layout.addWidget(self.post_anyway_check)
         schedule_layout.addStretch()
         post_layout.addLayout(schedule_layout)
         
@@ -84,9 +119,88 @@ class SocialPoster(QMainWindow):
         self.post_button.clicked.connect(self.post_to_platforms)
         post_layout.addWidget(self.post_button)
         
+        self.cancel_button = QPushButton("Cancel Posting")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_posting)
+        post_layout.addWidget(self.cancel_button)
+        
+        # Campaign buttons
+        campaign_layout = QHBoxLayout()
+        self.campaign_button = QPushButton("Run Campaign...")
+        self.campaign_button.clicked.connect(self.run_campaign)
+        campaign_layout.addWidget(self.campaign_button)
+        
+        self.stop_campaign_button = QPushButton("Stop Campaign")
+        self.stop_campaign_button.setEnabled(False)
+        self.stop_campaign_button.clicked.connect(self.stop_campaign)
+        campaign_layout.addWidget(self.stop_campaign_button)
+        
+        campaign_layout.addWidget(QLabel("Posts at once:"))
+        self.campaign_concurrent = QSpinBox()
+        self.campaign_concurrent.setRange(1, 10)
+        self.campaign_concurrent.setValue(2)
+        campaign_layout.addWidget(self.campaign_concurrent)
+        
+        campaign_layout.addWidget(QLabel("Seconds between posts:"))
+        self.campaign_interval = QDoubleSpinBox()
+        self.campaign_interval.setRange(0, 3600)
+        self.campaign_interval.setValue(5.0)
+        campaign_layout.addWidget(self.campaign_interval)
+        post_layout.addLayout(campaign_layout)
+        
         post_layout.addStretch()
         self.tabs.addTab(post_tab, "Post")
         
+        # Library tab
+        library_tab = QWidget()
+        library_layout = QVBoxLayout(library_tab)
+        
+        library_buttons = QHBoxLayout()
+        add_folder_button = QPushButton("Watch Folder")
+        add_folder_button.clicked.connect(self.add_library_folder)
+        library_buttons.addWidget(add_folder_button)
+        
+        remove_folder_button = QPushButton("Remove Folder...")
+        remove_folder_button.clicked.connect(self.remove_library_folder)
+        library_buttons.addWidget(remove_folder_button)
+        
+        rescan_button = QPushButton("Rescan")
+        rescan_button.clicked.connect(self.rescan_library)
+        library_buttons.addWidget(rescan_button)
+        
+        self.library_search = QLineEdit()
+        self.library_search.setPlaceholderText("Filter by file name...")
+        self.library_search.textChanged.connect(self.library_model.set_query)
+        library_buttons.addWidget(self.library_search)
+        library_layout.addLayout(library_buttons)
+        
+        self.library_status = QLabel(f"{self.library_model.total} files in library")
+        self.library_status.setStyleSheet("color: #888888;")
+        library_layout.addWidget(self.library_status)
+        
+        # Icon grid that only asks the model for rows (and thumbnails) as they scroll into view
+        self.library_view = QListView()
+        self.library_view.setModel(self.library_model)
+        self.library_view.setViewMode(QListView.ViewMode.IconMode)
+        self.library_view.setMovement(QListView.Movement.Static)
+        self.library_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.library_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.library_view.setBatchSize(100)
+        self.library_view.setUniformItemSizes(True)
+        self.library_view.setIconSize(QSize(MediaLibraryModel.THUMB_SIZE, MediaLibraryModel.THUMB_SIZE))
+        self.library_view.setGridSize(QSize(MediaLibraryModel.THUMB_SIZE + 24, MediaLibraryModel.THUMB_SIZE + 40))
+        self.library_view.setWordWrap(True)
+        self.library_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.library_view.doubleClicked.connect(self.add_selected_library_media)
+        self.library_view.verticalScrollBar().valueChanged.connect(self.library_model.cancel_pending_thumbnails)
+        library_layout.addWidget(self.library_view)
+        
+        add_selected_button = QPushButton("Add Selected to Post")
+        add_selected_button.clicked.connect(self.add_selected_library_media)
+        library_layout.addWidget(add_selected_button)
+        
+        self.tabs.addTab(library_tab, "Library")
+        
         # Platforms tab
         platforms_tab = QWidget()
         platforms_layout = QVBoxLayout(platforms_tab)
@@ -167,13 +281,45 @@ class SocialPoster(QMainWindow):
         self.tabs.addTab(platforms_tab, "Platforms")
         
         # Status tab
-        status_tab = QWidget()
-        status_layout = QVBoxLayout(status_tab)
+        self.status_tab = QWidget()
+        status_layout = QVBoxLayout(self.status_tab)
         status_layout.addWidget(QLabel("Status:"))
         self.status_text = QTextEdit()
         self.status_text.setReadOnly(True)
         status_layout.addWidget(self.status_text)
-        self.tabs.addTab(status_tab, "Status")
+        self.tabs.addTab(self.status_tab, "Status")
+        
+        # Performance tab: where the current run's time goes, and which platforms and phases are slow lately
+        performance_tab = QWidget()
+        performance_layout = QVBoxLayout(performance_tab)
+        performance_layout.addWidget(QLabel("Current run (hover a bar for details):"))
+        self.waterfall = PerformanceWaterfall()
+        waterfall_scroll = QScrollArea()
+        waterfall_scroll.setWidgetResizable(True)
+        waterfall_scroll.setWidget(self.waterfall)
+        performance_layout.addWidget(waterfall_scroll, 2)
+        performance_layout.addWidget(QLabel("   ".join(
+            f"<span style='color: {color}'>■</span> {phase}" for phase, color in PerformanceWaterfall.COLORS.items()
+        ) + "   <span style='color: #ff6b6b'>□</span> failed"))
+        
+        history_header = QHBoxLayout()
+        history_header.addWidget(QLabel(f"Last {self.HISTORY_RUNS} runs (slowest in red):"))
+        history_header.addStretch()
+        refresh_history_button = QPushButton("Refresh")
+        refresh_history_button.clicked.connect(self.refresh_performance_history)
+        history_header.addWidget(refresh_history_button)
+        performance_layout.addLayout(history_header)
+        self.phase_table = QTableWidget(0, 9)
+        self.phase_table.setHorizontalHeaderLabels(
+            ["Platform", "Phase", "Count", "Mean (s)", "Worst (s)", "Upload MB/s", "Retries", "Failed", "Max queue"])
+        self.run_table = QTableWidget(0, 0)
+        for table in [self.phase_table, self.run_table]:
+            table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+            table.verticalHeader().setVisible(False)
+        performance_layout.addWidget(self.phase_table, 2)
+        performance_layout.addWidget(self.run_table, 1)
+        self.tabs.addTab(performance_tab, "Performance")
+        self.refresh_performance_history()
         
         main_layout.addWidget(self.tabs)
         
@@ -190,15 +336,86 @@ class SocialPoster(QMainWindow):
             "Media Files (*.jpg *.jpeg *.png *.gif *.mp4 *.mov *.webm)"
         )
         
+        self.add_media_files(files)
+    
+    def add_media_files(self, files):
         for filepath in files:
             if filepath not in self.media_files:
                 self.media_files.append(filepath)
-                size_mb = os.path.getsize(filepath) / (1024 * 1024)
-                self.media_list.addItem(f"{os.path.basename(filepath)} ({size_mb:.1f} MB)")
+                # Size and metadata are filled in by the probe pool so the window never blocks on disk
+                self.media_list.addItem(f"{os.path.basename(filepath)} (probing...)")
+                self.probe_pool.submit(filepath)
+        self.pre_encode_timer.start()
+    
+    def on_media_probed(self, filepath, info):
+        if filepath in self.media_files:
+            item = self.media_list.item(self.media_files.index(filepath))
+            item.setText(f"{os.path.basename(filepath)} ({MediaProbe.describe(info)})")
+    
+    def on_media_probe_failed(self, filepath, error):
+        if filepath in self.media_files:
+            item = self.media_list.item(self.media_files.index(filepath))
+            item.setText(f"{os.path.basename(filepath)} (⚠ could not read: {error})")
     
     def clear_media(self):
         self.media_files.clear()
         self.media_list.clear()
+        self.pre_encode_timer.start()
+    
+    def update_pre_encoding(self):
+        platforms = [name for name, checkbox in self.platform_checks.items() if checkbox.isChecked()]
+        PRE_ENCODER.update(self.media_files, platforms,
+                           self.discord_nitro_check.isChecked(), self.discord_embed_check.isChecked())
+    
+    def add_library_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder to Watch")
+        if folder:
+            watched = self.media_library.add_folder(folder)
+            if watched != os.path.abspath(folder):
+                self.library_status.setText(f"Already watched as part of {watched}")
+                return
+            self.rescan_library()
+    
+    def remove_library_folder(self):
+        folders = self.media_library.folders()
+        if not folders:
+            QMessageBox.information(self, "Remove Folder", "No folders are being watched.")
+            return
+        if self.scan_worker and self.scan_worker.isRunning():
+            QMessageBox.information(self, "Remove Folder", "Please wait for the library scan to finish.")
+            return
+        folder, ok = QInputDialog.getItem(self, "Remove Folder", "Stop watching:", folders, 0, False)
+        if ok and folder:
+            # Only the index entries go, the files themselves are left alone
+            self.media_library.remove_folder(folder)
+            self.library_model.reload()
+            self.library_status.setText(f"{self.library_model.total} files in library (stopped watching {folder})")
+    
+    def rescan_library(self):
+        if self.scan_worker and self.scan_worker.isRunning():
+            return
+        self.library_status.setText("Scanning watched folders...")
+        self.scan_worker = LibraryScanWorker(self.media_library)
+        self.scan_worker.progress.connect(self.on_library_scan_progress)
+        self.scan_worker.scan_done.connect(self.on_library_scan_done)
+        self.scan_worker.start()
+    
+    def on_library_scan_progress(self, changed, unchanged):
+        self.library_status.setText(f"Scanning... {changed} new or changed, {unchanged} unchanged")
+    
+    def on_library_scan_done(self, changed, removed, unchanged):
+        self.library_model.reload()
+        self.library_status.setText(
+            f"{self.library_model.total} files in library "
+            f"({changed} new or changed, {removed} removed, {unchanged} unchanged)"
+        )
+    
+    def add_selected_library_media(self):
+        files = [self.library_model.data(index, Qt.ItemDataRole.UserRole)
+                 for index in self.library_view.selectionModel().selectedIndexes()]
+        if files:
+            self.add_media_files(files)
+            self.tabs.setCurrentIndex(0)
     
     def on_discord_mode_changed(self):
         """Ensure only one Discord multiple image mode is selected"""
@@ -234,33 +451,207 @@ class SocialPoster(QMainWindow):
         if self.schedule_check.isChecked():
             scheduled_time = self.datetime_edit.dateTime().toPyDateTime()
         
-        self.post_button.setEnabled(False)
         self.status_text.clear()
-        self.tabs.setCurrentIndex(2)  # Switch to status tab
+        self.start_post_worker(content, list(self.media_files), selected_platforms, scheduled_time,
+                               post_anyway=self.post_anyway_check.isChecked())
+    
+    def start_post_worker(self, content, media_files, platforms, scheduled_time=None, discord_options=None, post_anyway=False):
+        self.post_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.tabs.setCurrentWidget(self.status_tab)
         
-        discord_nitro = self.discord_nitro_check.isChecked()
-        discord_separate = self.discord_separate_check.isChecked()
-        discord_embed = self.discord_embed_check.isChecked()
+        if discord_options:
+            discord_nitro, discord_separate, discord_embed = discord_options
+        else:
+            discord_nitro = self.discord_nitro_check.isChecked()
+            discord_separate = self.discord_separate_check.isChecked()
+            discord_embed = self.discord_embed_check.isChecked()
         
-        self.worker = PostWorker(content, self.media_files, selected_platforms, 
+        # Remembered so failed platforms can be retried with exactly the same post
+        self.last_post = (content, media_files)
+        self.last_results = {}
+        self.worker = PostWorker(content, media_files, platforms, 
                                self.credentials, scheduled_time, discord_nitro, 
-                               discord_separate, discord_embed)
+                               discord_separate, discord_embed, post_anyway=post_anyway)
         self.worker.status_update.connect(self.update_status)
+        self.waterfall.set_snapshot(None)
+        self.worker.metrics_update.connect(self.waterfall.set_snapshot)
+        self.worker.results_ready.connect(self.on_post_results)
         self.worker.finished.connect(self.on_posting_finished)
         self.worker.start()
     
+    def offer_interrupted_runs(self):
+        try:
+            runs = RUN_JOURNAL.interrupted()
+        except Exception as e:
+            self.update_status(f"⚠ Could not read the run journal: {str(e)}")
+            return
+        
+        for run in runs:
+            params = run['params']
+            started = datetime.fromtimestamp(run['started']).strftime('%Y-%m-%d %H:%M')
+            preview = params['content'] if len(params['content']) <= 80 else params['content'][:77] + "..."
+            answer = QMessageBox.question(
+                self, "Resume Interrupted Post",
+                f"A post started {started} to {', '.join(params['platforms'])} was interrupted:\n\n"
+                f"{preview}\n\nResume it? Media that was already uploaded will be reused."
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                missing = [path for path in params['media_files'] if not os.path.exists(path)]
+                if missing:
+                    QMessageBox.warning(self, "Warning", f"Media file not found: {missing[0]}")
+                    RUN_JOURNAL.discard(run['id'])
+                    continue
+                self.status_text.clear()
+                self.update_status(f"Resuming interrupted post from {started}")
+                self.start_post_worker(
+                    params['content'], params['media_files'], params['platforms'],
+                    discord_options=(params['discord_nitro'], params['discord_separate_messages'], params['discord_embed_mode']),
+                    post_anyway=bool(params.get('repost_since'))
+                )
+                # One post runs at a time, any other interrupted runs are offered next start
+                return
+            RUN_JOURNAL.discard(run['id'])
+    
     def update_status(self, message):
         self.status_text.append(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
     
+    def on_post_results(self, results):
+        self.last_results = results
+    
+    def refresh_performance_history(self):
+        try:
+            store = MetricsStore()
+            summary = store.summary(self.HISTORY_RUNS)
+            runs = store.runs(self.HISTORY_RUNS)
+            store.close()
+        except Exception as e:
+            self.update_status(f"⚠ Could not read run metrics: {str(e)}")
+            return
+        slow = QColor('#ff6b6b')
+        
+        # Waiting for a scheduled time isn't slowness, so it never counts as the slowest phase
+        slowest = max((row for row in summary if row['phase'] != 'wait'), key=lambda row: row['mean'], default=None)
+        self.phase_table.setRowCount(len(summary))
+        for i, row in enumerate(summary):
+            values = [
+                row['platform'], row['phase'], str(row['count']), f"{row['mean']:.1f}", f"{row['worst']:.1f}",
+                f"{row['throughput']/1024/1024:.2f}" if row['phase'] == 'upload' and row['throughput'] else '',
+                str(row['retries']), str(row['failed']), '' if row['queue'] is None else str(row['queue'])
+            ]
+            for j, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if row is slowest:
+                    item.setForeground(slow)
+                self.phase_table.setItem(i, j, item)
+        self.phase_table.resizeColumnsToContents()
+        
+        # One row per run, seconds each platform spent working; a platform with failed phases is marked ✗
+        platforms = sorted({platform for run in runs for platform in run['platforms']})
+        self.run_table.setColumnCount(len(platforms) + 1)
+        self.run_table.setHorizontalHeaderLabels(["Run"] + [f"{platform} (s)" for platform in platforms])
+        self.run_table.setRowCount(len(runs))
+        for i, run in enumerate(runs):
+            self.run_table.setItem(i, 0, QTableWidgetItem(run['started'].strftime('%Y-%m-%d %H:%M:%S')))
+            busiest = max((platform for platform in run['platforms'] if platform != 'Media'),
+                          key=lambda platform: run['platforms'][platform]['busy'], default=None)
+            for j, platform in enumerate(platforms, 1):
+                stats = run['platforms'].get(platform)
+                if stats is None:
+                    continue
+                item = QTableWidgetItem(f"{stats['busy']:.1f}" + (" ✗" if stats['failed'] else ""))
+                if platform == busiest:
+                    item.setForeground(slow)
+                self.run_table.setItem(i, j, item)
+        self.run_table.resizeColumnsToContents()
+    
+    def cancel_posting(self):
+        self.worker.cancel()
+        self.cancel_button.setEnabled(False)
+        self.update_status("Cancelling, waiting for uploads in progress to stop...")
+    
     def on_posting_finished(self):
         self.post_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
         self.update_status("\n✓ Posting completed!")
+        self.refresh_performance_history()
+        
+        failed = [platform for platform, status in self.last_results.items() if status in ['failed', 'partial', 'timeout']]
+        if failed:
+            answer = QMessageBox.question(
+                self, "Resume Failed Platforms",
+                f"Posting failed for: {', '.join(failed)}\n\nRetry only these platforms?"
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                content, media_files = self.last_post
+                self.update_status(f"\nResuming failed platforms: {', '.join(failed)}")
+                self.start_post_worker(content, media_files, failed)
+    
+    def run_campaign(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Select Campaign Manifest", "", "Campaign Manifests (*.csv *.jsonl)"
+        )
+        if not path:
+            return
+        
+        self.post_button.setEnabled(False)
+        self.campaign_button.setEnabled(False)
+        self.stop_campaign_button.setEnabled(True)
+        self.tabs.setCurrentWidget(self.status_tab)
+        self.status_text.clear()
+        
+        self.campaign_worker = CampaignRunner(path, self.credentials, self.campaign_concurrent.value(),
+                                              self.campaign_interval.value())
+        self.campaign_worker.status_update.connect(self.update_status)
+        self.campaign_worker.progress.connect(self.on_campaign_progress)
+        self.campaign_worker.finished.connect(self.on_campaign_finished)
+        self.campaign_worker.start()
+    
+    def stop_campaign(self):
+        self.campaign_worker.requestInterruption()
+        self.stop_campaign_button.setEnabled(False)
+        self.update_status("Stopping campaign after the posts in progress...")
+    
+    def on_campaign_progress(self, done, total):
+        if done:
+            self.update_status(f"Campaign progress: {done}/{total} rows")
+    
+    def on_campaign_finished(self):
+        self.post_button.setEnabled(True)
+        self.campaign_button.setEnabled(True)
+        self.stop_campaign_button.setEnabled(False)
+        self.update_status("\n✓ Campaign finished!")
+        self.refresh_performance_history()
+    
+    def closeEvent(self, event):
+        if hasattr(self, 'worker') and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        if self.campaign_worker and self.campaign_worker.isRunning():
+            self.campaign_worker.cancel()
+            self.campaign_worker.wait()
+        self.probe_pool.shutdown()
+        PRE_ENCODER.shutdown()
+        self.library_model.shutdown()
+        if self.scan_worker and self.scan_worker.isRunning():
+            self.scan_worker.requestInterruption()
+            self.scan_worker.wait()
+        self.media_library.close()
+        super().closeEvent(event)
     
     def open_settings(self):
         dialog = CredentialsDialog(self.credentials, self)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             self.credentials = dialog.get_credentials()
             self.save_credentials()
+            self.apply_memory_budget()
+    
+    def apply_memory_budget(self):
+        # Background pre-encoding runs before any post, so the budget is applied as soon as it is known
+        try:
+            MEMORY_GOVERNOR.configure(self.credentials.get('memory', {}).get('budget_mb'))
+        except ValueError:
+            pass  # Reported by the next post
     
     def load_credentials(self):
         try:
@@ -341,6 +732,7 @@ class SocialPoster(QMainWindow):
         
         with open('platform_preferences.json', 'w') as f:
             json.dump(prefs, f, indent=2)
+        self.pre_encode_timer.start()
     
     def apply_dark_theme(self):
         dark_style = """
@@ -348,12 +740,24 @@ class SocialPoster(QMainWindow):
             background-color: #1e1e1e;
             color: #ffffff;
         }
-        QTextEdit, QLineEdit, QListWidget {
+        QTextEdit, QLineEdit, QListWidget, QListView {
             background-color: #2d2d2d;
             border: 1px solid #3d3d3d;
             color: #ffffff;
             padding: 5px;
         }
+        QTableWidget {
+            background-color: #2d2d2d;
+            border: 1px solid #3d3d3d;
+            color: #ffffff;
+            gridline-color: #3d3d3d;
+        }
+        QHeaderView::section {
+            background-color: #1e1e1e;
+            color: #ffffff;
+            border: 1px solid #3d3d3d;
+            padding: 3px;
+        }
         QPushButton {
             background-color: #0d7377;
             color: #ffffff;
@@ -428,6 +832,12 @@ class CredentialsDialog(QDialog):
         # Ensure imgbb exists
         if 'imgbb' not in self.credentials:
             self.credentials['imgbb'] = {'api_key': ''}
+        if 's3' not in self.credentials:
+            self.credentials['s3'] = {}
+        if 'bandwidth' not in self.credentials:
+            self.credentials['bandwidth'] = {}
+        if 'memory' not in self.credentials:
+            self.credentials['memory'] = {}
         self.apply_dark_theme()
         
         main_layout = QVBoxLayout(self)
@@ -469,6 +879,15 @@ class CredentialsDialog(QDialog):
         discord_layout.addWidget(QLabel("Webhook URL:"))
         self.discord_webhook = QLineEdit(self.credentials['discord'].get('webhook_url', ''))
         discord_layout.addWidget(self.discord_webhook)
+        discord_layout.addWidget(QLabel("Additional Webhook URLs (one per line):"))
+        self.discord_extra_webhooks = QTextEdit()
+        self.discord_extra_webhooks.setPlainText(
+            "\n".join(account.get('webhook_url', '') for account in self.credentials['discord'].get('accounts', [])))
+        self.discord_extra_webhooks.setMaximumHeight(80)
+        discord_layout.addWidget(self.discord_extra_webhooks)
+        discord_info = QLabel("Note: every webhook gets the post; extra accounts for other platforms\ngo in an \"accounts\" list in social_credentials.json")
+        discord_info.setStyleSheet("color: #888888; font-size: 11px;")
+        discord_layout.addWidget(discord_info)
         discord_group.setLayout(discord_layout)
         scroll_layout.addWidget(discord_group)
         
@@ -528,6 +947,60 @@ class CredentialsDialog(QDialog):
         imgbb_group.setLayout(imgbb_layout)
         scroll_layout.addWidget(imgbb_group)
         
+        # S3-compatible storage
+        s3_group = QGroupBox("S3-Compatible Storage (large files and videos)")
+        s3_layout = QVBoxLayout()
+        self.s3_fields = {}
+        for field, label in [('endpoint_url', 'Endpoint URL (leave empty for AWS)'), ('bucket', 'Bucket'),
+                             ('region', 'Region'), ('access_key', 'Access Key'), ('secret_key', 'Secret Key'),
+                             ('public_url', 'Public URL (optional, otherwise presigned links)')]:
+            s3_layout.addWidget(QLabel(label + ':'))
+            line_edit = QLineEdit(self.credentials['s3'].get(field, ''))
+            if field == 'secret_key':
+                line_edit.setEchoMode(QLineEdit.EchoMode.Password)
+            self.s3_fields[field] = line_edit
+            s3_layout.addWidget(line_edit)
+        
+        s3_info = QLabel("Note: used instead of imgBB when a bucket is set (AWS S3, MinIO, R2, ...)\nRequires boto3: pip install boto3")
+        s3_info.setStyleSheet("color: #888888; font-size: 11px;")
+        s3_layout.addWidget(s3_info)
+        
+        s3_group.setLayout(s3_layout)
+        scroll_layout.addWidget(s3_group)
+        
+        # Upload bandwidth caps
+        bandwidth_group = QGroupBox("Upload Bandwidth (KB/s, empty = unlimited)")
+        bandwidth_layout = QVBoxLayout()
+        self.bandwidth_fields = {}
+        for field, label in [('total', 'All uploads'), ('Twitter', 'Twitter'), ('Bluesky', 'Bluesky'),
+                             ('Discord', 'Discord'), ('Instagram', 'Instagram'), ('Reddit', 'Reddit'),
+                             ('Hosting', 'Media hosting (imgBB / S3)')]:
+            bandwidth_layout.addWidget(QLabel(label + ':'))
+            line_edit = QLineEdit(str(self.credentials['bandwidth'].get(field, '')))
+            self.bandwidth_fields[field] = line_edit
+            bandwidth_layout.addWidget(line_edit)
+        
+        bandwidth_info = QLabel("Note: concurrent uploads share the caps evenly, so one large video can't block the rest")
+        bandwidth_info.setStyleSheet("color: #888888; font-size: 11px;")
+        bandwidth_layout.addWidget(bandwidth_info)
+        
+        bandwidth_group.setLayout(bandwidth_layout)
+        scroll_layout.addWidget(bandwidth_group)
+        
+        # Memory budget for compression
+        memory_group = QGroupBox("Media Processing Memory (MB, empty = 1024)")
+        memory_layout = QVBoxLayout()
+        memory_layout.addWidget(QLabel("Memory budget:"))
+        self.memory_budget_input = QLineEdit(str(self.credentials['memory'].get('budget_mb', '')))
+        memory_layout.addWidget(self.memory_budget_input)
+        
+        memory_info = QLabel("Note: files are compressed in parallel only while their estimated memory use fits this budget")
+        memory_info.setStyleSheet("color: #888888; font-size: 11px;")
+        memory_layout.addWidget(memory_info)
+        
+        memory_group.setLayout(memory_layout)
+        scroll_layout.addWidget(memory_group)
+        
         scroll_widget.setLayout(scroll_layout)
         scroll.setWidget(scroll_widget)
         scroll.setWidgetResizable(True)
@@ -549,6 +1022,10 @@ class CredentialsDialog(QDialog):
         self.credentials['bluesky']['handle'] = self.bluesky_handle.text()
         self.credentials['bluesky']['password'] = self.bluesky_password.text()
         self.credentials['discord']['webhook_url'] = self.discord_webhook.text()
+        # Keep names and other per-webhook settings for URLs that are still listed
+        existing = {account.get('webhook_url'): account for account in self.credentials['discord'].get('accounts', [])}
+        urls = [line.strip() for line in self.discord_extra_webhooks.toPlainText().splitlines() if line.strip()]
+        self.credentials['discord']['accounts'] = [existing.get(url, {'webhook_url': url}) for url in urls]
         # Instagram credentials are kept but not modified through UI
         self.credentials['reddit']['client_id'] = self.reddit_client_id.text()
         self.credentials['reddit']['client_secret'] = self.reddit_client_secret.text()
@@ -557,6 +1034,11 @@ class CredentialsDialog(QDialog):
         self.credentials['reddit']['user_agent'] = self.reddit_user_agent.text()
         self.credentials['reddit']['subreddits'] = self.reddit_subreddits.text()
         self.credentials['imgbb']['api_key'] = self.imgbb_api_key.text()
+        for field, widget in self.s3_fields.items():
+            self.credentials['s3'][field] = widget.text().strip()
+        for field, widget in self.bandwidth_fields.items():
+            self.credentials['bandwidth'][field] = widget.text().strip()
+        self.credentials['memory']['budget_mb'] = self.memory_budget_input.text().strip()
         self.accept()
     
     def get_credentials(self):
@@ -571,7 +1053,7 @@ class CredentialsDialog(QDialog):
             background-color: #1e1e1e;
             color: #ffffff;
         }
-        QLineEdit {
+        QLineEdit, QTextEdit {
             background-color: #2d2d2d;
             border: 1px solid #3d3d3d;
             color: #ffffff;
@@ -622,4 +1104,238 @@ class CredentialsDialog(QDialog):
             background-color: #4d4d4d;
         }
         """
-        self.setStyleSheet(dark_style)
\ No newline at end of file
+        self.setStyleSheet(dark_style)
+
+class LibraryScanWorker(QThread):
+    progress = pyqtSignal(int, int)
+    scan_done = pyqtSignal(int, int, int)
+    
+    def __init__(self, library):
+        super().__init__()
+        self.library = library
+    
+    def run(self):
+        changed, removed, unchanged = self.library.scan_all(
+            progress=self.progress.emit,
+            stop=self.isInterruptionRequested
+        )
+        self.scan_done.emit(changed, removed, unchanged)
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(str, QImage)
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, path, size, signals):
+        super().__init__()
+        self.path = path
+        self.size = size
+        self.signals = signals
+    
+    def run(self):
+        # Let the decoder scale while reading (JPEG decodes at a reduced size) instead of loading full frames
+        reader = QImageReader(self.path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            size.scale(self.size, self.size, Qt.AspectRatioMode.KeepAspectRatio)
+            reader.setScaledSize(size)
+        self.signals.loaded.emit(self.path, reader.read())
+
+class MediaLibraryModel(QAbstractListModel):
+    PAGE_SIZE = 200
+    THUMB_SIZE = 128
+    MAX_THUMBNAILS = 2000
+    
+    def __init__(self, library):
+        super().__init__()
+        self.library = library
+        self.query = ''
+        self.rows = []
+        self.row_index = {}
+        self.total = library.count()
+        self.thumbnails = OrderedDict()  # LRU of path -> QIcon
+        self.pending = set()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(4)
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self.on_thumbnail_loaded)
+    
+    def set_query(self, query):
+        self.query = query.strip()
+        self.reload()
+    
+    def reload(self):
+        self.cancel_pending_thumbnails()
+        self.beginResetModel()
+        self.rows = []
+        self.row_index = {}
+        self.total = self.library.count(self.query)
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+    
+    def canFetchMore(self, parent):
+        return not parent.isValid() and len(self.rows) < self.total
+    
+    def fetchMore(self, parent):
+        page = self.library.page(len(self.rows), self.PAGE_SIZE, self.query)
+        if not page:
+            self.total = len(self.rows)
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        for i, row in enumerate(page):
+            self.row_index[row['path']] = start + i
+        self.rows.extend(page)
+        self.endInsertRows()
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row['name']
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return f"{row['path']}\n{MediaProbe.describe(row)}"
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.thumbnail(row['path'])
+        if role == Qt.ItemDataRole.UserRole:
+            return row['path']
+        return None
+    
+    def thumbnail(self, path):
+        if path in self.thumbnails:
+            self.thumbnails.move_to_end(path)
+            return self.thumbnails[path]
+        # Videos have no cheap still frame, the file name is enough to pick them
+        if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+            return None
+        if path not in self.pending:
+            self.pending.add(path)
+            self.pool.start(ThumbnailTask(path, self.THUMB_SIZE, self.signals))
+        return None
+    
+    def on_thumbnail_loaded(self, path, image):
+        self.pending.discard(path)
+        if image.isNull():
+            return
+        self.thumbnails[path] = QIcon(QPixmap.fromImage(image))
+        while len(self.thumbnails) > self.MAX_THUMBNAILS:
+            self.thumbnails.popitem(last=False)
+        row = self.row_index.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+    
+    def cancel_pending_thumbnails(self):
+        """Drop queued thumbnail loads, rows still on screen request theirs again on repaint"""
+        self.pool.clear()
+        self.pending.clear()
+    
+    def shutdown(self):
+        self.cancel_pending_thumbnails()
+        self.pool.waitForDone()
+
+class PerformanceWaterfall(QWidget):
+    """Timeline of a run: one row per account (plus the encoding shared by all), one bar per phase"""
+    
+    COLORS = OrderedDict([('compress', '#e0a030'), ('login', '#7f8c8d'), ('upload', '#3498db'),
+                          ('stage', '#9b59b6'), ('wait', '#4a4a4a'), ('publish', '#2ecc71')])
+    ROW_HEIGHT = 22
+    LABEL_WIDTH = 170
+    AXIS_HEIGHT = 20
+    TICKS = [0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 1800]
+    
+    def __init__(self):
+        super().__init__()
+        self.snapshot = None
+        self.bars = []  # (rect, span) as last painted, for tooltips
+        self.setMouseTracking(True)
+        self.setMinimumHeight(self.ROW_HEIGHT * 3)
+    
+    def set_snapshot(self, snapshot):
+        self.snapshot = snapshot
+        self.setMinimumHeight(len(self.targets()) * self.ROW_HEIGHT + self.AXIS_HEIGHT + 8)
+        self.update()
+    
+    def targets(self):
+        if not self.snapshot:
+            return []
+        spans = sorted(self.snapshot['spans'], key=lambda span: span['start'])
+        targets = list(dict.fromkeys(span['target'] for span in spans))
+        # Shared encoding first, then each platform's own conversions next to its accounts
+        if 'Media' in targets:
+            targets.remove('Media')
+            targets.insert(0, 'Media')
+        return targets
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self.bars = []
+        targets = self.targets()
+        if not targets:
+            painter.setPen(QColor('#777777'))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "Phase timings appear here while a post runs")
+            return
+        spans = self.snapshot['spans']
+        end = max(span['start'] + span['duration'] for span in spans) or 1
+        width = max(1, self.width() - self.LABEL_WIDTH - 70)
+        scale = width / end
+        
+        for row, target in enumerate(targets):
+            y = row * self.ROW_HEIGHT + 4
+            painter.setPen(QColor('#ffffff'))
+            label = painter.fontMetrics().elidedText(target, Qt.TextElideMode.ElideRight, self.LABEL_WIDTH - 8)
+            painter.drawText(QRect(4, y, self.LABEL_WIDTH - 8, self.ROW_HEIGHT),
+                             Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, label)
+            finished = 0
+            for span in spans:
+                if span['target'] != target:
+                    continue
+                rect = QRect(self.LABEL_WIDTH + int(span['start'] * scale), y + 3,
+                             max(2, int(span['duration'] * scale)), self.ROW_HEIGHT - 6)
+                painter.fillRect(rect, QColor(self.COLORS.get(span['phase'], '#888888')))
+                if not span['ok']:
+                    painter.setPen(QPen(QColor('#ff6b6b'), 2))
+                    painter.drawRect(rect)
+                self.bars.append((rect, span))
+                finished = max(finished, span['start'] + span['duration'])
+            painter.setPen(QColor('#aaaaaa'))
+            painter.drawText(QRect(self.LABEL_WIDTH + int(finished * scale) + 4, y, 66, self.ROW_HEIGHT),
+                             Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, f"{finished:.1f}s")
+        
+        # Time axis, with ticks at least 80px apart
+        y = len(targets) * self.ROW_HEIGHT + 6
+        step = next((tick for tick in self.TICKS if tick * scale >= 80), self.TICKS[-1])
+        painter.setPen(QColor('#777777'))
+        painter.drawLine(self.LABEL_WIDTH, y, self.LABEL_WIDTH + width, y)
+        tick = 0.0
+        while tick <= end:
+            x = self.LABEL_WIDTH + int(tick * scale)
+            painter.drawLine(x, y, x, y + 4)
+            painter.drawText(QRect(x - 30, y + 4, 60, self.AXIS_HEIGHT - 4), Qt.AlignmentFlag.AlignHCenter, f"{tick:g}s")
+            tick += step
+    
+    def event(self, event):
+        if event.type() == QEvent.Type.ToolTip:
+            span = next((span for rect, span in self.bars if rect.contains(event.pos())), None)
+            if span is None:
+                QToolTip.hideText()
+                return True
+            lines = [f"{span['target']}: {span['phase']}" + (" (failed)" if not span['ok'] else "")]
+            if span['label']:
+                lines.append(span['label'])
+            lines.append(f"{span['duration']:.2f}s, from +{span['start']:.1f}s")
+            if span['bytes']:
+                line = f"{span['bytes']/1024/1024:.1f}MB"
+                if span['phase'] == 'upload' and span['duration'] > 0:
+                    line += f" at {span['bytes']/span['duration']/1024/1024:.2f}MB/s"
+                lines.append(line)
+            if span['retries']:
+                lines.append(f"{span['retries']} retries")
+            if span['queue'] is not None:
+                lines.append(f"{span['queue']} more files queued for this account")
+            QToolTip.showText(event.globalPos(), "\n".join(lines), self)
+            return True
+        return super().event(event)
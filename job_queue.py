@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from PyQt6.QtCore import Qt
+from poster import PostWorker, ClientPool
+from run_journal import RUN_JOURNAL
+from chunked_upload import UPLOAD_SESSIONS
+from campaign import CampaignManifest
+
+class JobQueue:
+    """Post jobs shared by every poster node that opens the same database file.
+
+    A node claims a job by taking a lease on it and keeps it alive with heartbeats. A node that
+    crashes stops heartbeating, its lease runs out and another node picks the job up. Each claim
+    bumps the job's lease token, so a node that lost its lease can no longer renew or finish the job.
+    Per-platform limits cap how many leased jobs may post to a platform at once, across all nodes;
+    jobs leased early to stage a scheduled post don't count until they are due.
+
+    Claims rely on SQLite's file locks, so a database shared over the network must sit on a
+    filesystem that implements them properly (NFS with working lock support, SMB); on one that
+    ignores or fakes them, BEGIN IMMEDIATE doesn't exclude other nodes and a job can be posted twice.
+    """
+
+    LEASE = 90  # Seconds a claim lasts without a heartbeat
+    MAX_ATTEMPTS = 3  # Claims before a job whose nodes keep dying is given up on
+
+    def __init__(self, db_path='job_queue.db'):
+        self.db_path = db_path
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    row TEXT NOT NULL,
+                    platforms TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    not_before REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_token INTEGER NOT NULL DEFAULT 0,
+                    lease_expires REAL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    results TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, not_before)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS platform_limits (
+                    platform TEXT PRIMARY KEY,
+                    max_running INTEGER NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def now_text():
+        return datetime.now().isoformat(timespec='seconds')
+
+    def transaction(self, work):
+        """Run work(conn) holding the database write lock, so claims from different nodes never interleave"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self.conn)
+                self.conn.execute("COMMIT")
+                return result
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def submit(self, row):
+        """Queue a normalized campaign row. Returns False if a job with its id is already queued"""
+        stored = dict(row, time=row['time'].isoformat() if row['time'] else None)
+        not_before = row['time'].timestamp() if row['time'] else 0
+        def insert(conn):
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO jobs (id, row, platforms, state, not_before, created_at, updated_at)
+                VALUES (?, ?, ?, 'queued', ?, ?, ?)
+            """, (row['id'], json.dumps(stored), json.dumps(row['platforms']), not_before,
+                  self.now_text(), self.now_text()))
+            return cursor.rowcount == 1
+        return self.transaction(insert)
+
+    def set_limit(self, platform, max_running):
+        def update(conn):
+            if max_running:
+                conn.execute("INSERT OR REPLACE INTO platform_limits (platform, max_running) VALUES (?, ?)",
+                             (platform, max_running))
+            else:
+                conn.execute("DELETE FROM platform_limits WHERE platform = ?", (platform,))
+        self.transaction(update)
+
+    def limits(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT platform, max_running FROM platform_limits").fetchall())
+
+    def claim(self, owner):
+        """Lease the next due job whose platforms all have room under their limits, or None"""
+        def take(conn):
+            now = time.time()
+            # Jobs whose node died with attempts left go back in line; the rest are given up on
+            conn.execute("""
+                UPDATE jobs SET state = 'failed', error = 'lease lost ' || attempts || ' times', updated_at = ?
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (self.now_text(), now, self.MAX_ATTEMPTS))
+            conn.execute("""
+                UPDATE jobs SET state = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'queued' END,
+                       lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE state = 'leased' AND lease_expires < ?
+            """, (self.now_text(), now))
+
+            limits = dict(conn.execute("SELECT platform, max_running FROM platform_limits").fetchall())
+            running = {}
+            for (platforms,) in conn.execute("SELECT platforms FROM jobs WHERE state = 'leased' AND not_before <= ?", (now,)):
+                for platform in json.loads(platforms):
+                    running[platform] = running.get(platform, 0) + 1
+
+            # Scheduled jobs are handed out early so their media is uploaded before they are due
+            candidates = conn.execute("""
+                SELECT id, row, platforms FROM jobs WHERE state = 'queued' AND not_before <= ?
+                ORDER BY not_before, created_at, rowid
+            """, (now + PostWorker.STAGE_LEAD,)).fetchall()
+            for job_id, row, platforms in candidates:
+                if any(running.get(platform, 0) >= limits[platform] for platform in json.loads(platforms) if platform in limits):
+                    continue  # A later job for other platforms may still go ahead
+                conn.execute("""
+                    UPDATE jobs SET state = 'leased', lease_owner = ?, lease_token = lease_token + 1,
+                           lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                    WHERE id = ?
+                """, (owner, now + self.LEASE, self.now_text(), job_id))
+                lease_token = conn.execute("SELECT lease_token FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                row = json.loads(row)
+                row['time'] = datetime.fromisoformat(row['time']) if row['time'] else None
+                return {'id': job_id, 'row': row, 'lease_token': lease_token}
+            return None
+        return self.transaction(take)
+
+    def heartbeat(self, job_id, lease_token):
+        """Extend a lease. False means the lease is lost or the job was cancelled, so the node must stop"""
+        def renew(conn):
+            cursor = conn.execute("""
+                UPDATE jobs SET lease_expires = ?, updated_at = ?
+                WHERE id = ? AND lease_token = ? AND state = 'leased' AND cancel_requested = 0
+            """, (time.time() + self.LEASE, self.now_text(), job_id, lease_token))
+            return cursor.rowcount == 1
+        return self.transaction(renew)
+
+    def complete(self, job_id, lease_token, state, results, error=None):
+        """Record a job's outcome; ignored (returns False) if another node has taken the job over since"""
+        def finish(conn):
+            cursor = conn.execute("""
+                UPDATE jobs SET state = ?, results = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND lease_token = ? AND state = 'leased'
+            """, (state, json.dumps(results), error, self.now_text(), job_id, lease_token))
+            return cursor.rowcount == 1
+        return self.transaction(finish)
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or ask the node running it to stop at its next heartbeat"""
+        def request(conn):
+            queued = conn.execute("UPDATE jobs SET state = 'cancelled', cancel_requested = 1, updated_at = ? WHERE id = ? AND state = 'queued'",
+                                  (self.now_text(), job_id)).rowcount
+            running = conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND state = 'leased'",
+                                   (self.now_text(), job_id)).rowcount
+            return queued + running == 1
+        return self.transaction(request)
+
+    def jobs(self, limit=50):
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT id, state, lease_owner, attempts, results, error, updated_at FROM jobs
+                ORDER BY created_at DESC, rowid DESC LIMIT ?
+            """, (limit,)).fetchall()
+        return [{'id': row[0], 'state': row[1], 'owner': row[2], 'attempts': row[3],
+                 'results': json.loads(row[4]) if row[4] else {}, 'error': row[5], 'updated_at': row[6]} for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class QueueWorker:
+    """One node of the fleet: claims jobs from a shared JobQueue and posts them, a few at a time"""
+
+    HEARTBEAT = 20  # Seconds between lease renewals, well inside JobQueue.LEASE
+    POLL_INTERVAL = 2.0  # Seconds between claim attempts while idle or full
+
+    def __init__(self, queue, credentials, slots=2, node_id=None, history_path=None, status=print):
+        self.queue = queue
+        self.credentials = credentials
+        self.slots = slots
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        # Every node records to the history next to the queue, so a post done by one node is skipped by the others
+        self.history_path = history_path or os.path.join(os.path.dirname(os.path.abspath(queue.db_path)), 'post_history.db')
+        self.status = status
+        self.clients = ClientPool()
+        self.active = {}  # job id -> (lease token, PostWorker or None before it is built)
+        self.renewed = {}  # job id -> when its lease was last claimed or renewed
+        self.lost = set()  # Jobs whose lease went before their PostWorker was built
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def stop(self):
+        """Stop claiming; posts in progress finish normally"""
+        self.stopping.set()
+
+    def run(self):
+        self.status(f"Node {self.node_id} working on {self.queue.db_path} with {self.slots} slots")
+        heartbeat = threading.Thread(target=self.heartbeat_loop, name="heartbeat", daemon=True)
+        heartbeat.start()
+        threads = []
+        try:
+            while not self.stopping.is_set():
+                job = None
+                with self.lock:
+                    free = len(self.active) < self.slots
+                if free:
+                    try:
+                        job = self.queue.claim(self.node_id)
+                    except sqlite3.Error as e:
+                        self.status(f"⚠ Could not claim a job: {str(e)}")
+                if job is None:
+                    self.stopping.wait(self.POLL_INTERVAL)
+                    continue
+                with self.lock:
+                    self.active[job['id']] = (job['lease_token'], None)
+                    self.renewed[job['id']] = time.time()
+                thread = threading.Thread(target=self.run_job, args=(job,), name=f"job-{job['id']}", daemon=True)
+                thread.start()
+                threads = [t for t in threads if t.is_alive()] + [thread]
+        except KeyboardInterrupt:
+            self.status("Stopping, letting posts in progress finish...")
+        for thread in threads:
+            thread.join()
+        self.clients.clear()
+
+    def heartbeat_loop(self):
+        while True:
+            time.sleep(self.HEARTBEAT)
+            # Nothing may end this thread: without it every running job would lose its lease
+            try:
+                self.heartbeat_all()
+            except Exception as e:
+                self.status(f"⚠ Heartbeat round failed: {str(e)}")
+
+    def heartbeat_all(self):
+        with self.lock:
+            active = list(self.active.items())
+        for job_id, (lease_token, worker) in active:
+            try:
+                alive = self.queue.heartbeat(job_id, lease_token)
+            except Exception as e:
+                self.status(f"⚠ [{job_id}] heartbeat failed: {str(e)}")
+                with self.lock:
+                    renewed = self.renewed.get(job_id, 0)
+                # The lease has slack for a few missed beats, but not past the point another node could take it
+                alive = time.time() + self.HEARTBEAT < renewed + self.queue.LEASE
+            else:
+                if alive:
+                    with self.lock:
+                        self.renewed[job_id] = time.time()
+            if not alive:
+                # Cancelled, taken over after this node stalled, or no longer renewable: stop before anything else is posted
+                if worker:
+                    worker.token.cancel("lease lost or job cancelled")
+                else:
+                    with self.lock:
+                        self.lost.add(job_id)
+
+    def run_job(self, job):
+        job_id = job['id']
+        row = job['row']
+        results = {}
+        error = None
+        self.status(f"\n=== Job {job_id} (attempt token {job['lease_token']}) ===")
+        try:
+            worker = PostWorker(
+                row['text'], row['media'], row['platforms'], self.credentials,
+                discord_nitro=row['discord_nitro'],
+                discord_separate_messages=row['discord_mode'] == 'separate',
+                discord_embed_mode=row['discord_mode'] == 'embed',
+                scheduled_time=row['time'],
+                clients=self.clients,
+                history_path=self.history_path,
+                post_anyway=row.get('post_anyway', False)  # Jobs queued before the flag existed
+            )
+            worker.status_update.connect(lambda message: self.status(f"[{job_id}] {message}"), Qt.ConnectionType.DirectConnection)
+            worker.results_ready.connect(results.update, Qt.ConnectionType.DirectConnection)
+            with self.lock:
+                self.active[job_id] = (job['lease_token'], worker)
+                if job_id in self.lost:
+                    worker.token.cancel("lease lost or job cancelled")
+            worker.run()
+        except Exception as e:
+            error = str(e)
+            self.status(f"✗ [{job_id}] failed: {error}")
+        finally:
+            with self.lock:
+                self.active.pop(job_id, None)
+                self.renewed.pop(job_id, None)
+                self.lost.discard(job_id)
+
+        if results and all(status in ['success', 'skipped'] for status in results.values()):
+            state = 'done'
+        elif results and all(status == 'cancelled' for status in results.values()):
+            state = 'cancelled'
+        else:
+            state = 'failed'
+        try:
+            if not self.queue.complete(job_id, job['lease_token'], state, results, error):
+                self.status(f"⚠ [{job_id}] lease was taken over, outcome left to the node holding it")
+        except sqlite3.Error as e:
+            self.status(f"⚠ [{job_id}] could not record the outcome: {str(e)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared posting queue for a fleet of poster nodes")
+    parser.add_argument('--queue', default='job_queue.db', help="queue database, on storage every node can reach")
+    commands = parser.add_subparsers(dest='command', required=True)
+    work = commands.add_parser('work', help="claim and post jobs until stopped")
+    work.add_argument('--slots', type=int, default=2, help="posts this node runs at once")
+    work.add_argument('--credentials', default='social_credentials.json')
+    work.add_argument('--node', default=socket.gethostname(), help="name of this node, unique within the fleet")
+    submit = commands.add_parser('submit', help="queue every row of a campaign manifest")
+    submit.add_argument('manifest')
+    limit = commands.add_parser('limit', help="cap posts running at once on a platform across all nodes (0 = no cap)")
+    limit.add_argument('platform')
+    limit.add_argument('max_running', type=int)
+    cancel = commands.add_parser('cancel')
+    cancel.add_argument('job_id')
+    commands.add_parser('status')
+    args = parser.parse_args()
+
+    job_queue = JobQueue(args.queue)
+    if args.command == 'work':
+        with open(args.credentials, 'r') as f:
+            credentials = json.load(f)
+        # Nodes sharing a folder keep separate journals; a restarted node resumes its own interrupted runs and uploads
+        node = ''.join(c if c.isalnum() or c in '-_' else '_' for c in args.node)
+        RUN_JOURNAL.path = f"run_journal.{node}.jsonl"
+        UPLOAD_SESSIONS.path = f"upload_sessions.{node}.json"
+        QueueWorker(job_queue, credentials, args.slots, args.node).run()
+    elif args.command == 'submit':
+        # Media paths become absolute here, so every node needs the files at the same path (e.g. a shared mount)
+        for row in CampaignManifest.load(args.manifest):
+            if row['error']:
+                print(f"✗ [{row['id']}] skipped: {row['error']}")
+            elif job_queue.submit(row):
+                print(f"✓ [{row['id']}] queued")
+            else:
+                print(f"⚠ [{row['id']}] already in the queue")
+    elif args.command == 'limit':
+        job_queue.set_limit(args.platform, args.max_running)
+        print(f"✓ Limits: {job_queue.limits() or 'none'}")
+    elif args.command == 'cancel':
+        print(f"✓ Cancel requested for {args.job_id}" if job_queue.cancel(args.job_id) else f"✗ No queued or running job {args.job_id}")
+    else:
+        for job in job_queue.jobs():
+            results = ", ".join(f"{platform}={status}" for platform, status in job['results'].items())
+            owner = f" on {job['owner']}" if job['owner'] else ""
+            print(f"{job['id']}: {job['state']}{owner} (attempts {job['attempts']}) {results} {job['error'] or ''}".rstrip())
+    job_queue.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
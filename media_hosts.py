@@ -0,0 +1,282 @@
+import os
+import math
+import time
+import base64
+import hashlib
+import threading
+import requests
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from media_probe import MEDIA_CACHE, VIDEO_EXTENSIONS
+from memory_budget import MEMORY_GOVERNOR
+from chunked_upload import UPLOAD_SESSIONS, with_retries
+
+class MediaHost(ABC):
+    """Somewhere to put a file so platforms that only take URLs (Discord embeds, Instagram) can fetch it"""
+
+    name = 'host'
+    max_size = 0
+    supports_video = False
+    http = requests  # Replaced with a metered session so uploads respect the bandwidth caps
+    meter = None  # total bytes -> transfer paced with send(n) and closed with finish(), for non-requests clients
+
+    def accepts(self, filepath):
+        is_video = os.path.splitext(filepath)[1].lower() in VIDEO_EXTENSIONS
+        return self.supports_video or not is_video
+
+    @abstractmethod
+    def host(self, filepath, timeout=60, status=None, stop=None):
+        """Upload a file and return its public URL, or None on failure; a true stop() gives up early"""
+
+class ImgBBHost(MediaHost):
+    name = 'imgBB'
+    max_size = 32 * 1024 * 1024
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def host(self, filepath, timeout=60, status=None, stop=None):
+        status = status or (lambda message: None)
+        def check():
+            if stop and stop():
+                raise IOError("upload cancelled")
+        try:
+            check()
+            # Check file size (imgBB has a 32MB limit for images)
+            file_size = MEDIA_CACHE.get_size(filepath)
+            if file_size > self.max_size:
+                status(f"✗ {os.path.basename(filepath)} too large for imgBB (>32MB)")
+                return None
+
+            # The file, its base64 text and the form-encoded body are all in memory at once
+            with MEMORY_GOVERNOR.reserve(file_size * 5, os.path.basename(filepath), stop, status):
+                with open(filepath, 'rb') as f:
+                    image_data = base64.b64encode(f.read()).decode('utf-8')
+
+                data = {
+                    'key': self.api_key,
+                    'image': image_data
+                }
+
+                response = self.http.post(
+                    'https://api.imgbb.com/1/upload',
+                    data=data,
+                    timeout=timeout  # Longer timeout for uploads
+                )
+            # A run cancelled while the request was out doesn't go on to use the image
+            check()
+
+            if response.status_code == 200:
+                json_data = response.json()
+                if json_data.get('success'):
+                    return json_data['data']['url']
+                else:
+                    status(f"✗ imgBB upload failed: {json_data.get('error', {}).get('message', 'Unknown error')}")
+                    return None
+            else:
+                status(f"✗ imgBB upload failed: HTTP {response.status_code}")
+                return None
+
+        except Exception as e:
+            status(f"✗ imgBB upload error: {str(e)}")
+            return None
+
+class S3Host(MediaHost):
+    """S3 or any S3-compatible store (MinIO, R2, B2, ...), uploading large files as parallel multipart parts"""
+
+    name = 'S3'
+    max_size = 5 * 1024 * 1024 * 1024 * 1024  # S3's object size limit
+    supports_video = True
+
+    CONTENT_TYPES = {
+        '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif',
+        '.mp4': 'video/mp4', '.mov': 'video/quicktime', '.webm': 'video/webm'
+    }
+    # How long an unfinished multipart upload is kept for resuming; add a lifecycle rule with
+    # AbortIncompleteMultipartUpload to the bucket so uploads that are never resumed get cleaned up
+    RESUME_WINDOW = 7 * 24 * 3600
+
+    def __init__(self, bucket, access_key, secret_key, endpoint_url=None, region='us-east-1', prefix='',
+                 public_url=None, url_expiry=24 * 3600, part_size=8 * 1024 * 1024, max_workers=4):
+        # Only needed by people who host on S3, so it isn't a hard dependency of the app
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("S3 hosting needs boto3 (pip install boto3)")
+        self.boto3 = boto3
+        self.Config = Config
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.url_expiry = url_expiry
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # S3's minimum part size
+        self.max_workers = max_workers
+        self.client_args = {
+            'endpoint_url': endpoint_url or None,
+            'aws_access_key_id': access_key,
+            'aws_secret_access_key': secret_key,
+            'region_name': region or 'us-east-1'
+        }
+        self.config = self.Config(signature_version='s3v4', max_pool_connections=max_workers * 2,
+                             s3={'addressing_style': 'path' if endpoint_url else 'auto'})
+        self.clients = {}  # timeout -> client, botocore only takes timeouts per client
+        self.lock = threading.Lock()
+        self.client = self.client_for(60)
+
+    def client_for(self, timeout):
+        """Client whose connect and read timeouts are the given seconds"""
+        timeout = max(1, math.ceil(timeout))
+        with self.lock:
+            if timeout not in self.clients:
+                config = self.config.merge(self.Config(connect_timeout=timeout, read_timeout=timeout))
+                self.clients[timeout] = self.boto3.client('s3', config=config, **self.client_args)
+            return self.clients[timeout]
+
+    def object_key(self, filepath):
+        # Keyed by content hash so the same file is only ever stored once
+        digest = MEDIA_CACHE.lookup(filepath)['hash']
+        return f"{self.prefix}{digest[:16]}/{os.path.basename(filepath)}"
+
+    def exists(self, key, client):
+        try:
+            client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    def url_for(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=self.url_expiry
+        )
+
+    def host(self, filepath, timeout=60, status=None, stop=None):
+        status = status or (lambda message: None)
+        client = self.client_for(timeout)
+        try:
+            key = self.object_key(filepath)
+            if self.exists(key, client):
+                status(f"✓ {os.path.basename(filepath)} already stored in S3")
+                return self.url_for(key)
+
+            content_type = self.CONTENT_TYPES.get(os.path.splitext(filepath)[1].lower(), 'application/octet-stream')
+            file_size = MEDIA_CACHE.get_size(filepath)
+            # boto3 reads bodies more than once (checksums), so parts are paced before they are sent
+            transfer = self.meter(file_size) if self.meter else None
+            if file_size <= self.part_size:
+                if transfer:
+                    transfer.send(file_size)
+                with open(filepath, 'rb') as f:
+                    client.put_object(Bucket=self.bucket, Key=key, Body=f, ContentType=content_type)
+            else:
+                self.multipart_upload(client, filepath, key, file_size, content_type, status, transfer, stop)
+            if transfer:
+                transfer.finish()
+            return self.url_for(key)
+        except Exception as e:
+            status(f"✗ S3 upload error: {str(e)}")
+            return None
+
+    def upload_part(self, client, filepath, key, upload_id, number, offset, length, transfer=None, uploaded=None,
+                    status=None, stop=None):
+        if stop and stop():
+            raise IOError("upload cancelled")
+        # Each part opens its own handle so parts can be read and sent concurrently
+        with open(filepath, 'rb') as f:
+            f.seek(offset)
+            body = f.read(length)
+        digest = hashlib.md5(body).digest()
+        # A part an interrupted upload already got into S3 is kept if its ETag (the part's MD5) still matches
+        if uploaded and uploaded.get(number, '').strip('"') == digest.hex():
+            return {'PartNumber': number, 'ETag': uploaded[number]}
+        if transfer:
+            transfer.send(length)
+        # S3 checks the body against ContentMD5 and rejects a part corrupted on the way
+        response = with_retries(
+            lambda: client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                                       Body=body, ContentMD5=base64.b64encode(digest).decode('ascii')),
+            f"S3 part {number} of {os.path.basename(filepath)}", status, stop
+        )
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def uploaded_parts(self, client, key, upload_id):
+        """Part number -> ETag of the parts S3 holds for an unfinished upload"""
+        parts = {}
+        for page in client.get_paginator('list_parts').paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            for part in page.get('Parts', []):
+                parts[part['PartNumber']] = part['ETag']
+        return parts
+
+    def resume_upload(self, client, session_key, key, file_size):
+        """Upload id and parts of an interrupted upload of this file, or (None, {})"""
+        saved = UPLOAD_SESSIONS.get(session_key)
+        if saved is None:
+            return None, {}
+        if saved['size'] == file_size and saved['chunk_size'] == self.part_size:
+            try:
+                return saved['upload'], self.uploaded_parts(client, key, saved['upload'])
+            except Exception:
+                pass  # Completed, aborted or expired in the meantime
+        try:
+            client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=saved['upload'])
+        except Exception:
+            pass
+        UPLOAD_SESSIONS.drop(session_key)
+        return None, {}
+
+    def multipart_upload(self, client, filepath, key, file_size, content_type, status, transfer=None, stop=None):
+        session_key = f"S3:{self.bucket}/{key}"
+        offsets = list(range(0, file_size, self.part_size))
+        upload_id, uploaded = self.resume_upload(client, session_key, key, file_size)
+        if upload_id is None:
+            upload_id = client.create_multipart_upload(
+                Bucket=self.bucket, Key=key, ContentType=content_type)['UploadId']
+            UPLOAD_SESSIONS.put(session_key, {'upload': upload_id, 'size': file_size, 'chunk_size': self.part_size,
+                                              'expires': time.time() + self.RESUME_WINDOW})
+            status(f"Uploading {os.path.basename(filepath)} to S3 in {len(offsets)} parts...")
+        else:
+            status(f"Resuming upload of {os.path.basename(filepath)} to S3: {len(uploaded)}/{len(offsets)} parts already there")
+        # At most max_workers parts are held in memory at a time
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='s3-part') as executor:
+            futures = [
+                executor.submit(self.upload_part, client, filepath, key, upload_id, number, offset,
+                                min(self.part_size, file_size - offset), transfer, uploaded, status, stop)
+                for number, offset in enumerate(offsets, 1)
+            ]
+            try:
+                parts = [future.result() for future in futures]
+            except BaseException:
+                # Parts not started yet are dropped rather than sent after the upload has failed
+                for future in futures:
+                    future.cancel()
+                raise
+        # A failed part leaves the upload open (see RESUME_WINDOW) so the next attempt only sends the missing parts
+        try:
+            client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+        except Exception:
+            # Every part went up but S3 won't assemble them, so there is nothing worth resuming
+            try:
+                client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception:
+                pass
+            UPLOAD_SESSIONS.drop(session_key)
+            raise
+        UPLOAD_SESSIONS.drop(session_key)
+
+def create_media_host(credentials):
+    """Pick the configured host: S3 when a bucket is set up, otherwise imgBB, otherwise None"""
+    s3 = credentials.get('s3', {})
+    if s3.get('bucket'):
+        return S3Host(
+            s3['bucket'], s3.get('access_key', ''), s3.get('secret_key', ''),
+            endpoint_url=s3.get('endpoint_url'), region=s3.get('region'), prefix=s3.get('prefix', ''),
+            public_url=s3.get('public_url')
+        )
+    api_key = credentials.get('imgbb', {}).get('api_key', '')
+    if api_key:
+        return ImgBBHost(api_key)
+    return None
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+from media_probe import MediaProbe
+
+MEDIA_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mov', '.webm']
+
+class MediaLibrary:
+    """SQLite index of the media in watched folders"""
+
+    def __init__(self, db_path='media_library.db'):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS folders (
+                    path TEXT PRIMARY KEY
+                );
+                CREATE TABLE IF NOT EXISTS media (
+                    path TEXT PRIMARY KEY,
+                    folder TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    hash TEXT,
+                    width INTEGER,
+                    height INTEGER,
+                    duration REAL,
+                    format TEXT
+                );
+                CREATE INDEX IF NOT EXISTS media_folder ON media(folder);
+                CREATE INDEX IF NOT EXISTS media_mtime ON media(mtime);
+            """)
+            # Libraries from before nested folders were merged may still list both
+            for folder in sorted(row[0] for row in self.conn.execute("SELECT path FROM folders")):
+                self._merge_nested(folder)
+            self.conn.commit()
+
+    @staticmethod
+    def contains(parent, path):
+        """Whether path is parent or somewhere inside it"""
+        parent, path = os.path.normcase(parent), os.path.normcase(path)
+        return path == parent or path.startswith(parent.rstrip(os.sep) + os.sep)
+
+    @staticmethod
+    def like_pattern(query):
+        """LIKE pattern matching query anywhere in a name, with % and _ in it taken literally"""
+        return '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+    def folders(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT path FROM folders ORDER BY path")]
+
+    def add_folder(self, folder):
+        """Watch a folder tree and return the watched folder that covers it.
+
+        Each file belongs to one watched folder: a folder inside a watched one is already covered,
+        and watched folders inside a new one are merged into it.
+        """
+        folder = os.path.abspath(folder)
+        with self.lock:
+            for (path,) in self.conn.execute("SELECT path FROM folders").fetchall():
+                if self.contains(path, folder):
+                    return path
+            self.conn.execute("INSERT INTO folders (path) VALUES (?)", (folder,))
+            self._merge_nested(folder)
+            self.conn.commit()
+        return folder
+
+    def _merge_nested(self, folder):
+        """Fold watched folders inside folder into it (called with the lock held)"""
+        for (path,) in self.conn.execute("SELECT path FROM folders WHERE path != ?", (folder,)).fetchall():
+            if self.contains(folder, path):
+                self.conn.execute("DELETE FROM folders WHERE path = ?", (path,))
+                self.conn.execute("UPDATE media SET folder = ? WHERE folder = ?", (folder, path))
+
+    def remove_folder(self, folder):
+        folder = os.path.abspath(folder)
+        with self.lock:
+            self.conn.execute("DELETE FROM folders WHERE path = ?", (folder,))
+            self.conn.execute("DELETE FROM media WHERE folder = ?", (folder,))
+            self.conn.commit()
+
+    def iter_media_files(self, folder):
+        """Walk a folder tree with scandir so each entry's stat comes from the directory listing"""
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in MEDIA_EXTENSIONS:
+                            yield entry
+            except OSError:
+                continue
+
+    def scan_folder(self, folder, progress=None, stop=None, batch_size=200):
+        """Re-index a watched folder, probing only files whose mtime or size changed.
+
+        Returns a (changed, removed, unchanged) tuple of counts.
+        """
+        folder = os.path.abspath(folder)
+        with self.lock:
+            known = {row[0]: (row[1], row[2]) for row in self.conn.execute(
+                "SELECT path, mtime, size FROM media WHERE folder = ?", (folder,))}
+
+        seen = set()
+        pending = []
+        changed = unchanged = 0
+
+        for entry in self.iter_media_files(folder):
+            if stop and stop():
+                # Leave removal detection for a scan that actually saw the whole tree
+                if pending:
+                    self._upsert(pending)
+                return changed, 0, unchanged
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            seen.add(entry.path)
+            if known.get(entry.path) == (stat.st_mtime, stat.st_size):
+                unchanged += 1
+                continue
+
+            try:
+                info = MediaProbe.probe(entry.path)
+            except Exception:
+                # Unreadable or truncated files are retried on the next scan
+                continue
+            pending.append((
+                entry.path, folder, entry.name, info['mtime'], info['size'], info['hash'],
+                info['width'], info['height'], info['duration'], info['codec']
+            ))
+            changed += 1
+            if len(pending) >= batch_size:
+                self._upsert(pending)
+                pending = []
+            if progress:
+                progress(changed, unchanged)
+
+        if pending:
+            self._upsert(pending)
+
+        removed = [path for path in known if path not in seen]
+        with self.lock:
+            self.conn.executemany("DELETE FROM media WHERE path = ?", [(path,) for path in removed])
+            self.conn.commit()
+        return changed, len(removed), unchanged
+
+    def scan_all(self, progress=None, stop=None):
+        totals = [0, 0, 0]
+        for folder in self.folders():
+            if stop and stop():
+                break
+            for i, count in enumerate(self.scan_folder(folder, progress, stop)):
+                totals[i] += count
+        return tuple(totals)
+
+    def _upsert(self, rows):
+        with self.lock:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO media
+                    (path, folder, name, mtime, size, hash, width, height, duration, format)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self.conn.commit()
+
+    def count(self, query=''):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM media WHERE name LIKE ? ESCAPE '\\'", (self.like_pattern(query),)).fetchone()[0]
+
+    def page(self, offset, limit, query=''):
+        """Return one page of entries, newest first"""
+        with self.lock:
+            cursor = self.conn.execute("""
+                SELECT path, name, mtime, size, hash, width, height, duration, format
+                FROM media WHERE name LIKE ? ESCAPE '\\'
+                ORDER BY mtime DESC, path
+                LIMIT ? OFFSET ?
+            """, (self.like_pattern(query), limit, offset))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,173 @@
+import os
+import re
+import hashlib
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from PIL import Image
+from moviepy.config import get_setting
+
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.webm']
+
+class MediaProbe:
+    @staticmethod
+    def file_hash(filepath, chunk_size=1024*1024):
+        """Return the sha256 of a file, read in chunks to keep memory flat"""
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def probe(filepath, with_hash=True):
+        """Extract size, dimensions, duration, codec, frame count and hash for a media file"""
+        stat = os.stat(filepath)
+        ext = os.path.splitext(filepath)[1].lower()
+        info = {
+            'path': filepath,
+            'ext': ext,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'is_video': ext in VIDEO_EXTENSIONS,
+            'width': None,
+            'height': None,
+            'duration': None,
+            'codec': None,
+            'frames': None,
+            'mode': None,
+            'hash': None
+        }
+
+        if info['is_video']:
+            info.update(MediaProbe.probe_video(filepath))
+        else:
+            info.update(MediaProbe.probe_image(filepath))
+
+        if with_hash:
+            info['hash'] = MediaProbe.file_hash(filepath)
+        return info
+
+    @staticmethod
+    def probe_image(filepath):
+        # Image.open only parses the header, pixels are not decoded here
+        with Image.open(filepath) as img:
+            frames = getattr(img, 'n_frames', 1)
+            duration = None
+            if frames > 1:
+                # Animated images: total up the per-frame display durations
+                total_ms = 0
+                for i in range(frames):
+                    img.seek(i)
+                    total_ms += img.info.get('duration', 0)
+                duration = total_ms / 1000
+            return {
+                'width': img.width,
+                'height': img.height,
+                'codec': img.format,
+                'mode': img.mode,
+                'frames': frames,
+                'duration': duration
+            }
+
+    @staticmethod
+    def probe_video(filepath):
+        # A single "ffmpeg -i" run prints the container and stream headers without decoding
+        result = subprocess.run(
+            [get_setting("FFMPEG_BINARY"), '-hide_banner', '-i', filepath],
+            capture_output=True, text=True, errors='replace'
+        )
+        output = result.stderr
+        info = {}
+
+        match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+        if match:
+            hours, minutes, seconds = match.groups()
+            info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        match = re.search(r"Stream #.*?Video: (\w+).*?, (\d{2,5})x(\d{2,5})", output)
+        if match:
+            info['codec'] = match.group(1)
+            info['width'] = int(match.group(2))
+            info['height'] = int(match.group(3))
+
+        match = re.search(r"Stream #.*?Video:.*?, (\d+(?:\.\d+)?) fps", output)
+        if match and info.get('duration'):
+            info['frames'] = int(round(float(match.group(1)) * info['duration']))
+        return info
+
+    @staticmethod
+    def describe(info):
+        """Short human readable summary for the media list"""
+        parts = [f"{info['size']/1024/1024:.1f} MB"]
+        if info.get('width') and info.get('height'):
+            parts.append(f"{info['width']}x{info['height']}")
+        if info.get('duration'):
+            parts.append(f"{info['duration']:.1f}s")
+        codec = info.get('codec') or info.get('format')
+        if codec:
+            parts.append(str(codec))
+        return ", ".join(parts)
+
+class MediaCache:
+    """Probe results keyed by path, invalidated when a file's size or mtime changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, filepath):
+        """Return the cached entry without touching the filesystem"""
+        with self._lock:
+            return self._entries.get(filepath)
+
+    def put(self, info):
+        with self._lock:
+            self._entries[info['path']] = info
+
+    def lookup(self, filepath, with_hash=True):
+        """Return fresh metadata for a file, probing only if the cached entry is missing or stale"""
+        stat = os.stat(filepath)
+        cached = self.get(filepath)
+        if (cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime
+                and (cached['hash'] or not with_hash)):
+            return cached
+        info = MediaProbe.probe(filepath, with_hash=with_hash)
+        self.put(info)
+        return info
+
+    def get_size(self, filepath):
+        cached = self.get(filepath)
+        if cached:
+            return cached['size']
+        return os.path.getsize(filepath)
+
+    def discard(self, filepath):
+        with self._lock:
+            self._entries.pop(filepath, None)
+
+# Shared between the composer and the posting engine so files are only probed once
+MEDIA_CACHE = MediaCache()
+
+class ProbePool(QObject):
+    probed = pyqtSignal(str, dict)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, cache=MEDIA_CACHE, max_workers=4):
+        super().__init__()
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='media-probe')
+
+    def submit(self, filepath):
+        self.executor.submit(self._probe, filepath)
+
+    def _probe(self, filepath):
+        try:
+            info = self.cache.lookup(filepath)
+            self.probed.emit(filepath, info)
+        except Exception as e:
+            self.failed.emit(filepath, str(e))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
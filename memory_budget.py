@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+class MemoryGovernor:
+    """Admits memory-heavy media work (decodes, encodes, whole-file reads) only while it fits a budget.
+
+    Each task books an estimate of its peak footprint, worked out from the probed dimensions,
+    frame count, duration and file size. Tasks that fit run at once, however many there are; a
+    task larger than the whole budget runs alone rather than never. Once a task has waited
+    FAIRNESS seconds, smaller tasks stop overtaking it so it isn't starved.
+    """
+
+    DEFAULT_BUDGET = 1024 * 1024 * 1024  # Leaves room for the interpreter and Qt in a 2GB container
+    FAIRNESS = 10.0
+    VIDEO_BASE = 200 * 1024 * 1024  # FFmpeg with libx264, before its frame buffers
+    VIDEO_FRAMES = 60  # Decoded frames in flight (reader buffer, encoder lookahead, reference frames)
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.budget = self.DEFAULT_BUDGET
+        self.used = 0
+        self.peak = 0
+        self.running = {}  # task id -> (label, bytes)
+        self.waiting = []  # [task id, label, bytes, arrived], in arrival order
+        self.next_id = 0
+        try:
+            self.configure()
+        except ValueError:
+            pass
+
+    def configure(self, budget_mb=None):
+        """Set the budget in MB; empty falls back to $SOCIAL_POSTER_MEMORY_MB, then the default"""
+        value = str(budget_mb or '').strip() or os.environ.get('SOCIAL_POSTER_MEMORY_MB', '').strip()
+        budget = int(float(value) * 1024 * 1024) if value else self.DEFAULT_BUDGET
+        if budget <= 0:
+            raise ValueError(f"memory budget must be positive, got '{value}'")
+        with self.condition:
+            self.budget = budget
+            self.condition.notify_all()
+        return budget
+
+    def estimate(self, info):
+        """Peak bytes to process a file, from its probe info (see media_probe.MediaProbe.probe)"""
+        width = info.get('width') or 0
+        height = info.get('height') or 0
+        if info.get('is_video'):
+            pixels = (width * height) or 1920 * 1080
+            return self.VIDEO_BASE + pixels * 3 * self.VIDEO_FRAMES
+        frames = info.get('frames') or 1
+        if frames > 1:
+            # All frames held as RGBA, plus their palettised copies while encoding
+            return info.get('size', 0) + width * height * frames * 5
+        # The decode, a converted or resized copy and the encoded output
+        return info.get('size', 0) + width * height * 4 * 2
+
+    def fits(self, task_id, nbytes):
+        """Called with the lock held"""
+        if self.used + nbytes > self.budget and self.running:
+            return False
+        now = time.monotonic()
+        for waiting_id, _, _, arrived in self.waiting:
+            if waiting_id == task_id:
+                return True
+            if now - arrived >= self.FAIRNESS:
+                return False  # Hold back for a task that has waited long enough
+        return True
+
+    @contextmanager
+    def reserve(self, nbytes, label='task', stop=None, status=None):
+        """Hold nbytes of the budget for the block.
+
+        stop is polled while waiting and may raise to abandon the wait (a true result raises
+        InterruptedError); status, if given, is told when the task has to wait.
+        """
+        with self.condition:
+            task_id = self.next_id
+            self.next_id += 1
+            self.waiting.append([task_id, label, nbytes, time.monotonic()])
+            try:
+                told = False
+                while not self.fits(task_id, nbytes):
+                    if status and not told:
+                        told = True
+                        status(f"Waiting for memory to process {label} (needs ~{nbytes/1024/1024:.0f}MB, "
+                               f"{self.used/1024/1024:.0f}/{self.budget/1024/1024:.0f}MB in use)")
+                    self.condition.wait(0.5)
+                    if stop and stop():
+                        raise InterruptedError("cancelled while waiting for memory")
+            finally:
+                self.waiting = [entry for entry in self.waiting if entry[0] != task_id]
+                self.condition.notify_all()
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+            self.running[task_id] = (label, nbytes)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.used -= nbytes
+                del self.running[task_id]
+                self.condition.notify_all()
+
+    def usage(self):
+        with self.condition:
+            return {
+                'budget': self.budget,
+                'used': self.used,
+                'peak': self.peak,
+                'running': [{'task': label, 'bytes': nbytes} for label, nbytes in self.running.values()],
+                'waiting': len(self.waiting)
+            }
+
+MEMORY_GOVERNOR = MemoryGovernor()
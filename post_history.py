@@ -0,0 +1,72 @@
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+class PostHistory:
+    """Record of what was posted where, keyed by (platform, account, text hash, media hashes)"""
+
+    def __init__(self, db_path='post_history.db'):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS posts (
+                    platform TEXT NOT NULL,
+                    account TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    media_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    post_ids TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (platform, account, text_hash, media_key)
+                )
+            """)
+            self.conn.commit()
+
+    @staticmethod
+    def text_hash(content):
+        return hashlib.sha256(content.strip().encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def media_key(media_hashes):
+        """Combine per-file content hashes, in posting order, into one key"""
+        return hashlib.sha256("\n".join(media_hashes).encode('utf-8')).hexdigest()
+
+    def find(self, platform, account, text_hash, media_key):
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT status, post_ids, updated_at FROM posts
+                WHERE platform = ? AND account = ? AND text_hash = ? AND media_key = ?
+            """, (platform, account, text_hash, media_key)).fetchone()
+        if not row:
+            return None
+        return {
+            'status': row[0],
+            'post_ids': json.loads(row[1]) if row[1] else [],
+            'updated_at': row[2]
+        }
+
+    def succeeded(self, platform, account, text_hash, media_key):
+        previous = self.find(platform, account, text_hash, media_key)
+        return previous if previous and previous['status'] == 'success' else None
+
+    def record(self, platform, account, text_hash, media_key, status, post_ids=None):
+        """Store the outcome for an account. A success is never overwritten by a later failure,
+        so a failed post-anyway retry can't make the next normal run post a duplicate"""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO posts
+                    (platform, account, text_hash, media_key, status, post_ids, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (platform, account, text_hash, media_key) DO UPDATE SET
+                    status = excluded.status, post_ids = excluded.post_ids, updated_at = excluded.updated_at
+                WHERE posts.status != 'success' OR excluded.status = 'success'
+            """, (platform, account, text_hash, media_key, status,
+                  json.dumps(post_ids or []), datetime.now().isoformat(timespec='seconds')))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
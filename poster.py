@@ -1,715 +1,2505 @@
 import os
+import io
 import time
 import json
+import hashlib
+import mimetypes
+import queue
+import threading
+import glob
+import shutil
+import tempfile
+import subprocess
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from PyQt6.QtCore import QThread, pyqtSignal
-from PIL import Image
+from PIL import Image, ImageSequence
 import moviepy.editor as mp
+from moviepy.config import get_setting
 import tweepy
 import atproto
 import discord
 from discord.ext import commands
 import requests
 import praw
-import base64
 from tweepy import errors as tweepy_errors
+from media_probe import MEDIA_CACHE, MediaProbe, VIDEO_EXTENSIONS
+from post_history import PostHistory
+from media_hosts import create_media_host
+from run_journal import RUN_JOURNAL, RunJournal
+from bandwidth import UPLOAD_SCHEDULER
+from memory_budget import MEMORY_GOVERNOR
+from compression_model import COMPRESSION_MODEL
+from chunked_upload import ResumableUpload, UploadExpired
+from run_metrics import RunMetrics, MetricsStore, note_retry
 
 class MediaProcessor:
     PLATFORM_LIMITS = {
         'Twitter': {'image': 5*1024*1024, 'video': 512*1024*1024, 'formats': ['.jpg', '.png', '.gif', '.mp4']},
         'Bluesky': {'image': 1*1024*1024, 'video': 50*1024*1024, 'formats': ['.jpg', '.png', '.gif', '.mp4']},
-        'Discord': {'image': 8*1024*1024, 'video': 8*1024*1024, 'formats': ['.jpg', '.png', '.gif', '.mp4', '.webm']},
-        'Discord_Nitro': {'image': 50*1024*1024, 'video': 500*1024*1024, 'formats': ['.jpg', '.png', '.gif', '.mp4', '.webm']},
+        'Discord': {'image': 8*1024*1024, 'video': 8*1024*1024, 'request': 8*1024*1024, 'formats': ['.jpg', '.png', '.gif', '.mp4', '.webm']},
+        'Discord_Nitro': {'image': 50*1024*1024, 'video': 500*1024*1024, 'request': 500*1024*1024, 'formats': ['.jpg', '.png', '.gif', '.mp4', '.webm']},
         'Instagram': {'image': 8*1024*1024, 'video': 100*1024*1024, 'formats': ['.jpg', '.jpeg', '.png', '.mp4']},
         'Reddit': {'image': 20*1024*1024, 'video': 1*1024*1024*1024, 'formats': ['.jpg', '.jpeg', '.png', '.gif', '.mp4']}
     }
     
+    # Never shrink below this fraction of the original dimensions
+    MIN_SCALE = 0.25
+    # Palette sizes tried for animated GIFs before their frames are shrunk
+    ANIMATION_COLORS = [256, 128]
+    # Videos at least this long (seconds) are encoded as parallel segments
+    SEGMENT_MIN_DURATION = 120
+    SEGMENT_MIN_SECONDS = 15  # Shortest segment, so per-segment encoder warm-up stays negligible
+    AUDIO_KBPS = 128
+    
     @staticmethod
-    def compress_image(filepath, max_size):
-        try:
-            img = Image.open(filepath)
-            filename, ext = os.path.splitext(filepath)
-            # Add timestamp to avoid conflicts with multiple compressions
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"{filename}_compressed_{timestamp}{ext}"
-            
-            # Convert RGBA to RGB if saving as JPEG
-            if img.mode == 'RGBA' and ext.lower() in ['.jpg', '.jpeg']:
-                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                rgb_img.paste(img, mask=img.split()[3])
-                img = rgb_img
-            
-            # First try without compression
-            img.save(output_path, optimize=True)
-            if os.path.getsize(output_path) <= max_size:
-                return output_path
-            
-            # For formats that support quality
-            if ext.lower() in ['.jpg', '.jpeg']:
-                quality = 90
-                while quality >= 60:
-                    img.save(output_path, quality=quality, optimize=True)
-                    if os.path.getsize(output_path) <= max_size:
-                        break
-                    quality -= 5
-            else:
-                # For PNG and other formats, resize if too large
-                scale = 0.9
-                while scale >= 0.5:
-                    new_size = (int(img.width * scale), int(img.height * scale))
-                    resized = img.resize(new_size, Image.Resampling.LANCZOS)
-                    resized.save(output_path, optimize=True)
-                    if os.path.getsize(output_path) <= max_size:
-                        break
-                    scale -= 0.1
-            
-            return output_path
-        except Exception as e:
-            # If compression fails, return original
-            return filepath
+    def limits_for(platform, discord_nitro=False):
+        # Handle Discord with Nitro
+        if platform == "Discord" and discord_nitro:
+            return MediaProcessor.PLATFORM_LIMITS.get('Discord_Nitro', {})
+        return MediaProcessor.PLATFORM_LIMITS.get(platform, {})
     
     @staticmethod
-    def compress_video(filepath, max_size):
+    def requirement(filepath, limits):
+        """Return (max_size, needs_compression) for a file under a platform's limits, or None if its format can't be posted there"""
+        allowed = [MediaProcessor.normalize_ext(f) for f in limits.get('formats', [])]
+        ext = MediaProcessor.normalize_ext(os.path.splitext(filepath)[1])
+        is_video = ext in VIDEO_EXTENSIONS
+        # Images in a format the platform doesn't take can still be transcoded to one it does
+        accepts_images = any(f in ['.jpg', '.png', '.gif'] for f in allowed)
+        if (is_video and ext not in allowed) or (not is_video and not accepts_images):
+            return None
+        
+        # Metadata comes from the shared probe cache, usually filled while the user composed
         try:
-            video = mp.VideoFileClip(filepath)
-            filename, ext = os.path.splitext(filepath)
-            # Add timestamp to avoid conflicts
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"{filename}_compressed_{timestamp}{ext}"
-            
-            current_size = os.path.getsize(filepath)
-            if current_size <= max_size:
-                video.close()
-                return filepath
-            
-            compression_ratio = max_size / current_size
-            bitrate = f"{int(video.bitrate * compression_ratio * 0.9)}k"
-            
-            video.write_videofile(output_path, bitrate=bitrate, codec='libx264')
-            video.close()
-            return output_path
-        except:
-            # If video compression fails, return original
-            return filepath
-
-class PostWorker(QThread):
-    status_update = pyqtSignal(str)
-    finished = pyqtSignal()
+            file_size = MEDIA_CACHE.lookup(filepath)['size']
+        except Exception:
+            file_size = os.path.getsize(filepath)  # Can't be probed, its size still decides; raises if it's gone
+        max_size = limits.get('video' if is_video else 'image', 0)
+        needs_transcode = not is_video and ext not in allowed
+        return max_size, file_size > max_size or needs_transcode
     
-    def __init__(self, content, media_files, platforms, credentials, scheduled_time=None, discord_nitro=False, discord_separate_messages=False, discord_embed_mode=False):
-        super().__init__()
-        self.content = content
-        self.media_files = media_files
-        self.platforms = platforms
-        self.credentials = credentials
-        self.scheduled_time = scheduled_time
-        self.discord_nitro = discord_nitro
-        self.discord_separate_messages = discord_separate_messages
-        self.discord_embed_mode = discord_embed_mode
-        self.compressed_files = []  # Track compressed files for cleanup
+    @staticmethod
+    def normalize_ext(ext):
+        ext = ext.lower()
+        return '.jpg' if ext == '.jpeg' else ext
     
-    def run(self):
-        if self.scheduled_time and datetime.now() < self.scheduled_time:
-            wait_seconds = (self.scheduled_time - datetime.now()).total_seconds()
-            self.status_update.emit(f"Waiting until {self.scheduled_time.strftime('%Y-%m-%d %H:%M')}...")
-            self.msleep(int(wait_seconds * 1000))
-        
-        self.status_update.emit(f"Starting posts with {len(self.media_files)} media files...")
+    @staticmethod
+    def has_alpha(img):
+        """True only if the image has transparency that is actually used"""
+        if img.mode in ('RGBA', 'LA', 'PA'):
+            return img.getchannel('A').getextrema()[0] < 255
+        if img.mode == 'P' and 'transparency' in img.info:
+            return img.convert('RGBA').getchannel('A').getextrema()[0] < 255
+        return False
+    
+    @staticmethod
+    def choose_output_format(img, ext, formats=None):
+        """Pick the cheapest output format the target accepts for this image"""
+        allowed = [MediaProcessor.normalize_ext(f) for f in (formats or [ext])]
+        if getattr(img, 'is_animated', False) and '.gif' in allowed:
+            return '.gif'
+        if MediaProcessor.has_alpha(img) and '.png' in allowed:
+            return '.png'
+        # Opaque images are far smaller (and faster to encode) as JPEG than as PNG
+        if '.jpg' in allowed:
+            return '.jpg'
+        for candidate in ['.png', '.gif']:
+            if candidate in allowed:
+                return candidate
+        return MediaProcessor.normalize_ext(ext)
+    
+    @staticmethod
+    def prepare_for_format(img, out_ext):
+        """Convert to the pixel mode the output format needs, dropping unused alpha"""
+        if out_ext == '.jpg':
+            if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+                rgba = img.convert('RGBA')
+                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+                rgb_img.paste(rgba, mask=rgba.getchannel('A'))
+                return rgb_img
+            return img.convert('RGB') if img.mode != 'RGB' else img
+        if out_ext == '.png' and not MediaProcessor.has_alpha(img):
+            return img.convert('RGB') if img.mode not in ('RGB', 'L', 'P') else img
+        if img.mode == 'CMYK':
+            return img.convert('RGB')
+        return img
+    
+    @staticmethod
+    def encode(img, out_ext, quality=85):
+        buffer = io.BytesIO()
+        if out_ext == '.jpg':
+            img.save(buffer, 'JPEG', quality=quality, optimize=True)
+        elif out_ext == '.png':
+            img.save(buffer, 'PNG', compress_level=6)
+        else:
+            img.save(buffer, 'GIF', optimize=True)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def fit_jpeg(img, max_size, min_quality=60, max_quality=95, guess=None, attempts=None):
+        """Binary search the highest JPEG quality under max_size.
         
-        for platform in self.platforms:
-            self.status_update.emit(f"\n--- Processing {platform} ---")
-            processed_media = self.process_media_for_platform(platform)
-            self.status_update.emit(f"Prepared {len(processed_media)} files for {platform}")
-            
-            if platform == "Twitter":
-                self.post_to_twitter(processed_media)
-            elif platform == "Bluesky":
-                self.post_to_bluesky(processed_media)
-            elif platform == "Discord":
-                self.post_to_discord(processed_media)
-            elif platform == "Instagram":
-                self.post_to_instagram(processed_media)
-            elif platform == "Reddit":
-                self.post_to_reddit(processed_media)
+        With a predicted quality (guess), that quality and one 3 steps away usually settle it,
+        accepting a result up to 3 steps below the best; the search only covers what they leave.
+        Every encode is appended to attempts as (quality, size).
+        Returns (data, quality), or (smallest attempt, None) if even min_quality is too large.
+        """
+        attempts = attempts if attempts is not None else []
+        def attempt(quality):
+            data = MediaProcessor.encode(img, '.jpg', quality)
+            attempts.append((quality, len(data)))
+            return data
         
-        # Clean up compressed files
-        self.cleanup_compressed_files()
+        best = None
+        smallest = None
+        low, high = min_quality, max_quality
+        if guess is not None:
+            quality = max(min_quality, min(max_quality, guess))
+            data = attempt(quality)
+            if len(data) <= max_size:
+                higher = min(max_quality, quality + 3)
+                if higher > quality:
+                    higher_data = attempt(higher)
+                    if len(higher_data) <= max_size:
+                        return higher_data, higher
+                return data, quality
+            smallest = data
+            lower = max(min_quality, quality - 3)
+            if lower < quality:
+                data = attempt(lower)
+                if len(data) <= max_size:
+                    return data, lower
+                smallest = data
+            high = lower - 1
         
-        self.finished.emit()
+        while low <= high:
+            quality = (low + high) // 2
+            data = attempt(quality)
+            if len(data) <= max_size:
+                best = (data, quality)
+                low = quality + 1
+            else:
+                smallest = data
+                high = quality - 1
+        return best if best else (smallest, None)
     
-    def cleanup_compressed_files(self):
-        """Remove temporary compressed files"""
-        if self.compressed_files:
-            self.status_update.emit("\nCleaning up temporary files...")
-            for filepath in self.compressed_files:
-                try:
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                        self.status_update.emit(f"✓ Removed temporary file: {os.path.basename(filepath)}")
-                except Exception as e:
-                    self.status_update.emit(f"⚠ Failed to remove {os.path.basename(filepath)}: {str(e)}")
+    @staticmethod
+    def fit_png(img, max_size):
+        """Try lossless PNG, then a 256 colour palette. Returns (data, fits)"""
+        data = MediaProcessor.encode(img, '.png')
+        if len(data) <= max_size:
+            return data, True
+        method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+        quantized = MediaProcessor.encode(img.quantize(256, method=method), '.png')
+        return min(data, quantized, key=len), len(quantized) <= max_size
+    
+    @staticmethod
+    def track_memory(stats, *images):
+        """Record the largest total of pixel buffers held at once"""
+        current = sum(img.width * img.height * len(img.getbands()) for img in images)
+        stats['peak_bytes'] = max(stats.get('peak_bytes', 0), current)
     
-    def process_media_for_platform(self, platform):
-        processed = []
+    @staticmethod
+    def decode_for_targets(img, targets, stats):
+        """Decode once, at the smallest resolution that still serves every target.
         
-        # Skip compression for Discord embeds mode (imgBB will handle it)
-        if platform == "Discord" and hasattr(self, 'discord_embed_mode') and self.discord_embed_mode:
-            self.status_update.emit("Skipping compression for Discord embeds mode")
-            return self.media_files[:10]  # Discord max 10 embeds
+        targets is a list of (max_size, out_ext). Bytes per pixel are estimated from a tiny
+        sample encode to work out each target's scale, then JPEGs are decoded with draft()
+        (DCT scaling) and other formats shrunk with reduce() to 1.5x the largest target.
+        Returns the decoded image and each target's estimated scale relative to full size.
+        """
+        full_w, full_h = img.size
+        stats['source_size'] = img.size
+        is_jpeg = img.format == 'JPEG'
         
-        # Handle Discord with Nitro
-        if platform == "Discord" and self.discord_nitro:
-            limits = MediaProcessor.PLATFORM_LIMITS.get('Discord_Nitro', {})
+        if is_jpeg:
+            with Image.open(img.filename) as sample_src:
+                sample_src.draft(sample_src.mode, (max(1, full_w // 8), max(1, full_h // 8)))
+                sample_src.load()
+                sample = sample_src.copy()
         else:
-            limits = MediaProcessor.PLATFORM_LIMITS.get(platform, {})
-        
-        self.status_update.emit(f"Processing {len(self.media_files)} files for {platform}")
+            img.load()
+            MediaProcessor.track_memory(stats, img)
+            factor = max(1, max(full_w, full_h) // 512)
+            sample = img.reduce(factor) if factor > 1 else img
         
-        for filepath in self.media_files:
-            ext = os.path.splitext(filepath)[1].lower()
-            if ext not in limits.get('formats', []):
-                self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - unsupported format for {platform}")
-                continue
-            
-            file_size = os.path.getsize(filepath)
-            is_video = ext in ['.mp4', '.mov', '.webm']
-            max_size = limits.get('video' if is_video else 'image', 0)
-            
-            if max_size == 0:
+        # How busy the image is, the feature the learned model uses besides size and quality
+        stats['entropy'] = sample.convert('L').entropy()
+        bytes_per_pixel = {}
+        scales = []
+        for max_size, out_ext in targets:
+            predicted = COMPRESSION_MODEL.jpeg_scale(max_size, stats['entropy'], full_w * full_h) if out_ext == '.jpg' else None
+            if predicted:
+                scales.append(predicted)
                 continue
-            
-            if file_size > max_size:
-                self.status_update.emit(f"Compressing {os.path.basename(filepath)} for {platform}...")
-                if is_video:
-                    compressed = MediaProcessor.compress_video(filepath, max_size)
-                else:
-                    compressed = MediaProcessor.compress_image(filepath, max_size)
-                
-                # Check if compression actually reduced size enough
-                compressed_size = os.path.getsize(compressed)
-                if compressed_size > max_size:
-                    self.status_update.emit(f"⚠ {os.path.basename(filepath)} still too large after compression ({compressed_size/1024/1024:.1f}MB > {max_size/1024/1024:.1f}MB) - skipping for {platform}")
-                    continue
-                
-                processed.append(compressed)
-                self.compressed_files.append(compressed)  # Track for cleanup
-                self.status_update.emit(f"✓ Compressed {os.path.basename(filepath)} to {compressed_size/1024/1024:.1f}MB")
+            if out_ext not in bytes_per_pixel:
+                encoded = MediaProcessor.encode(MediaProcessor.prepare_for_format(sample, out_ext), out_ext)
+                bytes_per_pixel[out_ext] = len(encoded) / (sample.width * sample.height)
+            # Small samples carry more detail per pixel, so this errs towards a smaller target
+            scales.append(min(1.0, (max_size * 0.9 / bytes_per_pixel[out_ext] / (full_w * full_h)) ** 0.5))
+        
+        needed = max(scales)
+        if needed < 1.0:
+            # Keep 1.5x headroom over the estimate for the quality search to work with
+            decode_w = min(full_w, int(full_w * needed * 1.5) + 1)
+            decode_h = min(full_h, int(full_h * needed * 1.5) + 1)
+            if is_jpeg:
+                img.draft(img.mode, (decode_w, decode_h))
             else:
-                processed.append(filepath)
-                self.status_update.emit(f"✓ {os.path.basename(filepath)} ready ({file_size/1024/1024:.1f}MB)")
+                factor = min(full_w // decode_w, full_h // decode_h)
+                if factor >= 2:
+                    img = img.reduce(factor)
+        img.load()
         
-        return processed
+        # Resampling filters need a true colour mode, palette images would fall back to NEAREST
+        if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA' if MediaProcessor.has_alpha(img) else 'RGB')
+        MediaProcessor.track_memory(stats, img)
+        stats['decoded_size'] = img.size
+        return img, scales
+    
+    @staticmethod
+    def build_pyramid(img, smallest_width):
+        """Halve the decoded image with reduce() while levels stay above the smallest target"""
+        levels = [img]
+        while levels[-1].width // 2 >= smallest_width and levels[-1].height >= 2:
+            levels.append(levels[-1].reduce(2))
+        return levels
+    
+    @staticmethod
+    def fit_to_size(levels, out_ext, max_size, width, min_width, stats, stop=None):
+        """Encode at width, shrinking until the result fits max_size or min_width is reached.
         
-    def post_to_twitter(self, media_files):
-        try:
-            # Validate credentials
-            required_fields = ['bearer_token', 'api_key', 'api_secret', 'access_token', 'access_secret']
-            for field in required_fields:
-                if not self.credentials.get('twitter', {}).get(field):
-                    self.status_update.emit(f"✗ Twitter: Missing {field}")
-                    return
-            
-            client = tweepy.Client(
-                bearer_token=self.credentials['twitter']['bearer_token'],
-                consumer_key=self.credentials['twitter']['api_key'],
-                consumer_secret=self.credentials['twitter']['api_secret'],
-                access_token=self.credentials['twitter']['access_token'],
-                access_token_secret=self.credentials['twitter']['access_secret']
-            )
+        Every attempt resamples from the smallest pyramid level that is still large enough,
+        so no step ever goes back to the full-resolution pixels. Returns (data, fits, size).
+        """
+        base = levels[0]
+        while True:
+            if stop and stop():
+                raise PostCancelled("compression stopped")
+            width = max(1, min(base.width, int(width)))
+            height = max(1, round(base.height * width / base.width))
+            source = next(level for level in reversed(levels) if level.width >= width)
+            if source.width == width:
+                work = source
+            else:
+                work = source.resize((width, height), Image.Resampling.LANCZOS)
+            MediaProcessor.track_memory(stats, *levels, work)
+            work = MediaProcessor.prepare_for_format(work, out_ext)
             
-            if media_files:
-                auth = tweepy.OAuthHandler(
-                    self.credentials['twitter']['api_key'],
-                    self.credentials['twitter']['api_secret']
-                )
-                auth.set_access_token(
-                    self.credentials['twitter']['access_token'],
-                    self.credentials['twitter']['access_secret']
-                )
-                api = tweepy.API(auth)
-                
-                # Test authentication
-                try:
-                    api.verify_credentials()
-                except tweepy.errors.Unauthorized:
-                    self.status_update.emit("✗ Twitter: Invalid credentials or insufficient permissions")
-                    self.status_update.emit("Ensure your app has read AND write permissions")
-                    # Try text-only post
-                    client.create_tweet(text=self.content)
-                    self.status_update.emit("✓ Posted to Twitter (text only)")
-                    return
-                
-                self.status_update.emit(f"Uploading {len(media_files[:4])} media files to Twitter...")
-                media_ids = []
-                
-                for i, filepath in enumerate(media_files[:4]):  # Twitter max 4 media
-                    try:
-                        self.status_update.emit(f"Uploading file {i+1}/{len(media_files[:4])}: {os.path.basename(filepath)}")
-                        media = api.media_upload(filepath)
-                        media_ids.append(media.media_id)
-                    except tweepy.errors.Forbidden as e:
-                        self.status_update.emit(f"⚠ Upload forbidden for {os.path.basename(filepath)}")
-                        self.status_update.emit("Check Twitter app permissions: needs read AND write access")
-                    except Exception as e:
-                        self.status_update.emit(f"⚠ Failed to upload {os.path.basename(filepath)}: {str(e)}")
-                
-                if media_ids:
-                    self.status_update.emit(f"Posting tweet with {len(media_ids)} media files...")
-                    client.create_tweet(text=self.content, media_ids=media_ids)
-                else:
-                    # No media could be uploaded, post text only
-                    client.create_tweet(text=self.content)
-                    self.status_update.emit("✓ Posted to Twitter (text only, media upload failed)")
+            if out_ext == '.jpg':
+                pixels = work.width * work.height
+                attempts = []
+                guess = COMPRESSION_MODEL.jpeg_quality(max_size, stats.get('entropy'), pixels)
+                data, quality = MediaProcessor.fit_jpeg(work, max_size, guess=guess, attempts=attempts)
+                COMPRESSION_MODEL.record('jpeg', [(stats.get('entropy'), pixels, None, q, size) for q, size in attempts])
+                stats['encodes'] = stats.get('encodes', 0) + len(attempts)
+                fits = quality is not None
+            elif out_ext == '.png':
+                data, fits = MediaProcessor.fit_png(work, max_size)
+                stats['encodes'] = stats.get('encodes', 0) + 2
             else:
-                client.create_tweet(text=self.content)
+                data = MediaProcessor.encode(work, out_ext)
+                stats['encodes'] = stats.get('encodes', 0) + 1
+                fits = len(data) <= max_size
             
-            self.status_update.emit("✓ Posted to Twitter")
-        except Exception as e:
-            self.status_update.emit(f"✗ Twitter failed: {str(e)}")
+            if fits or width <= min_width:
+                return data, fits, work.size
+            # Encoded size tracks pixel count, so jump straight to the width that should fit
+            width = max(min_width, width * min(0.9, 0.95 * (max_size / len(data)) ** 0.5))
     
-    def post_to_bluesky(self, media_files):
+    @staticmethod
+    def compressed_path(filepath, out_ext):
+        filename = os.path.splitext(filepath)[0]
+        # Timestamp (to the microsecond) avoids clashes between platforms compressing the same file
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return f"{filename}_compressed_{timestamp}{out_ext}"
+    
+    @staticmethod
+    def memory_slot(filepath, stop=None, video=False):
+        """Book the file's estimated peak memory with the governor for the duration of a with block"""
+        info = MEDIA_CACHE.lookup(filepath)
+        def check():
+            if stop and stop():
+                raise PostCancelled("cancelled while waiting for memory")
+        return MEMORY_GOVERNOR.reserve(MEMORY_GOVERNOR.estimate(dict(info, is_video=True) if video else info),
+                                       os.path.basename(filepath), check)
+    
+    @staticmethod
+    def compress_image_multi(filepath, targets, stats=None, stop=None):
+        """Encode one image for several targets from a single decode.
+        
+        targets maps a key (usually the platform) to (max_size, formats). Targets that end up
+        with the same output format and size limit share one file. Returns key -> output path,
+        with the original filepath for every key if compression fails. stop is polled between
+        encode attempts and raises PostCancelled. Either way, anything already written is removed.
+        """
+        stats = stats if stats is not None else {}
+        written = []
         try:
-            client = atproto.Client()
-            client.login(
-                self.credentials['bluesky']['handle'],
-                self.credentials['bluesky']['password']
-            )
-
-            if media_files:
-                images = []
-                self.status_update.emit(f"Uploading {len(media_files[:4])} images to Bluesky...")
+            with MediaProcessor.memory_slot(filepath, stop):
+                img = Image.open(filepath)
+                ext = os.path.splitext(filepath)[1]
+                animated = getattr(img, 'is_animated', False)
                 
-                for i, filepath in enumerate(media_files[:4]):  # Bluesky max 4 images
-                    try:
-                        # Check file size before upload
-                        file_size = os.path.getsize(filepath)
-                        max_size = MediaProcessor.PLATFORM_LIMITS['Bluesky']['image']
-                        
-                        if file_size > max_size:
-                            self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - too large for Bluesky")
-                            continue
-                        
-                        # Check if it's an image file (Bluesky doesn't support videos)
-                        ext = os.path.splitext(filepath)[1].lower()
-                        if ext not in ['.jpg', '.jpeg', '.png', '.gif']:
-                            self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - Bluesky only supports images")
-                            continue
-                        
-                        with open(filepath, 'rb') as f:
-                            img_data = f.read()
-                        
-                        self.status_update.emit(f"Uploading image {i+1}/{len(media_files[:4])}...")
-                        upload = client.upload_blob(img_data)
-                        images.append({
-                            "image": upload.blob,
-                            "alt": f"Image {i+1}"
-                        })
-                    except Exception as e:
-                        self.status_update.emit(f"⚠ Failed to upload {os.path.basename(filepath)}: {str(e)}")
-                        continue
-
-                if images:
-                    self.status_update.emit(f"Posting with {len(images)} images...")
-                    embed = {
-                        "$type": "app.bsky.embed.images",
-                        "images": images
-                    }
-                    client.send_post(text=self.content, embed=embed)
-                else:
-                    # If no images could be uploaded, post text only
-                    client.send_post(text=self.content)
-
-            else:
-                client.send_post(text=self.content)
-
-            self.status_update.emit("✓ Posted to Bluesky")
+                plan = {}  # (max_size, out_ext) -> keys sharing that derivative
+                for key, (max_size, formats) in targets.items():
+                    out_ext = MediaProcessor.choose_output_format(img, ext, formats)
+                    plan.setdefault((max_size, out_ext), []).append(key)
+                
+                results = {}
+                stills = []
+                for (max_size, out_ext), keys in plan.items():
+                    if animated and out_ext == '.gif':
+                        output_path = MediaProcessor.compressed_path(filepath, out_ext)
+                        written.append(output_path)  # Before writing, so a half-written file is removed too
+                        MediaProcessor.compress_animation(img, output_path, max_size, stop)
+                        for key in keys:
+                            results[key] = output_path
+                    else:
+                        stills.append((max_size, out_ext))
+                
+                if stills:
+                    img.seek(0)
+                    base, scales = MediaProcessor.decode_for_targets(img, stills, stats)
+                    full_w = stats['source_size'][0]
+                    min_width = min(base.width, MediaProcessor.MIN_SCALE * full_w)
+                    widths = [max(min_width, min(base.width, full_w * scale * 1.1)) for scale in scales]
+                    levels = MediaProcessor.build_pyramid(base, min(widths))
+                    stats['pyramid'] = [level.size for level in levels]
+                    stats['outputs'] = {}
+                    
+                    for (max_size, out_ext), width in zip(stills, widths):
+                        data, fits, size = MediaProcessor.fit_to_size(levels, out_ext, max_size, width, min_width, stats, stop)
+                        output_path = MediaProcessor.compressed_path(filepath, out_ext)
+                        written.append(output_path)
+                        with open(output_path, 'wb') as f:
+                            f.write(data)
+                        stats['outputs'][output_path] = size
+                        for key in plan[(max_size, out_ext)]:
+                            results[key] = output_path
+                return results
+        except PostCancelled:
+            MediaProcessor.remove_outputs(written)
+            raise
         except Exception as e:
-            self.status_update.emit(f"✗ Bluesky failed: {str(e)}")
+            # If compression fails, every target gets the original and no derivative is left behind
+            MediaProcessor.remove_outputs(written)
+            return {key: filepath for key in targets}
+    
+    @staticmethod
+    def remove_outputs(paths):
+        for output_path in paths:
+            try:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            except OSError:
+                pass
+    
+    @staticmethod
+    def compress_image(filepath, max_size, formats=None, stats=None, stop=None):
+        return MediaProcessor.compress_image_multi(filepath, {'image': (max_size, formats)}, stats, stop)['image']
 
+    @staticmethod
+    def animation_frames(img):
+        """Every frame of an animation with its duration; identical consecutive frames are merged into one"""
+        frames = []
+        durations = []
+        previous = None
+        for frame in ImageSequence.Iterator(img):
+            duration = frame.info.get('duration', 100)
+            frame = frame.convert('RGBA')
+            data = frame.tobytes()
+            if data == previous:
+                durations[-1] += duration
+                continue
+            previous = data
+            frames.append(frame)
+            durations.append(duration)
+        return frames, durations
+    
+    @staticmethod
+    def shared_palette(frames, colors):
+        """One adaptive palette for the whole animation, built from a strip of sampled frames"""
+        step = max(1, len(frames) // 8)
+        samples = [frame.reduce(max(1, frame.width // 128)) for frame in frames[::step]]
+        strip = Image.new('RGB', (sum(sample.width for sample in samples), max(sample.height for sample in samples)))
+        x = 0
+        for sample in samples:
+            strip.paste(sample.convert('RGB'), (x, 0))
+            x += sample.width
+        return strip.quantize(colors, method=Image.Quantize.MEDIANCUT)
+    
+    @staticmethod
+    def encode_animation(frames, durations, loop, colors):
+        buffer = io.BytesIO()
+        if any(MediaProcessor.has_alpha(frame) for frame in frames):
+            # Transparent frames must be cleared between frames, which rules out delta frames
+            frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:],
+                           duration=durations, loop=loop, optimize=True, disposal=2)
+        else:
+            # Undithered frames on one palette keep unchanged pixels identical from frame to frame,
+            # so with disposal 1 the GIF writer only stores the rectangle that changed
+            palette = MediaProcessor.shared_palette(frames, colors)
+            quantized = [frame.convert('RGB').quantize(palette=palette, dither=Image.Dither.NONE) for frame in frames]
+            quantized[0].save(buffer, 'GIF', save_all=True, append_images=quantized[1:],
+                              duration=durations, loop=loop, optimize=True, disposal=1)
+        return buffer.getvalue()
     
-    def upload_images_for_discord_embeds(self, media_files):
-        """Upload images to imgBB and return embed objects for Discord"""
-        embeds = []
+    @staticmethod
+    def compress_animation(img, output_path, max_size, stop=None):
+        """Fit an animated GIF under max_size keeping every frame: fewer colours first, then smaller frames"""
+        frames, durations = MediaProcessor.animation_frames(img)
+        loop = img.info.get('loop', 0)
         
-        for i, filepath in enumerate(media_files[:10]):  # Discord max 10 embeds
-            ext = os.path.splitext(filepath)[1].lower()
-            if ext not in ['.jpg', '.jpeg', '.png', '.gif']:
-                self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - Discord embeds only support images")
+        scale = 1.0
+        colors = list(MediaProcessor.ANIMATION_COLORS)
+        while True:
+            if stop and stop():
+                raise PostCancelled("compression stopped")
+            size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+            scaled = [frame.resize(size, Image.Resampling.LANCZOS) if scale < 1.0 else frame for frame in frames]
+            data = MediaProcessor.encode_animation(scaled, durations, loop, colors[0])
+            if len(data) <= max_size or scale <= MediaProcessor.MIN_SCALE:
+                break
+            if len(colors) > 1:
+                colors.pop(0)
                 continue
-                
-            # Check if image needs compression for imgBB (32MB limit)
-            file_size = os.path.getsize(filepath)
-            upload_path = filepath
+            scale = max(MediaProcessor.MIN_SCALE, scale * min(0.9, 0.95 * (max_size / len(data)) ** 0.5))
+        
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return output_path
+    
+    @staticmethod
+    def animation_to_mp4(filepath, max_size, stop=None):
+        """Convert an animated GIF to H.264 MP4, usually a fraction of the GIF's size.
+        
+        Constant quality first; if that is over max_size, a bitrate that fits the clip's duration.
+        Returns the MP4 path, or the original filepath if conversion fails.
+        """
+        output_path = MediaProcessor.compressed_path(filepath, '.mp4')
+        info = MEDIA_CACHE.lookup(filepath)
+        duration = info.get('duration') or 1
+        pixels = (info.get('width') or 0) * (info.get('height') or 0)
+        # yuv420p needs even dimensions; faststart lets players begin before the download ends
+        base = [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error', '-i', filepath,
+                '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+                '-movflags', '+faststart', '-an']
+        attempts = [['-crf', '23', '-preset', 'slow']]
+        kbps = int(max_size * 8 / duration / 1000 * 0.9)
+        overshoot = COMPRESSION_MODEL.video_overshoot(pixels, kbps) if kbps > 0 else None
+        if overshoot:
+            kbps = int(max_size * 8 / duration / 1000 * COMPRESSION_MODEL.SAFETY / overshoot)
+        if kbps > 0:
+            attempts.append(['-b:v', f"{kbps}k", '-maxrate', f"{kbps}k", '-bufsize', f"{kbps * 2}k"])
+        try:
+            with MediaProcessor.memory_slot(filepath, stop, video=True):
+                for options in attempts:
+                    if stop and stop():
+                        raise PostCancelled("conversion stopped")
+                    subprocess.run(base + options + [output_path], capture_output=True, check=True)
+                    if '-b:v' in options:
+                        COMPRESSION_MODEL.record('video', [(None, pixels, duration, kbps, os.path.getsize(output_path))])
+                    if os.path.getsize(output_path) <= max_size:
+                        return output_path
+            return output_path  # The caller reports it as too large
+        except PostCancelled:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return filepath
+    
+    @staticmethod
+    def run_ffmpeg(args, stop=None):
+        """Run ffmpeg with args, killing it as soon as stop() is true. Raises PostCancelled or CalledProcessError"""
+        command = [get_setting("FFMPEG_BINARY"), '-y', '-hide_banner', '-loglevel', 'error'] + args
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        while True:
+            try:
+                _, errors = process.communicate(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if stop and stop():
+                    process.kill()
+                    process.communicate()
+                    raise PostCancelled("encoding stopped")
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command, stderr=errors)
+    
+    @staticmethod
+    def compress_video_segmented(filepath, max_size, stop=None):
+        """Encode a long video as keyframe-aligned segments in parallel ffmpeg processes.
+        
+        The video stream is cut at its keyframes without re-encoding, every segment is encoded
+        at the same bitrate so the size budget splits by duration, the audio is encoded once
+        as a whole so it stays in sync, and the pieces are joined with stream copy. Returns the
+        MP4 path, or None when the video is too short to gain or a step fails, so the caller
+        falls back to a single-pass encode.
+        """
+        info = MEDIA_CACHE.lookup(filepath)
+        duration = info.get('duration') or 0
+        cores = os.cpu_count() or 1
+        if duration < MediaProcessor.SEGMENT_MIN_DURATION or cores < 2:
+            return None
+        # As many encoders as the memory budget holds at once; a lone encoder gets every core
+        process_memory = MEMORY_GOVERNOR.estimate(dict(info, is_video=True))
+        workers = max(1, min(cores // 2, MEMORY_GOVERNOR.budget // process_memory))
+        threads = max(1, cores // workers)
+        pixels = (info.get('width') or 0) * (info.get('height') or 0)
+        def check():
+            if stop and stop():
+                raise PostCancelled("cancelled while waiting for memory")
+        
+        work_dir = tempfile.mkdtemp(prefix='social_poster_segments_')
+        output_path = MediaProcessor.compressed_path(filepath, '.mp4')
+        try:
+            # Stream copy can only cut at keyframes, so the segmenter splits at the first one after each mark
+            segment_time = max(MediaProcessor.SEGMENT_MIN_SECONDS, duration / (workers * 2))
+            MediaProcessor.run_ffmpeg(['-i', filepath, '-map', '0:v:0', '-c', 'copy', '-f', 'segment',
+                                       '-segment_time', f"{segment_time:.2f}", '-reset_timestamps', '1',
+                                       os.path.join(work_dir, 'part%04d.mkv')], stop)
+            parts = sorted(glob.glob(os.path.join(work_dir, 'part*.mkv')))
+            if not parts:
+                return None
             
-            if file_size > 32 * 1024 * 1024:
-                self.status_update.emit(f"Compressing {os.path.basename(filepath)} for imgBB (>32MB)...")
-                upload_path = MediaProcessor.compress_image(filepath, 32 * 1024 * 1024)
-                if upload_path != filepath:
-                    self.compressed_files.append(upload_path)  # Track for cleanup
-                
-            self.status_update.emit(f"Uploading {os.path.basename(upload_path)} to imgBB for Discord embed...")
-            imgbb_url = self.upload_to_imgbb(upload_path)
+            total_kbps = max_size * 8 / duration / 1000 * 0.9
+            for _ in range(2):
+                overshoot = COMPRESSION_MODEL.video_overshoot(pixels, total_kbps)
+                if overshoot:
+                    total_kbps = max_size * 8 / duration / 1000 * COMPRESSION_MODEL.SAFETY / overshoot
+            audio_kbps = int(min(MediaProcessor.AUDIO_KBPS, total_kbps * 0.15))
             
-            if imgbb_url:
-                embeds.append({
-                    "image": {"url": imgbb_url}
-                })
-                self.status_update.emit(f"✓ Prepared embed {len(embeds)}/10")
+            def encode_part(part, video_kbps):
+                encoded = part[:-4] + '.mp4'
+                MediaProcessor.run_ffmpeg(['-i', part, '-c:v', 'libx264', '-preset', 'medium', '-pix_fmt', 'yuv420p',
+                                           '-b:v', f"{video_kbps}k", '-maxrate', f"{int(video_kbps * 1.5)}k",
+                                           '-bufsize', f"{video_kbps * 2}k", '-threads', str(threads), '-an', encoded], stop)
+                return encoded
             
-            if len(embeds) >= 10:
-                break
+            def encode_audio():
+                audio = os.path.join(work_dir, 'audio.m4a')
+                try:
+                    MediaProcessor.run_ffmpeg(['-i', filepath, '-map', '0:a:0?', '-vn', '-c:a', 'aac',
+                                               '-b:a', f"{audio_kbps}k", audio], stop)
+                except subprocess.CalledProcessError:
+                    return None  # No audio stream
+                return audio if os.path.exists(audio) else None
+            
+            for attempt in range(2):
+                video_kbps = int(total_kbps - audio_kbps)
+                if video_kbps < 50:
+                    return None
+                # One booking for the whole pool, so its encoders run side by side instead of queueing for memory
+                with MEMORY_GOVERNOR.reserve(process_memory * workers, os.path.basename(filepath), check):
+                    with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix='segment') as pool:
+                        audio_future = pool.submit(encode_audio)
+                        encoded = list(pool.map(lambda part: encode_part(part, video_kbps), parts))
+                        audio = audio_future.result()
                 
-        return embeds
+                list_path = os.path.join(work_dir, 'parts.txt')
+                with open(list_path, 'w', encoding='utf-8') as f:
+                    for path in encoded:
+                        f.write("file '" + path.replace("'", "'\\''") + "'\n")
+                inputs = ['-f', 'concat', '-safe', '0', '-i', list_path]
+                maps = ['-map', '0:v']
+                if audio:
+                    inputs += ['-i', audio]
+                    maps += ['-map', '1:a']
+                MediaProcessor.run_ffmpeg(inputs + maps + ['-c', 'copy', '-movflags', '+faststart', output_path], stop)
+                
+                size = os.path.getsize(output_path)
+                COMPRESSION_MODEL.record('video', [(None, pixels, duration, int(total_kbps), size)])
+                if size <= max_size:
+                    return output_path
+                # Over the limit: one more pass at the bitrate the overshoot says would fit
+                total_kbps *= max_size / size * COMPRESSION_MODEL.SAFETY
+            return output_path  # The caller reports it as too large
+        except PostCancelled:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
     
-    def post_to_discord(self, media_files):
+    @staticmethod
+    def compress_video(filepath, max_size, stop=None):
+        if os.path.getsize(filepath) <= max_size:
+            return filepath
+        # Long videos are encoded as parallel segments
+        segmented = MediaProcessor.compress_video_segmented(filepath, max_size, stop)
+        if segmented:
+            return segmented
+        def check():
+            if stop and stop():
+                raise PostCancelled("compression stopped")
+        video = None
+        output_path = MediaProcessor.compressed_path(filepath, os.path.splitext(filepath)[1])
         try:
-            webhook_url = self.credentials['discord']['webhook_url']
-
-            if media_files:
-                if hasattr(self, 'discord_embed_mode') and self.discord_embed_mode:
-                    self.status_update.emit("Using Discord embeds mode (uploading to imgBB)...")
-
-                    if not self.credentials.get('imgbb', {}).get('api_key'):
-                        self.status_update.emit("✗ Discord embeds require imgBB API key to be configured")
-                        self.status_update.emit("Please configure imgBB in settings to use Discord embeds")
-                        self.status_update.emit("Falling back to attachment mode...")
-                        media_files = media_files[:1]
-                    else:
-                        embeds = self.upload_images_for_discord_embeds(media_files)
-
-                        if embeds:
-                            payload = {
-                                "content": self.content,
-                                "embeds": embeds
-                            }
-                            response = requests.post(webhook_url, json=payload)
-
-                            if response.status_code in [200, 204]:
-                                self.status_update.emit(f"✓ Posted to Discord with {len(embeds)} embedded images")
-                            else:
-                                self.status_update.emit(f"✗ Discord failed: HTTP {response.status_code}")
-                                if response.text:
-                                    self.status_update.emit(f"Error: {response.text}")
-                        else:
-                            response = requests.post(webhook_url, json={"content": self.content})
-                            if response.status_code in [200, 204]:
-                                self.status_update.emit("✓ Posted to Discord (text only, no images could be embedded)")
-
-                elif self.discord_separate_messages:
-                    self.status_update.emit(f"Sending {len(media_files[:10])} files as separate Discord messages...")
-                    success_count = 0
+            with MediaProcessor.memory_slot(filepath, stop, video=True):
+                check()
+                video = mp.VideoFileClip(filepath)
+                
+                # VideoFileClip doesn't expose the source bitrate, so the budget comes from the size limit
+                kbps = max_size * 8 / video.duration / 1000 * 0.9
+                pixels = video.size[0] * video.size[1]
+                # Past encodes tell how far the result lands from what the bitrate asks for
+                for _ in range(2):
+                    overshoot = COMPRESSION_MODEL.video_overshoot(pixels, kbps)
+                    if overshoot:
+                        kbps = max_size * 8 / video.duration / 1000 * COMPRESSION_MODEL.SAFETY / overshoot
+                
+                audio_kbps = int(min(MediaProcessor.AUDIO_KBPS, kbps * 0.15))
+                
+                check()
+                video.write_videofile(output_path, bitrate=f"{int(kbps - audio_kbps)}k", codec='libx264',
+                                      audio_bitrate=f"{audio_kbps}k")
+                # moviepy can't be stopped mid-encode, so a stop that came in meanwhile is honoured here
+                check()
+                COMPRESSION_MODEL.record('video', [(None, pixels, video.duration, int(kbps), os.path.getsize(output_path))])
+                return output_path
+        except PostCancelled:
+            MediaProcessor.remove_outputs([output_path])
+            raise
+        except Exception:
+            # If video compression fails, return original
+            MediaProcessor.remove_outputs([output_path])
+            return filepath
+        finally:
+            if video is not None:
+                video.close()
 
-                    if self.content:
-                        response = requests.post(webhook_url, json={"content": self.content})
-                        if response.status_code in [200, 204]:
-                            self.status_update.emit("✓ Posted text to Discord")
-                        time.sleep(0.5)
+class PostCancelled(Exception):
+    pass
 
-                    for i, filepath in enumerate(media_files[:10]):
-                        try:
-                            with open(filepath, 'rb') as f:
-                                files = [('file', f)]
-                                filename = os.path.basename(filepath)
+class CancelToken:
+    """Cooperative cancellation with an optional deadline; a child token also stops when its parent does"""
+    
+    DEADLINE = "deadline exceeded"
+    
+    def __init__(self, timeout=None, parent=None):
+        self.event = threading.Event()
+        self.parent = parent
+        self.reason = None
+        self.deadline = None
+        self.set_timeout(timeout)
+    
+    def set_timeout(self, timeout):
+        self.deadline = time.monotonic() + timeout if timeout else None
+    
+    def cancel(self, reason="cancelled"):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+    
+    def cancelled(self):
+        if self.event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(self.DEADLINE)
+            return True
+        if self.parent is not None and self.parent.cancelled():
+            self.cancel(self.parent.reason)
+            return True
+        return False
+    
+    def check(self):
+        if self.cancelled():
+            raise PostCancelled(self.reason)
+    
+    def remaining(self):
+        """Seconds left before this token's or a parent's deadline, None if there is none"""
+        limits = []
+        if self.deadline is not None:
+            limits.append(self.deadline - time.monotonic())
+        if self.parent is not None and self.parent.remaining() is not None:
+            limits.append(self.parent.remaining())
+        return max(0, min(limits)) if limits else None
+    
+    def wait(self, seconds):
+        """Sleep for up to seconds; returns False as soon as the token is cancelled"""
+        end = time.monotonic() + seconds
+        while not self.cancelled():
+            left = end - time.monotonic()
+            if left <= 0:
+                return True
+            self.event.wait(min(left, 0.5))
+        return False
 
-                                response = requests.post(
-                                    webhook_url,
-                                    data={"content": f"📎 {filename}"},
-                                    files=files,
-                                    timeout=60
-                                )
+class RateLimiter:
+    """Spaces out requests per key, one key per account or webhook"""
+    
+    def __init__(self):
+        self.next_slot = {}
+        self.lock = threading.Lock()
+    
+    def wait(self, key, interval, token=None):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(key, 0))
+            self.next_slot[key] = slot + interval
+        if slot > now:
+            if token:
+                token.wait(slot - now)
+            else:
+                time.sleep(slot - now)
+    
+    def delay(self, key, seconds):
+        """Push the key's next request back, e.g. after a 429 with Retry-After"""
+        with self.lock:
+            self.next_slot[key] = max(self.next_slot.get(key, 0), time.monotonic() + seconds)
 
-                            if response.status_code in [200, 204]:
-                                success_count += 1
-                                self.status_update.emit(f"✓ Sent file {i+1}/{len(media_files[:10])}: {filename}")
-                            else:
-                                self.status_update.emit(f"✗ Failed to send {filename}: HTTP {response.status_code}")
+class ClientPool:
+    """Logged-in platform sessions kept warm between runs, with their HTTP connection pools.
+    
+    A session is checked out by one account run at a time; concurrent runs log in their own and
+    every session goes back to the pool afterwards, so the pool grows to the real concurrency.
+    """
+    
+    MAX_IDLE = 15 * 60  # Seconds before an unused session is dropped rather than risk a stale login
+    
+    def __init__(self):
+        self.idle = {}  # key -> [(returned at, session)]
+        self.lock = threading.Lock()
+    
+    def acquire(self, key):
+        with self.lock:
+            sessions = self.idle.get(key, [])
+            while sessions:
+                returned_at, session = sessions.pop()
+                if time.monotonic() - returned_at < self.MAX_IDLE:
+                    return session
+        return None
+    
+    def release(self, key, session):
+        with self.lock:
+            self.idle.setdefault(key, []).append((time.monotonic(), session))
+    
+    def clear(self):
+        with self.lock:
+            self.idle.clear()
 
-                            if i < len(media_files[:10]) - 1:
-                                time.sleep(0.5)
+class PreEncoder:
+    """Encodes platform derivatives in the background while a post is still being composed.
 
-                        except Exception as e:
-                            self.status_update.emit(f"✗ Error sending {os.path.basename(filepath)}: {str(e)}")
+    The GUI calls update() whenever the media list or the selected platforms change; planning and
+    encoding run on background threads, one file at a time, and work for files or limits that
+    are no longer selected is cancelled or deleted. When the post starts, PostWorker takes the
+    finished derivatives (waiting for one that is being encoded right now) and owns them from then on.
+    """
 
-                    if success_count > 0:
-                        self.status_update.emit(f"✓ Posted to Discord: {success_count}/{len(media_files[:10])} files sent")
+    def __init__(self):
+        self.lock = threading.RLock()  # Cancelling a queued job runs its cleanup callback under the lock
+        self.planner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pre-plan')
+        self.encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pre-encode')
+        self.generation = 0
+        self.wanted = set()  # (source path, spec) the current composition needs
+        self.awaited = set()  # (source path, spec) a starting post is waiting on
+        self.ready = {}  # (source path, spec) -> (derivative path, source stamp)
+        self.pending = {}  # (source path, spec) -> job encoding it
+        self.claimed = set()  # Derivatives handed to a post, never deleted here
 
-                else:
-                    self.status_update.emit(f"Uploading {len(media_files[:10])} files to Discord (attachments mode)...")
+    @staticmethod
+    def spec(filepath, limits):
+        """What a derivative depends on besides its source: the size limit and, for images, the accepted formats"""
+        requirement = MediaProcessor.requirement(filepath, limits)
+        if not requirement or not requirement[0] or not requirement[1]:
+            return None
+        if os.path.splitext(filepath)[1].lower() in VIDEO_EXTENSIONS:
+            return (requirement[0], 'video')
+        return (requirement[0], tuple(limits.get('formats', [])))
 
-                    files_dict = {}
-                    file_handles = []
+    @staticmethod
+    def stamp(filepath):
+        stat = os.stat(filepath)
+        return (stat.st_mtime, stat.st_size)
 
-                    for i, filepath in enumerate(media_files[:10]):
-                        try:
-                            f = open(filepath, 'rb')
-                            file_handles.append(f)
-                            files_dict[f'files[{i}]'] = (os.path.basename(filepath), f, 'application/octet-stream')
-                            self.status_update.emit(f"Prepared file {i+1}: {os.path.basename(filepath)}")
-                        except Exception as e:
-                            self.status_update.emit(f"✗ Failed to open {os.path.basename(filepath)}: {str(e)}")
+    def update(self, media_files, platforms, discord_nitro=False, discord_embed_mode=False):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self.planner.submit(self.plan, generation, list(media_files), list(platforms), discord_nitro, discord_embed_mode)
 
-                    if files_dict:
-                        try:
-                            data = {'payload_json': json.dumps({'content': self.content})}
+    def plan(self, generation, media_files, platforms, discord_nitro, discord_embed_mode):
+        wanted = {}  # source path -> specs, in media order
+        for filepath in media_files:
+            try:
+                for platform in platforms:
+                    if platform == "Discord" and discord_embed_mode:
+                        continue  # Embeds go to the media host as they are
+                    if platform == "Instagram" and os.path.splitext(filepath)[1].lower() == '.gif':
+                        continue  # May go as MP4, which depends on the media host
+                    spec = self.spec(filepath, MediaProcessor.limits_for(platform, discord_nitro))
+                    if spec and spec not in wanted.setdefault(filepath, []):
+                        wanted[filepath].append(spec)
+            except Exception:
+                continue  # Unreadable or vanished file, the post itself will report it
 
-                            response = requests.post(
-                                webhook_url,
-                                data=data,
-                                files=files_dict,
-                                timeout=120
-                            )
+        with self.lock:
+            if generation != self.generation:
+                return  # The user has changed something again since
+            self.wanted = {(filepath, spec) for filepath, specs in wanted.items() for spec in specs}
+            for key in [key for key in self.ready if key not in self.wanted]:
+                self.discard(key)
+            for job in {id(job): job for job in self.pending.values()}.values():
+                if not any(key in self.wanted or key in self.awaited for key in job['keys']):
+                    job['cancelled'] = True
+                    job['future'].cancel()
+            for filepath, specs in wanted.items():
+                missing = [spec for spec in specs if (filepath, spec) not in self.ready
+                           and not ((filepath, spec) in self.pending and not self.pending[(filepath, spec)]['cancelled'])]
+                if missing:
+                    job = {'filepath': filepath, 'keys': [(filepath, spec) for spec in missing],
+                           'cancelled': False, 'started': False, 'done': threading.Event()}
+                    for key in job['keys']:
+                        self.pending[key] = job
+                    job['future'] = self.encoder.submit(self.encode, job)
+                    job['future'].add_done_callback(lambda future, job=job: self.forget(job) if future.cancelled() else None)
 
-                            if response.status_code in [200, 204]:
-                                self.status_update.emit(f"✓ Posted to Discord with {len(files_dict)} attachments")
-                            else:
-                                self.status_update.emit(f"✗ Discord failed: HTTP {response.status_code}")
-                                if response.text:
-                                    self.status_update.emit(f"Error: {response.text}")
+    def forget(self, job):
+        with self.lock:
+            for key in job['keys']:
+                if self.pending.get(key) is job:
+                    del self.pending[key]
+        job['done'].set()
 
-                                if len(file_handles) > 1:
-                                    self.status_update.emit("Retrying with single file attachment...")
+    def discard(self, key):
+        """Drop a ready derivative, deleting its file unless a post or another entry still uses it (lock held)"""
+        path, _ = self.ready.pop(key)
+        if path in self.claimed or any(other == path for other, _ in self.ready.values()):
+            return
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
 
-                                    for f in file_handles[1:]:
-                                        f.close()
+    def encode(self, job):
+        with self.lock:
+            job['started'] = not job['cancelled']
+        if not job['started']:
+            self.forget(job)
+            return
+        filepath = job['filepath']
+        results = {}
+        try:
+            stamp = self.stamp(filepath)
+            specs = [spec for _, spec in job['keys']]
+            if os.path.splitext(filepath)[1].lower() in VIDEO_EXTENSIONS:
+                for spec in specs:
+                    if job['cancelled']:
+                        break
+                    results[spec] = MediaProcessor.compress_video(filepath, spec[0], stop=lambda: job['cancelled'])
+            else:
+                targets = {spec: (spec[0], list(spec[1])) for spec in specs}
+                results = MediaProcessor.compress_image_multi(filepath, targets, stop=lambda: job['cancelled'])
+        except Exception:
+            results = {}  # Cancelled or failed; the post encodes these itself
 
-                                    file_handles[0].seek(0)
+        with self.lock:
+            for spec, path in results.items():
+                key = (filepath, spec)
+                if path == filepath:
+                    continue  # Compression failed and handed back the original
+                self.ready[key] = (path, stamp)
+                if key not in self.wanted and key not in self.awaited:
+                    self.discard(key)
+            for key in job['keys']:
+                if self.pending.get(key) is job:
+                    del self.pending[key]
+        job['done'].set()
 
-                                    response = requests.post(
-                                        webhook_url,
-                                        data={"content": self.content},
-                                        files=[('file', file_handles[0])],
-                                        timeout=60
-                                    )
+    def take(self, filepath, targets, stop=None):
+        """Hand over finished derivatives for targets (key -> spec). Returns key -> path for those available.
 
-                                    if response.status_code in [200, 204]:
-                                        self.status_update.emit("✓ Posted to Discord with 1 attachment (fallback)")
-                                        self.status_update.emit("Tip: Enable 'Use Discord embeds' or 'Send as separate messages' for multiple images")
+        A derivative being encoded right now is waited for; one still queued is left to the caller.
+        """
+        keys = {key: (filepath, spec) for key, spec in targets.items() if spec}
+        with self.lock:
+            running = {id(job): job for job in (self.pending.get(entry) for entry in keys.values())
+                       if job and job['started'] and not job['cancelled']}
+            self.awaited.update(keys.values())
+        try:
+            for job in running.values():
+                while not job['done'].wait(0.2):
+                    if stop and stop():
+                        return {}
 
-                        finally:
-                            for f in file_handles:
-                                try:
-                                    f.close()
-                                except:
-                                    pass
-                    else:
-                        response = requests.post(webhook_url, json={"content": self.content})
-                        if response.status_code in [200, 204]:
-                            self.status_update.emit("✓ Posted to Discord (text only)")
+            taken = {}
+            with self.lock:
+                for key, entry in keys.items():
+                    if entry not in self.ready:
+                        continue
+                    path, stamp = self.ready[entry]
+                    try:
+                        current = self.stamp(filepath)
+                    except OSError:
+                        current = None
+                    if current != stamp or not os.path.exists(path):
+                        continue  # The source was edited after it was encoded
+                    taken[key] = path
+                    self.claimed.add(path)
+                for entry in set(keys.values()):
+                    # The post encodes whatever wasn't ready, so nothing here is needed for it any more
+                    self.wanted.discard(entry)
+                    if entry in self.ready:
+                        self.discard(entry)
+                    job = self.pending.get(entry)
+                    if job and not job['started'] and not any(key in self.wanted for key in job['keys']):
+                        job['cancelled'] = True
+                        job['future'].cancel()
+            return taken
+        finally:
+            with self.lock:
+                self.awaited.difference_update(keys.values())
 
-            else:
-                response = requests.post(webhook_url, json={"content": self.content})
-                if response.status_code in [200, 204]:
-                    self.status_update.emit("✓ Posted to Discord")
-                else:
-                    self.status_update.emit(f"✗ Discord failed: {response.status_code}")
+    def shutdown(self):
+        """Stop background work and delete every derivative no post has taken"""
+        with self.lock:
+            self.generation += 1
+            self.wanted = set()
+            for job in {id(job): job for job in self.pending.values()}.values():
+                job['cancelled'] = True
+            for key in list(self.ready):
+                self.discard(key)
+        self.planner.shutdown(wait=False, cancel_futures=True)
+        self.encoder.shutdown(wait=False, cancel_futures=True)
 
-        except Exception as e:
-            self.status_update.emit(f"✗ Discord failed: {str(e)}")
+PRE_ENCODER = PreEncoder()
 
-    def upload_to_imgbb(self, filepath):
-        """Upload image to imgBB and return the URL"""
+class PostWorker(QThread):
+    status_update = pyqtSignal(str)
+    results_ready = pyqtSignal(dict)
+    metrics_update = pyqtSignal(dict)  # RunMetrics snapshot, after every phase
+    finished = pyqtSignal()
+    
+    PIPELINE_DEPTH = 4  # Derivatives allowed to wait per account before encoding pauses
+    MAX_CONCURRENT_REQUESTS = 6  # Uploads/publishes in flight across all accounts
+    # Minimum seconds between requests to the same account or webhook
+    REQUEST_INTERVAL = {'Twitter': 1.0, 'Bluesky': 0.5, 'Discord': 0.5, 'Instagram': 1.0, 'Reddit': 2.0}
+    # Field that identifies an account, an empty one means the main entry isn't configured
+    ACCOUNT_FIELDS = {'Twitter': 'access_token', 'Bluesky': 'handle', 'Discord': 'webhook_url',
+                      'Instagram': 'account_id', 'Reddit': 'username'}
+    RUN_TIMEOUT = 30 * 60  # Hard ceiling for a whole run once the scheduled time is reached
+    PLATFORM_TIMEOUT = 10 * 60  # Budget for one account's login, uploads and publish
+    REQUEST_TIMEOUT = 60  # Default for a single HTTP request, cut short by the remaining budget
+    CANCEL_GRACE = 5  # Seconds a stage gets to wind down after cancellation before it is abandoned
+    STAGE_LEAD = 15 * 60  # Scheduled posts start encoding, logging in and uploading this early
+    # Seconds an uploaded handle stays usable (Twitter media ids, unreferenced Bluesky blobs, Instagram containers)
+    HANDLE_LIFETIME = {'Twitter': 24 * 3600, 'Bluesky': 3600, 'Instagram': 24 * 3600}
+    REFRESH_MARGIN = 10 * 60  # Handles this close to expiring at publish time are uploaded again
+    TWITTER_CHUNK = 4 * 1024 * 1024  # APPEND takes up to 5MB; larger files, videos and GIFs upload resumably
+    GRAPH_URL = 'https://graph.facebook.com/v18.0'
+    DISCORD_PART_OVERHEAD = 1024  # Multipart headers per attachment, kept out of the request cap
+    INSTAGRAM_WORKERS = 4  # Carousel children hosted and created at once
+    # Platforms whose logged-in sessions can be kept in a ClientPool (Instagram's holds a per-run executor)
+    POOLED_PLATFORMS = ['Twitter', 'Bluesky', 'Discord', 'Reddit']
+    # Links that can be given their own upload cap in settings; 'Hosting' is imgBB or S3
+    BANDWIDTH_LINKS = ['Twitter', 'Bluesky', 'Discord', 'Instagram', 'Reddit', 'Hosting']
+    # Animated GIFs as MP4: 'always' where the platform can't show a GIF, 'fallback' when the GIF can't be made to fit
+    GIF_AS_VIDEO = {'Instagram': 'always', 'Twitter': 'fallback', 'Discord': 'fallback', 'Reddit': 'fallback'}
+    
+    def __init__(self, content, media_files, platforms, credentials, scheduled_time=None, discord_nitro=False, discord_separate_messages=False, discord_embed_mode=False, run_timeout=None, platform_timeout=None, clients=None, history_path='post_history.db', stage_lead=None, post_anyway=False):
+        super().__init__()
+        self.content = content
+        self.media_files = list(media_files)  # Files that turn out to be missing are dropped from this run
+        self.platforms = platforms
+        self.credentials = credentials
+        self.scheduled_time = scheduled_time
+        self.discord_nitro = discord_nitro
+        self.discord_separate_messages = discord_separate_messages
+        self.discord_embed_mode = discord_embed_mode
+        self.run_timeout = run_timeout or self.RUN_TIMEOUT
+        self.platform_timeout = platform_timeout or self.PLATFORM_TIMEOUT
+        self.stage_lead = self.STAGE_LEAD if stage_lead is None else stage_lead
+        self.post_anyway = post_anyway  # Post again to accounts the history says already have this post
+        self.repost_since = None  # With post_anyway, only history from this time on (this run's own posts) counts
+        self.staged_ahead = False  # Started before the scheduled time, so accounts wait for it before publishing
+        self.token = CancelToken()
+        self.target_tokens = {}  # target name -> child token with the per-platform deadline
+        self.compressed_files = []  # Track compressed files for cleanup
+        self.history = PostHistory(history_path)  # A shared queue points every node at one history
+        self.journal = RUN_JOURNAL  # Steps are written ahead so a crashed run can be resumed
+        self.resumed_uploads = {}  # (account key, file index) -> upload left by an interrupted run
+        self.sent_parts = {}  # (account key, 'text' or file index) -> message that already carries it
+        self.results = {}  # platform -> 'success' / 'failed' / 'skipped' / 'timeout' / 'cancelled'
+        self.account_results = {}  # target name -> status, one entry per account
+        self.prepared = {}  # (platform, source path) -> image derivative from prepare_media_file
+        self.video_derivatives = {}  # (source path, max size) -> compressed video, shared across platforms
+        self.media_host = None  # imgBB or S3, set up when the run starts
+        self.hosted = {}  # source path -> public URL, shared by every account that embeds it
+        self.hosting_locks = {}
+        self.hosting_lock = threading.Lock()
+        self.rate_limiter = RateLimiter()
+        self.request_slots = threading.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        self.clients = clients  # Optional ClientPool shared between runs (the daemon keeps one)
+        self.metrics = RunMetrics(self.metrics_update.emit)
+    
+    def cancel(self):
+        """Ask the run to stop; every stage checks the token and winds down at its next step"""
+        self.token.cancel("cancelled by user")
+    
+    def cancel_status(self, token):
+        return 'timeout' if token.reason == CancelToken.DEADLINE else 'cancelled'
+    
+    def request_timeout(self, token, default=None):
+        """HTTP timeout for the next request: the default, cut short by the remaining budget"""
+        timeout = default or self.REQUEST_TIMEOUT
+        remaining = token.remaining()
+        return timeout if remaining is None else max(1, min(timeout, remaining))
+    
+    def run(self):
         try:
-            api_key = self.credentials.get('imgbb', {}).get('api_key', '')
-            if not api_key:
-                self.status_update.emit("✗ imgBB API key not configured")
-                return None
-            
-            # Check file size (imgBB has a 32MB limit for images)
-            file_size = os.path.getsize(filepath)
-            if file_size > 32 * 1024 * 1024:
-                self.status_update.emit(f"✗ {os.path.basename(filepath)} too large for imgBB (>32MB)")
-                return None
-            
-            with open(filepath, 'rb') as f:
-                image_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            data = {
-                'key': api_key,
-                'image': image_data
-            }
-            
-            response = requests.post(
-                'https://api.imgbb.com/1/upload',
-                data=data,
-                timeout=60  # Longer timeout for uploads
-            )
-            
-            if response.status_code == 200:
-                json_data = response.json()
-                if json_data.get('success'):
-                    return json_data['data']['url']
-                else:
-                    self.status_update.emit(f"✗ imgBB upload failed: {json_data.get('error', {}).get('message', 'Unknown error')}")
-                    return None
-            else:
-                self.status_update.emit(f"✗ imgBB upload failed: HTTP {response.status_code}")
-                return None
-                
+            self.post()
         except Exception as e:
-            self.status_update.emit(f"✗ imgBB upload error: {str(e)}")
+            # Whatever went wrong, the caller has to hear that the run is over
+            self.status_update.emit(f"✗ Posting stopped by an unexpected error: {str(e)}")
+            self.results_ready.emit({platform: self.results.get(platform, 'failed') for platform in self.platforms})
+        finally:
+            self.finished.emit()
+    
+    def post(self):
+        self.staged_ahead = bool(self.scheduled_time and datetime.now() < self.scheduled_time)
+        if self.staged_ahead:
+            # Everything but the final publish calls is done ahead, so the post goes live on time
+            wait_seconds = (self.scheduled_time - datetime.now()).total_seconds() - self.staging_lead()
+            if wait_seconds > 0:
+                self.status_update.emit(f"Waiting until {self.scheduled_time.strftime('%Y-%m-%d %H:%M')} "
+                                        f"(preparing {self.staging_lead() / 60:.0f} minutes ahead)...")
+                if not self.token.wait(wait_seconds):
+                    self.status_update.emit("✗ Scheduled post cancelled")
+                    self.history.close()
+                    self.results_ready.emit({platform: 'cancelled' for platform in self.platforms})
+                    return
+            self.status_update.emit(f"Preparing media and uploads ahead of {self.scheduled_time.strftime('%H:%M:%S')}...")
+        
+        # The run's budget counts from when it is actually due; staging ahead of that comes on top
+        self.token.set_timeout(self.run_timeout + self.seconds_until_publish())
+        self.metrics.started = time.time()
+        self.configure_bandwidth()
+        self.configure_memory()
+        try:
+            self.media_host = create_media_host(self.credentials)
+            if self.media_host:
+                self.media_host.http = UPLOAD_SCHEDULER.session('Hosting')
+                self.media_host.meter = lambda total: UPLOAD_SCHEDULER.transfer('Hosting', total, self.status_update.emit, self.token.cancelled)
+        except Exception as e:
+            self.status_update.emit(f"⚠ Media host unavailable: {str(e)}")
+        self.status_update.emit(f"Starting posts with {len(self.media_files)} media files...")
+        
+        # Identity of this post for the history index: same text + same media content = same post
+        self.text_hash = PostHistory.text_hash(self.content)
+        self.media_key = PostHistory.media_key(self.media_hashes())
+        # Runs of this post to other platforms, or with other Discord options, keep their own journal entries
+        self.run_id = RunJournal.run_id(self.text_hash, self.media_key, self.platforms,
+                                        (self.discord_nitro, self.discord_separate_messages, self.discord_embed_mode))
+        self.resume_from_journal()
+        
+        targets = []  # (platform, name, creds), one per account
+        for platform in self.platforms:
+            accounts = self.platform_accounts(platform)
+            for creds in accounts:
+                name = self.target_name(platform, creds, len(accounts))
+                previous = self.published_before(platform, self.account_label(platform, creds))
+                if previous:
+                    self.status_update.emit(f"✓ {name}: identical post already published on {previous['updated_at']} - skipping")
+                    self.account_results[name] = (platform, 'skipped')
+                else:
+                    targets.append((platform, name, creds))
+                    self.target_tokens[name] = CancelToken(self.platform_timeout, parent=self.token)
+        
+        # One upload consumer per account; the producer feeds them derivatives as they are encoded
+        queues = {name: queue.Queue(maxsize=self.PIPELINE_DEPTH) for _, name, _ in targets}
+        threads = [(threading.Thread(target=self.produce_media, args=(targets, queues), name="encode", daemon=True), self.token)]
+        for platform, name, creds in targets:
+            consumer = threading.Thread(target=self.consume_target, args=(platform, name, creds, queues[name]),
+                                        name=f"upload-{name}", daemon=True)
+            threads.append((consumer, self.target_tokens[name]))
+        for thread, _ in threads:
+            thread.start()
+        abandoned = self.wait_for_threads(threads)
+        
+        # Stages stuck in a call that ignores the token are left behind so the run still ends on time
+        for platform, name, creds in targets:
+            if name not in self.account_results:
+                status = self.cancel_status(self.target_tokens[name])
+                self.status_update.emit(f"✗ {name}: gave up waiting ({self.target_tokens[name].reason})")
+                self.history.record(platform, self.account_label(platform, creds), self.text_hash, self.media_key, status)
+                self.account_results[name] = (platform, status)
+        
+        # A platform only counts as posted once every one of its accounts has it
+        for platform in self.platforms:
+            statuses = [status for target_platform, status in self.account_results.values() if target_platform == platform]
+            for status in ['failed', 'timeout', 'cancelled', 'partial', 'success', 'skipped']:
+                if status in statuses:
+                    self.results[platform] = status
+                    break
+            else:
+                self.results[platform] = 'failed'
+        
+        self.journal_step('ended', all(status in ['success', 'skipped'] for status in self.results.values()))
+        
+        if self.token.cancelled():
+            posted = sum(1 for status in self.results.values() if status in ['success', 'skipped'])
+            self.status_update.emit(f"⚠ Run stopped ({self.token.reason}): {posted}/{len(self.results)} platforms posted")
+        
+        # Clean up compressed files
+        self.cleanup_compressed_files()
+        self.record_metrics()
+        
+        if not abandoned:
+            # Abandoned stages may still write their outcome, so their connection stays open
+            self.history.close()
+        self.results_ready.emit(self.results)
+    
+    def media_hashes(self):
+        """Content hash of every media file; files that are gone are reported and left out of the post"""
+        hashes = []
+        for filepath in list(self.media_files):
+            try:
+                hashes.append(MEDIA_CACHE.lookup(filepath)['hash'])
+            except Exception as e:
+                if not os.path.isfile(filepath):
+                    self.status_update.emit(f"✗ Skipping {os.path.basename(filepath)}: {str(e)}")
+                    self.media_files.remove(filepath)
+                    continue
+                # Unreadable as media (corrupt, or no FFmpeg for videos): the bytes still identify the post
+                self.status_update.emit(f"⚠ Could not probe {os.path.basename(filepath)}: {str(e)}")
+                hashes.append(MediaProbe.file_hash(filepath))
+        return hashes
+    
+    def seconds_until_publish(self):
+        if not self.scheduled_time:
+            return 0
+        return max(0, (self.scheduled_time - datetime.now()).total_seconds())
+    
+    def staging_lead(self):
+        """Seconds before the scheduled time to start, short enough that nothing uploaded expires before it"""
+        lifetimes = [self.HANDLE_LIFETIME[platform] - self.REFRESH_MARGIN for platform in self.platforms if platform in self.HANDLE_LIFETIME]
+        return max(0, min([self.stage_lead] + lifetimes))
+    
+    def wait_for_publish_time(self, name, token):
+        """Hold a staged account until the scheduled time, with its own deadline paused meanwhile"""
+        if not self.staged_ahead:
+            return
+        wait_seconds = (self.scheduled_time - datetime.now()).total_seconds()
+        if wait_seconds <= 0:
+            if wait_seconds < -1:
+                self.status_update.emit(f"⚠ {name} was still being prepared at the scheduled time, publishing {-wait_seconds:.0f}s late")
+            return
+        self.status_update.emit(f"✓ {name} staged, publishing at {self.scheduled_time.strftime('%H:%M:%S')}")
+        left = token.deadline - time.monotonic() if token.deadline is not None else None
+        token.set_timeout(None)
+        try:
+            if not token.wait(wait_seconds):
+                token.check()
+        finally:
+            token.set_timeout(max(left, 0.001) if left is not None else None)
+    
+    def record_metrics(self):
+        """Keep this run's phase timings for the rolling history in the performance panel"""
+        try:
+            store = MetricsStore()
+            store.record(self.metrics.snapshot())
+            store.close()
+        except Exception as e:
+            self.status_update.emit(f"⚠ Could not save run metrics: {str(e)}")
+    
+    def configure_bandwidth(self):
+        """Apply the upload caps from settings (KB/s, empty or 0 = unlimited) to the shared scheduler"""
+        settings = self.credentials.get('bandwidth', {})
+        def rate(field):
+            try:
+                return max(0, int(float(settings.get(field) or 0) * 1024))
+            except ValueError:
+                self.status_update.emit(f"⚠ Ignoring invalid bandwidth limit '{settings.get(field)}' for {field}")
+                return 0
+        total = rate('total')
+        rates = {link: rate(link) for link in self.BANDWIDTH_LINKS}
+        UPLOAD_SCHEDULER.configure(total, rates)
+        caps = [f"{link} {value // 1024}KB/s" for link, value in [('total', total)] + list(rates.items()) if value]
+        if caps:
+            self.status_update.emit(f"Upload bandwidth capped: {', '.join(caps)}")
+    
+    def configure_memory(self):
+        """Apply the memory budget for media processing from settings (MB, empty = default)"""
+        try:
+            MEMORY_GOVERNOR.configure(self.credentials.get('memory', {}).get('budget_mb'))
+        except ValueError as e:
+            self.status_update.emit(f"⚠ Ignoring invalid memory budget: {str(e)}")
+    
+    def resume_from_journal(self):
+        """Pick up derivatives, hosted URLs, uploads and sent messages left by an interrupted run of this same post"""
+        if self.post_anyway:
+            self.repost_since = time.time()
+        try:
+            previous = self.journal.resume(self.run_id)
+            if previous and self.post_anyway and previous['params'].get('repost_since'):
+                # Carrying on with an interrupted post-anyway run: what it already posted still counts
+                self.repost_since = previous['params']['repost_since']
+            self.journal.start(self.run_id, {
+                'content': self.content, 'media_files': self.media_files, 'platforms': self.platforms,
+                'discord_nitro': self.discord_nitro, 'discord_separate_messages': self.discord_separate_messages,
+                'discord_embed_mode': self.discord_embed_mode, 'repost_since': self.repost_since
+            })
+        except Exception as e:
+            self.status_update.emit(f"⚠ Run journal unavailable, this run can't be resumed after a crash: {str(e)}")
+            self.journal = None
+            return
+        if not previous:
+            return
+        
+        reused = 0
+        for (platform, source), path in previous['prepared'].items():
+            if source in self.media_files and os.path.exists(path):
+                self.prepared[(platform, source)] = path
+                if path not in self.compressed_files:
+                    self.compressed_files.append(path)
+                reused += 1
+        self.hosted.update({source: url for source, url in previous['hosted'].items() if url and source in self.media_files})
+        self.resumed_uploads = previous['uploaded']
+        self.sent_parts = {key: sent for key, sent in previous['sent'].items()
+                           if not self.repost_since or sent['at'] >= self.repost_since}
+        started = datetime.fromtimestamp(previous['started']).strftime('%Y-%m-%d %H:%M')
+        self.status_update.emit(
+            f"Resuming run from {started}: reusing {reused} derivatives, {len(self.hosted)} hosted files "
+            f"and up to {len(self.resumed_uploads)} uploads"
+        )
+    
+    def published_before(self, platform, account):
+        """History entry of this post already published to the account, or None when it should be posted"""
+        previous = self.history.succeeded(platform, account, self.text_hash, self.media_key)
+        if previous and self.repost_since and datetime.fromisoformat(previous['updated_at']).timestamp() < self.repost_since:
             return None
-
-    def post_to_instagram(self, media_files):
+        return previous
+    
+    def already_sent(self, target_key):
+        """Parts of the post ('text', file indexes) an earlier attempt got into this account, with their message ids"""
+        return {part: sent['message_id'] for (target, part), sent in self.sent_parts.items() if target == target_key}
+    
+    def note_sent(self, target_key, parts, message_id):
+        """Record one message that went out, so a retry after a partial send only sends the rest"""
+        for part in parts:
+            self.sent_parts[(target_key, part)] = {'message_id': message_id, 'at': time.time()}
+        self.journal_step('sent', target_key, parts, message_id)
+    
+    def journal_step(self, step, *args):
+        """Write a step to the run journal; a journal that can't be written never stops the post"""
+        if self.journal is None:
+            return
         try:
-            access_token = self.credentials['instagram']['access_token']
-            account_id = self.credentials['instagram']['account_id']
-            
-            if not media_files:
-                self.status_update.emit("✗ Instagram requires at least one image or video")
+            getattr(self.journal, step)(self.run_id, *args)
+        except Exception as e:
+            self.status_update.emit(f"⚠ Run journal write failed: {str(e)}")
+    
+    def resumed_upload(self, platform, target_key, index, path):
+        """Handle uploaded to this account by an interrupted run, if it can still be used"""
+        upload = self.resumed_uploads.get((target_key, index))
+        if not upload:
+            return None
+        # A handle that would expire before the post goes out is uploaded again
+        lifetime = self.HANDLE_LIFETIME.get(platform)
+        if lifetime and upload['at'] + lifetime < time.time() + self.seconds_until_publish() + self.REFRESH_MARGIN:
+            return None
+        # Media ids and embeds stand for the source file; local paths (attachments, Reddit) must be the same file
+        if upload['handle'] == upload['path'] and upload['path'] != path:
+            return None
+        return upload['handle']
+    
+    def wait_for_threads(self, threads):
+        """Join (thread, token) pairs; a thread still running CANCEL_GRACE seconds after its token
+        was cancelled or ran out of time is abandoned. Returns the abandoned threads."""
+        cancelled_at = {}
+        while True:
+            running = [(thread, token) for thread, token in threads if thread.is_alive()]
+            abandoned = []
+            for thread, token in running:
+                if token.cancelled():
+                    cancelled_at.setdefault(thread, time.monotonic())
+                    if time.monotonic() - cancelled_at[thread] >= self.CANCEL_GRACE:
+                        abandoned.append(thread)
+            if len(abandoned) == len(running):
+                return abandoned
+            time.sleep(0.1)
+    
+    def platform_accounts(self, platform):
+        """Credential sets for every account on a platform: the main entry plus its 'accounts' list.
+        
+        Extra accounts inherit the main entry's fields, so e.g. Twitter accounts can share one
+        app's keys and only list their own access tokens.
+        """
+        creds = self.credentials.get(platform.lower(), {})
+        main = {key: value for key, value in creds.items() if key != 'accounts'}
+        extra = [dict(main, **account) for account in creds.get('accounts', [])]
+        if extra and not main.get(self.ACCOUNT_FIELDS.get(platform, ''), ''):
+            return extra
+        return [main] + extra
+    
+    def target_name(self, platform, creds, account_count):
+        if account_count == 1:
+            return platform
+        return f"{platform} [{creds.get('name') or self.account_label(platform, creds)}]"
+    
+    def put_media(self, media_queue, token, item):
+        """Queue an item for a consumer, giving up once that consumer is cancelled"""
+        while not token.cancelled():
+            try:
+                media_queue.put(item, timeout=0.2)
                 return
+            except queue.Full:
+                continue
+    
+    def produce_media(self, targets, queues):
+        """Encode file by file, handing each derivative to every account's queue as soon as it exists"""
+        platforms = list(dict.fromkeys(platform for platform, _, _ in targets))
+        try:
+            for index, filepath in enumerate(self.media_files):
+                self.token.check()
+                try:
+                    self.produce_file(index, filepath, platforms, targets, queues)
+                except PostCancelled:
+                    raise
+                except Exception as e:
+                    # One bad file (gone, corrupt, unreadable) is left out, the rest still go
+                    self.status_update.emit(f"✗ Skipping {os.path.basename(filepath)}: {str(e)}")
+        except PostCancelled as e:
+            self.status_update.emit(f"✗ Media preparation stopped ({e})")
+        finally:
+            for _, name, _ in targets:
+                self.put_media(queues[name], self.target_tokens[name], None)
+    
+    def produce_file(self, index, filepath, platforms, targets, queues):
+        filename = os.path.basename(filepath)
+        # Images are encoded for every platform at once, so that work is shown on its own row
+        with self.metrics.phase('Media', 'Media', 'compress', filename, MEDIA_CACHE.get_size(filepath)):
+            self.prepare_media_file(filepath, platforms)
+        for platform in platforms:
+            with self.metrics.phase(platform, platform, 'compress', filename) as span:
+                path = self.media_for_platform(platform, filepath)
+                span['bytes'] = os.path.getsize(path) if path else 0
+                span['ok'] = bool(path)
+            if not path:
+                continue
+            # Accounts on the same platform share the derivative
+            for target_platform, name, _ in targets:
+                if target_platform == platform:
+                    # Blocks when an account's uploads fall behind, bounding the derivatives waiting on disk
+                    self.put_media(queues[name], self.target_tokens[name], (index, path))
+    
+    def consume_target(self, platform, name, creds, media_queue):
+        """Log in, upload each derivative as it arrives, then publish once the producer is done"""
+        token = self.target_tokens[name]
+        target_key = f"{platform}:{self.account_label(platform, creds)}"
+        self.status_update.emit(f"\n--- Processing {name} ---")
+        post_ids = None
+        session = None
+        try:
+            token.check()
+            with self.metrics.phase(name, platform, 'login') as span:
+                session = self.checkout_session(platform, creds, token)
+                span['ok'] = session is not None
+            if session is not None:
+                session['name'] = name
+                session['token'] = token
+                session['target_key'] = target_key
             
-            filepath = media_files[0]  # Use first media file
-            ext = os.path.splitext(filepath)[1].lower()
+            handles = []
+            received = 0
+            while True:
+                token.check()
+                try:
+                    item = media_queue.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                index, path = item
+                if session is not None:
+                    handle = self.resumed_upload(platform, target_key, index, path)
+                    if handle is not None:
+                        self.status_update.emit(f"✓ {os.path.basename(path)} already uploaded to {name}, reusing it")
+                    else:
+                        with self.metrics.phase(name, platform, 'upload', os.path.basename(path),
+                                                os.path.getsize(path), media_queue.qsize()) as span:
+                            handle = self.platform_upload(platform, session, path, received)
+                            span['ok'] = handle is not None
+                        if handle is not None:
+                            self.journal_step('uploaded', target_key, index, path, handle)
+                    if handle is not None:
+                        handles.append((index, handle))
+                received += 1
             
-            # Upload to imgBB for images
-            if ext in ['.jpg', '.jpeg', '.png']:
-                self.status_update.emit("Uploading image to imgBB...")
-                media_url = self.upload_to_imgbb(filepath)
-                
-                if not media_url:
-                    self.status_update.emit("✗ Failed to upload image to imgBB")
-                    return
-                
-                self.status_update.emit(f"✓ Image uploaded to imgBB: {media_url}")
-                
-                # Create media container
-                container_data = {
-                    'image_url': media_url,
-                    'caption': self.content,
-                    'access_token': access_token
-                }
-                endpoint = f'https://graph.facebook.com/v18.0/{account_id}/media'
-                
-            elif ext == '.mp4':
-                # For videos, we'd need a different hosting solution
-                # imgBB doesn't support video uploads
-                self.status_update.emit("✗ Video posting requires a video hosting solution (imgBB doesn't support videos)")
-                self.status_update.emit("Consider using AWS S3, Cloudinary, or other video hosting services")
+            if session is not None:
+                session['received'] = received
+                self.status_update.emit(f"Prepared {received} files for {name}")
+                handles.sort(key=lambda item: item[0])
+                token.check()
+                session['indexes'] = [index for index, _ in handles]
+                handles = [handle for _, handle in handles]
+                if hasattr(self, f"{platform.lower()}_stage"):
+                    with self.metrics.phase(name, platform, 'stage') as span:
+                        handles = self.platform_stage(platform, session, handles)
+                        span['ok'] = bool(handles)
+                if self.staged_ahead:
+                    with self.metrics.phase(name, platform, 'wait'):
+                        self.wait_for_publish_time(name, token)
+                with self.metrics.phase(name, platform, 'publish') as span:
+                    post_ids = self.platform_publish(platform, session, handles)
+                    span['ok'] = bool(post_ids)
+            status = 'success' if post_ids else 'failed'
+        except PostCancelled as e:
+            status = self.cancel_status(token)
+            self.status_update.emit(f"✗ {name} {status}: {e}")
+        finally:
+            # Background work a login started (Instagram's carousel items) never outlives the account,
+            # however it ended; staging shuts it down sooner when it gets that far
+            if session is not None and session.get('executor'):
+                session['executor'].shutdown(wait=False, cancel_futures=True)
+        if not post_ids and self.already_sent(target_key):
+            # Some messages did go out; they are kept in the history and not sent again on a retry
+            post_ids = list(dict.fromkeys(self.already_sent(target_key).values()))
+            if status == 'failed':
+                status = 'partial'
+        
+        self.history.record(platform, self.account_label(platform, creds), self.text_hash, self.media_key, status, post_ids)
+        self.journal_step('published', target_key, status, post_ids)
+        if session is not None and status == 'success' and self.clients is not None and platform in self.POOLED_PLATFORMS:
+            # Only sessions that just worked go back, a broken login shouldn't be handed to the next run
+            self.clients.release(self.client_key(platform, creds),
+                                 {key: value for key, value in session.items() if key not in ['name', 'token', 'received', 'target_key', 'indexes']})
+        self.account_results[name] = (platform, status)
+        if name != platform:
+            self.status_update.emit(f"{'✓' if status == 'success' else '✗'} {name}: {status}")
+    
+    def client_key(self, platform, creds):
+        # Changed credentials mean a new login; Twitter only sets up its media API when there is media
+        fingerprint = json.dumps(creds, sort_keys=True)
+        if platform == 'Twitter':
+            fingerprint += str(bool(self.media_files))
+        return (platform, hashlib.sha256(fingerprint.encode('utf-8')).hexdigest())
+    
+    def checkout_session(self, platform, creds, token):
+        """A warm session from the client pool if there is one, otherwise a fresh login"""
+        if self.clients is not None and platform in self.POOLED_PLATFORMS:
+            session = self.clients.acquire(self.client_key(platform, creds))
+            if session is not None:
+                self.status_update.emit(f"✓ {platform}: reusing logged-in session")
+                return session
+        return self.platform_login(platform, creds, token)
+    
+    def platform_login(self, platform, creds, token):
+        try:
+            return getattr(self, f"{platform.lower()}_login")(creds, token)
+        except PostCancelled:
+            raise
+        except Exception as e:
+            self.status_update.emit(f"✗ {platform} failed: {str(e)}")
+            return None
+    
+    def platform_upload(self, platform, session, filepath, position):
+        """Upload one file and return its platform handle (media id, blob, embed, ...), or None to leave it out"""
+        try:
+            self.rate_limiter.wait(session['name'], self.REQUEST_INTERVAL.get(platform, 0), session['token'])
+            session['token'].check()
+            with self.request_slots, UPLOAD_SCHEDULER.label(os.path.basename(filepath), self.status_update.emit, session['token'].cancelled):
+                return getattr(self, f"{platform.lower()}_upload")(session, filepath, position)
+        except PostCancelled:
+            raise
+        except Exception as e:
+            self.status_update.emit(f"⚠ Failed to upload {os.path.basename(filepath)} to {session['name']}: {str(e)}")
+            return None
+    
+    def platform_stage(self, platform, session, handles):
+        """Last preparation that can be done before the post goes live (e.g. Instagram's final container)"""
+        stage = getattr(self, f"{platform.lower()}_stage", None)
+        if stage is None:
+            return handles
+        try:
+            with self.request_slots, UPLOAD_SCHEDULER.label(f"{session['name']} staging", self.status_update.emit, session['token'].cancelled):
+                return stage(session, handles)
+        except PostCancelled:
+            raise
+        except Exception as e:
+            self.status_update.emit(f"✗ {session['name']} failed: {str(e)}")
+            return []
+    
+    def platform_publish(self, platform, session, handles):
+        try:
+            self.rate_limiter.wait(session['name'], self.REQUEST_INTERVAL.get(platform, 0), session['token'])
+            session['token'].check()
+            with self.request_slots, UPLOAD_SCHEDULER.label(f"{session['name']} post", self.status_update.emit, session['token'].cancelled):
+                return getattr(self, f"{platform.lower()}_publish")(session, handles)
+        except PostCancelled:
+            raise
+        except Exception as e:
+            self.status_update.emit(f"✗ {session['name']} failed: {str(e)}")
+            return None
+    
+    def account_label(self, platform, creds):
+        """Non-secret identifier of the account a platform posts as, used in the history key"""
+        if platform == "Twitter":
+            # Access tokens are prefixed with the numeric user id
+            return creds.get('access_token', '').split('-')[0]
+        if platform == "Bluesky":
+            return creds.get('handle', '')
+        if platform == "Discord":
+            # .../api/webhooks/<webhook id>/<token>
+            parts = creds.get('webhook_url', '').rstrip('/').split('/')
+            return parts[-2] if len(parts) >= 2 else ''
+        if platform == "Instagram":
+            return creds.get('account_id', '')
+        if platform == "Reddit":
+            return creds.get('username', '')
+        return ''
+    
+    def cleanup_compressed_files(self):
+        """Remove temporary compressed files"""
+        if self.compressed_files:
+            self.status_update.emit("\nCleaning up temporary files...")
+            for filepath in self.compressed_files:
+                try:
+                    if os.path.exists(filepath):
+                        os.remove(filepath)
+                        self.status_update.emit(f"✓ Removed temporary file: {os.path.basename(filepath)}")
+                except Exception as e:
+                    self.status_update.emit(f"⚠ Failed to remove {os.path.basename(filepath)}: {str(e)}")
+    
+    def platform_limits(self, platform):
+        return MediaProcessor.limits_for(platform, self.discord_nitro)
+    
+    def uses_original_media(self, platform):
+        # Skip compression for Discord embeds mode (the media host will handle it)
+        return platform == "Discord" and self.discord_embed_mode
+    
+    def media_requirement(self, platform, filepath):
+        """Return (max_size, needs_compression) for a file on a platform, or None if its format can't be posted there"""
+        return MediaProcessor.requirement(filepath, self.platform_limits(platform))
+    
+    def prepare_media_file(self, filepath, platforms):
+        """Decode a source image once and encode every platform's derivative from that decode"""
+        if os.path.splitext(filepath)[1].lower() in VIDEO_EXTENSIONS:
+            return
+        
+        targets = {}
+        for platform in platforms:
+            if self.uses_original_media(platform) or (platform, filepath) in self.prepared:
+                continue
+            if self.gif_video_mode(platform, filepath) == 'always':
+                continue
+            requirement = self.media_requirement(platform, filepath)
+            if requirement and requirement[0] and requirement[1]:
+                targets[platform] = (requirement[0], self.platform_limits(platform).get('formats', []))
+        if not targets:
+            return
+        
+        # Derivatives encoded while the post was being composed only need handing over
+        specs = {platform: PreEncoder.spec(filepath, self.platform_limits(platform)) for platform in targets}
+        ready = PRE_ENCODER.take(filepath, specs, self.token.cancelled)
+        if ready:
+            self.status_update.emit(f"✓ {os.path.basename(filepath)} was encoded for {', '.join(ready)} in the background, reusing it")
+            for platform, path in ready.items():
+                self.prepared[(platform, filepath)] = path
+                del targets[platform]
+            if not targets:
                 return
+        
+        self.status_update.emit(f"Encoding {os.path.basename(filepath)} for {', '.join(targets)}...")
+        stats = {}
+        results = MediaProcessor.compress_image_multi(filepath, targets, stats, self.token.cancelled)
+        if stats.get('decoded_size'):
+            decoded_w, decoded_h = stats['decoded_size']
+            self.status_update.emit(
+                f"Decoded once at {decoded_w}x{decoded_h}, {len(stats['pyramid'])} pyramid levels, "
+                f"{len(set(results.values()))} derivatives from {stats.get('encodes', 0)} trial encodes "
+                f"(peak ~{stats['peak_bytes']/1024/1024:.0f}MB pixel memory)"
+            )
+        for platform, path in results.items():
+            self.prepared[(platform, filepath)] = path
+    
+    def video_derivative(self, filepath, max_size):
+        """Compress a video once per size limit, platforms with the same limit share the result"""
+        key = (filepath, max_size)
+        if key not in self.video_derivatives:
+            ready = PRE_ENCODER.take(filepath, {'video': (max_size, 'video')}, self.token.cancelled)
+            if ready:
+                self.status_update.emit(f"✓ {os.path.basename(filepath)} was compressed in the background, reusing it")
+                self.video_derivatives[key] = ready['video']
             else:
-                self.status_update.emit(f"✗ Instagram doesn't support {ext} files")
-                return
+                self.video_derivatives[key] = MediaProcessor.compress_video(filepath, max_size, self.token.cancelled)
+        return self.video_derivatives[key]
+    
+    def gif_video_mode(self, platform, filepath):
+        """How an animated GIF goes to a platform as video: 'always', 'fallback' or None"""
+        if os.path.splitext(filepath)[1].lower() != '.gif' or (MEDIA_CACHE.lookup(filepath).get('frames') or 1) < 2:
+            return None
+        mode = self.GIF_AS_VIDEO.get(platform)
+        # Instagram fetches media from the host, which has to be able to serve video
+        if platform == 'Instagram' and not (self.media_host and self.media_host.supports_video):
+            return None
+        return mode
+    
+    def animation_as_video(self, platform, filepath):
+        """MP4 version of an animated GIF within the platform's video limit, or None"""
+        max_size = self.platform_limits(platform).get('video', 0)
+        previous = self.prepared.get((platform, filepath))
+        if previous and previous.endswith('.mp4') and os.path.exists(previous):
+            return previous
+        
+        key = (filepath, max_size)
+        if key not in self.video_derivatives:
+            self.status_update.emit(f"Converting {os.path.basename(filepath)} to MP4 for {platform}...")
+            self.video_derivatives[key] = MediaProcessor.animation_to_mp4(filepath, max_size, stop=self.token.cancelled)
+        video = self.video_derivatives[key]
+        if video == filepath:
+            self.status_update.emit(f"⚠ Could not convert {os.path.basename(filepath)} to MP4 for {platform}")
+            return None
+        if video not in self.compressed_files:
+            self.compressed_files.append(video)  # Track for cleanup
+        
+        video_size = os.path.getsize(video)
+        if video_size > max_size:
+            self.status_update.emit(f"⚠ {os.path.basename(filepath)} too large for {platform} even as MP4 ({video_size/1024/1024:.1f}MB)")
+            return None
+        self.status_update.emit(f"✓ Converted {os.path.basename(filepath)} to MP4 for {platform} ({video_size/1024/1024:.1f}MB, was {MEDIA_CACHE.get_size(filepath)/1024/1024:.1f}MB)")
+        self.prepared[(platform, filepath)] = video
+        self.journal_step('prepared', platform, filepath, video)
+        return video
+    
+    def media_for_platform(self, platform, filepath):
+        """Return the file to upload for a platform (original or compressed), or None to skip it"""
+        if self.uses_original_media(platform):
+            return filepath
+        
+        gif_video = self.gif_video_mode(platform, filepath)
+        if gif_video == 'always':
+            video = self.animation_as_video(platform, filepath)
+            if video:
+                return video
+            gif_video = None  # Fall back to a still image
+        
+        requirement = self.media_requirement(platform, filepath)
+        if requirement is None:
+            self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - unsupported format for {platform}")
+            return None
+        
+        max_size, needs_compression = requirement
+        if max_size == 0:
+            return None
+        
+        if not needs_compression:
+            file_size = MEDIA_CACHE.get_size(filepath)
+            self.status_update.emit(f"✓ {os.path.basename(filepath)} ready for {platform} ({file_size/1024/1024:.1f}MB)")
+            return filepath
+        
+        if (platform, filepath) in self.prepared:
+            compressed = self.prepared[(platform, filepath)]
+        else:
+            self.status_update.emit(f"Compressing {os.path.basename(filepath)} for {platform}...")
+            if os.path.splitext(filepath)[1].lower() in VIDEO_EXTENSIONS:
+                compressed = self.video_derivative(filepath, max_size)
+            else:
+                compressed = MediaProcessor.compress_image(filepath, max_size, self.platform_limits(platform).get('formats', []), stop=self.token.cancelled)
+        
+        if compressed == filepath:
+            # Compression failed and handed back the original, which must not be cleaned up
+            if gif_video == 'fallback':
+                return self.animation_as_video(platform, filepath)
+            self.status_update.emit(f"⚠ Could not convert {os.path.basename(filepath)} for {platform} - skipping")
+            return None
+        
+        if compressed not in self.compressed_files:
+            self.compressed_files.append(compressed)  # Track for cleanup
+        
+        # Check if compression actually reduced size enough
+        compressed_size = os.path.getsize(compressed)
+        if compressed_size > max_size:
+            if gif_video == 'fallback':
+                self.status_update.emit(f"⚠ {os.path.basename(filepath)} doesn't fit {platform} as a GIF, trying MP4")
+                return self.animation_as_video(platform, filepath)
+            self.status_update.emit(f"⚠ {os.path.basename(filepath)} still too large after compression ({compressed_size/1024/1024:.1f}MB > {max_size/1024/1024:.1f}MB) - skipping for {platform}")
+            return None
+        
+        self.status_update.emit(f"✓ Compressed {os.path.basename(filepath)} for {platform} to {compressed_size/1024/1024:.1f}MB")
+        self.journal_step('prepared', platform, filepath, compressed)
+        return compressed
+    
+    def twitter_login(self, creds, token):
+        # Validate credentials
+        required_fields = ['bearer_token', 'api_key', 'api_secret', 'access_token', 'access_secret']
+        for field in required_fields:
+            if not creds.get(field):
+                self.status_update.emit(f"✗ Twitter: Missing {field}")
+                return None
+        
+        session = {
+            'client': tweepy.Client(
+                bearer_token=creds['bearer_token'],
+                consumer_key=creds['api_key'],
+                consumer_secret=creds['api_secret'],
+                access_token=creds['access_token'],
+                access_token_secret=creds['access_secret']
+            ),
+            'api': None,
+            'media_forbidden': False,
+            # Media ids belong to the account that uploaded them, so resumable uploads are kept per account
+            'account': hashlib.sha256(creds['access_token'].encode('utf-8')).hexdigest()[:16]
+        }
+        
+        if self.media_files:
+            auth = tweepy.OAuthHandler(creds['api_key'], creds['api_secret'])
+            auth.set_access_token(creds['access_token'], creds['access_secret'])
+            api = tweepy.API(auth, timeout=self.request_timeout(token))
+            # Media uploads go through the API's own requests session
+            UPLOAD_SCHEDULER.session('Twitter', session=api.session)
+            
+            # Test authentication
+            try:
+                api.verify_credentials()
+                session['api'] = api
+            except tweepy.errors.Unauthorized:
+                self.status_update.emit("✗ Twitter: Invalid credentials or insufficient permissions")
+                self.status_update.emit("Ensure your app has read AND write permissions")
+                session['media_forbidden'] = True
+        return session
+    
+    def twitter_upload(self, session, filepath, position):
+        if session['api'] is None or position >= 4:  # Twitter max 4 media
+            return None
+        try:
+            self.status_update.emit(f"Uploading file {position+1} to Twitter: {os.path.basename(filepath)}")
+            if self.twitter_chunked(filepath):
+                return self.twitter_chunked_upload(session, filepath)
+            media = session['api'].media_upload(filepath)
+            return media.media_id
+        except tweepy.errors.Forbidden as e:
+            self.status_update.emit(f"⚠ Upload forbidden for {os.path.basename(filepath)}")
+            self.status_update.emit("Check Twitter app permissions: needs read AND write access")
+        except Exception as e:
+            self.status_update.emit(f"⚠ Failed to upload {os.path.basename(filepath)}: {str(e)}")
+        return None
+    
+    def twitter_chunked(self, filepath):
+        ext = os.path.splitext(filepath)[1].lower()
+        return ext in VIDEO_EXTENSIONS or ext == '.gif' or MEDIA_CACHE.get_size(filepath) > self.TWITTER_CHUNK
+    
+    def twitter_chunked_upload(self, session, filepath):
+        """Upload through INIT/APPEND/FINALIZE chunk by chunk, so a dropped connection costs one chunk
+        and an interrupted run picks up from the last chunk Twitter acknowledged"""
+        api = session['api']
+        token = session['token']
+        ext = os.path.splitext(filepath)[1].lower()
+        media_type = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+        category = 'tweet_video' if ext in VIDEO_EXTENSIONS else 'tweet_gif' if ext == '.gif' else 'tweet_image'
+        
+        def start(size):
+            media = api.chunked_upload_init(size, media_type, media_category=category)
+            return media.media_id, time.time() + (getattr(media, 'expires_after_secs', None) or 24 * 3600)
+        
+        def append(media_id, index, data):
+            try:
+                api.chunked_upload_append(media_id, io.BytesIO(data), index)
+            except tweepy_errors.BadRequest as e:
+                raise UploadExpired(str(e))  # Unknown or expired media id
+        
+        def finish(media_id, acks):
+            try:
+                return api.chunked_upload_finalize(media_id)
+            except tweepy_errors.BadRequest as e:
+                raise UploadExpired(str(e))
+        
+        upload = ResumableUpload(f"Twitter:{session['account']}:{MEDIA_CACHE.lookup(filepath)['hash']}", filepath,
+                                 self.TWITTER_CHUNK, start, append, finish, self.status_update.emit, token.cancelled)
+        try:
+            media = upload.run()
+        except IOError:
+            token.check()
+            raise
+        
+        # Videos and GIFs are transcoded after FINALIZE and can't be attached until that is done
+        info = getattr(media, 'processing_info', None)
+        while info and info.get('state') in ['pending', 'in_progress']:
+            if not token.wait(info.get('check_after_secs', 1)):
+                token.check()
+            media = api.get_media_upload_status(media.media_id)
+            info = getattr(media, 'processing_info', None)
+        if info and info.get('state') == 'failed':
+            raise RuntimeError(f"Twitter could not process {os.path.basename(filepath)}: {info.get('error', {}).get('message', 'unknown error')}")
+        return media.media_id
+    
+    def twitter_publish(self, session, media_ids):
+        client = session['client']
+        if media_ids:
+            self.status_update.emit(f"Posting tweet with {len(media_ids)} media files...")
+            response = client.create_tweet(text=self.content, media_ids=media_ids)
+        else:
+            response = client.create_tweet(text=self.content)
+            if session['media_forbidden']:
+                self.status_update.emit("✓ Posted to Twitter (text only)")
+                return [response.data['id']]
+            if session.get('received'):
+                # No media could be uploaded, post text only
+                self.status_update.emit("✓ Posted to Twitter (text only, media upload failed)")
+        
+        self.status_update.emit("✓ Posted to Twitter")
+        return [response.data['id']]
+    
+    def bluesky_login(self, creds, token):
+        client = atproto.Client()
+        client.login(
+            creds['handle'],
+            creds['password']
+        )
+        return {'client': client}
+    
+    def bluesky_upload(self, session, filepath, position):
+        if position >= 4:  # Bluesky max 4 images
+            return None
+        
+        # Check file size before upload
+        file_size = MEDIA_CACHE.get_size(filepath)
+        max_size = MediaProcessor.PLATFORM_LIMITS['Bluesky']['image']
+        
+        if file_size > max_size:
+            self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - too large for Bluesky")
+            return None
+        
+        # Check if it's an image file (Bluesky doesn't support videos)
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext not in ['.jpg', '.jpeg', '.png', '.gif']:
+            self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - Bluesky only supports images")
+            return None
+        
+        # The whole file is read into memory and copied once more into the request
+        with MEMORY_GOVERNOR.reserve(file_size * 2, os.path.basename(filepath), session['token'].check, self.status_update.emit):
+            with open(filepath, 'rb') as f:
+                img_data = f.read()
             
-            # Create container
-            self.status_update.emit("Creating Instagram media container...")
-            container_response = requests.post(endpoint, data=container_data)
+            self.status_update.emit(f"Uploading image {position+1} to Bluesky...")
+            # atproto sends through its own HTTP client, so the bytes are paced through the caps before it does
+            transfer = UPLOAD_SCHEDULER.transfer('Bluesky', len(img_data), self.status_update.emit, session['token'].cancelled)
+            for offset in range(0, len(img_data), UPLOAD_SCHEDULER.CHUNK):
+                transfer.send(min(UPLOAD_SCHEDULER.CHUNK, len(img_data) - offset))
+            upload = session['client'].upload_blob(img_data)
+            transfer.finish()
+        return {
+            "image": upload.blob,
+            "alt": f"Image {position+1}"
+        }
+    
+    def bluesky_publish(self, session, images):
+        client = session['client']
+        if images:
+            self.status_update.emit(f"Posting with {len(images)} images...")
+            embed = {
+                "$type": "app.bsky.embed.images",
+                "images": images
+            }
+            post = client.send_post(text=self.content, embed=embed)
+        else:
+            # If no images could be uploaded, post text only
+            post = client.send_post(text=self.content)
+        
+        self.status_update.emit("✓ Posted to Bluesky")
+        return [post.uri]
+    
+    def host_media(self, filepath, token):
+        """Upload a file to the media host once per run and return its URL, shared by every account that uses it"""
+        host = self.media_host
+        if host is None:
+            self.status_update.emit("✗ No media host configured (set up imgBB or S3 in settings)")
+            return None
+        if not host.accepts(filepath):
+            self.status_update.emit(f"✗ {host.name} can't host {os.path.basename(filepath)} (videos need S3 hosting)")
+            return None
+        
+        with self.hosting_lock:
+            path_lock = self.hosting_locks.setdefault(filepath, threading.Lock())
+        with path_lock:
+            if filepath in self.hosted:
+                return self.hosted[filepath]
             
-            if container_response.status_code == 200:
-                container_id = container_response.json().get('id')
-                
-                # Publish the media
-                self.status_update.emit("Publishing to Instagram...")
-                publish_response = requests.post(
-                    f'https://graph.facebook.com/v18.0/{account_id}/media_publish',
-                    data={
-                        'creation_id': container_id,
-                        'access_token': access_token
-                    }
+            # Check if the image needs compression for the host's size limit
+            file_size = MEDIA_CACHE.get_size(filepath)
+            upload_path = filepath
+            
+            if file_size > host.max_size and os.path.splitext(filepath)[1].lower() not in VIDEO_EXTENSIONS:
+                self.status_update.emit(f"Compressing {os.path.basename(filepath)} for {host.name} (>{host.max_size/1024/1024:.0f}MB)...")
+                upload_path = MediaProcessor.compress_image(filepath, host.max_size, ['.jpg', '.png', '.gif'], stop=token.cancelled)
+                if upload_path != filepath:
+                    self.compressed_files.append(upload_path)  # Track for cleanup
+                    self.journal_step('temp', upload_path)
+            
+            self.status_update.emit(f"Uploading {os.path.basename(upload_path)} to {host.name}...")
+            # Failures are remembered too, so dozens of accounts don't retry the same upload
+            with UPLOAD_SCHEDULER.label(os.path.basename(upload_path), self.status_update.emit, token.cancelled):
+                self.hosted[filepath] = host.host(upload_path, self.request_timeout(token), self.status_update.emit, token.cancelled)
+            if self.hosted[filepath]:
+                self.journal_step('hosted', filepath, self.hosted[filepath])
+            return self.hosted[filepath]
+    
+    def upload_image_for_discord_embed(self, filepath, token):
+        """Host an image and return an embed object for Discord"""
+        ext = os.path.splitext(filepath)[1].lower()
+        if ext not in ['.jpg', '.jpeg', '.png', '.gif']:
+            self.status_update.emit(f"⚠ Skipping {os.path.basename(filepath)} - Discord embeds only support images")
+            return None
+        
+        media_url = self.host_media(filepath, token)
+        if media_url:
+            self.status_update.emit(f"✓ Prepared embed for {os.path.basename(filepath)}")
+            return {"image": {"url": media_url}}
+        return None
+    
+    def discord_message_id(self, response):
+        """Message id from a webhook response (only returned when posting with ?wait=true)"""
+        try:
+            return response.json().get('id') or 'sent'
+        except ValueError:
+            return 'sent'
+    
+    def discord_post(self, session, **kwargs):
+        """POST to a webhook, waiting out a 429 once for JSON messages (open files can't be re-sent)"""
+        kwargs['timeout'] = self.request_timeout(session['token'], kwargs.get('timeout'))
+        # wait=true makes Discord return the created message so its id can be recorded
+        response = session['http'].post(session['webhook_url'], params={'wait': 'true'}, **kwargs)
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json().get('retry_after', 1))
+            except ValueError:
+                retry_after = float(response.headers.get('Retry-After', 1))
+            self.rate_limiter.delay(session['name'], retry_after)
+            note_retry()
+            if 'files' not in kwargs:
+                self.status_update.emit(f"⚠ {session['name']} rate limited, retrying in {retry_after:.1f}s")
+                session['token'].wait(retry_after)
+                session['token'].check()
+                response = session['http'].post(session['webhook_url'], params={'wait': 'true'}, **kwargs)
+        return response
+    
+    @staticmethod
+    def pack_attachments(sizes, cap, max_files=10):
+        """Group file indexes into as few requests as possible, each under cap bytes and max_files files.
+        
+        First-fit decreasing, then each group is put back in post order and the groups sorted by
+        their first file, so attachments still arrive in roughly the order they were added.
+        """
+        groups = []
+        for index in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+            for group in groups:
+                if len(group['files']) < max_files and group['size'] + sizes[index] <= cap:
+                    group['files'].append(index)
+                    group['size'] += sizes[index]
+                    break
+            else:
+                # A file over the cap on its own still gets a request, Discord decides
+                groups.append({'files': [index], 'size': sizes[index]})
+        return sorted((sorted(group['files']) for group in groups), key=lambda files: files[0])
+    
+    def discord_send_group(self, session, paths, content):
+        """Send one packed group as a single message, retrying once after a 429 (files are reopened)"""
+        for attempt in range(2):
+            file_handles = []
+            try:
+                files_dict = {}
+                for i, filepath in enumerate(paths):
+                    f = open(filepath, 'rb')
+                    file_handles.append(f)
+                    files_dict[f'files[{i}]'] = (os.path.basename(filepath), f, 'application/octet-stream')
+                response = self.discord_post(
+                    session,
+                    data={'payload_json': json.dumps({'content': content})},
+                    files=files_dict,
+                    timeout=120
                 )
+            finally:
+                for f in file_handles:
+                    f.close()
+            if response.status_code != 429 or attempt:
+                return response
+            # discord_post already pushed this webhook's next slot back by Retry-After
+            self.status_update.emit(f"⚠ {session['name']} rate limited, retrying attachments")
+            self.rate_limiter.wait(session['name'], 0, session['token'])
+            session['token'].check()
+    
+    def discord_send_attachments(self, session, media):
+        """Post attachments in the fewest messages that fit Discord's per-request size cap"""
+        cap = self.platform_limits('Discord').get('request', 8*1024*1024)
+        budget = cap - len(self.content.encode('utf-8'))
+        # Files (and the text) an earlier attempt already got into the channel aren't sent twice
+        already = self.already_sent(session['target_key'])
+        indexes = session.get('indexes', list(range(len(media))))
+        pending = [position for position in range(len(media)) if indexes[position] not in already]
+        message_ids = list(dict.fromkeys(already.values()))
+        text_sent = 'text' in already or not self.content
+        sizes = [MEDIA_CACHE.get_size(media[position]) + self.DISCORD_PART_OVERHEAD for position in pending]
+        groups = [[pending[i] for i in group] for group in self.pack_attachments(sizes, budget)]
+        
+        if not media:
+            response = self.discord_post(session, json={"content": self.content})
+            if response.status_code in [200, 204]:
+                self.status_update.emit("✓ Posted to Discord (text only)")
+                return [self.discord_message_id(response)]
+            return None
+        if not pending and text_sent:
+            self.status_update.emit("✓ Every attachment was already sent to Discord by an earlier attempt")
+            return message_ids
+        
+        self.status_update.emit(f"Uploading {len(pending)} files to Discord in {len(groups)} message(s) (attachments mode)...")
+        sent = len(media) - len(pending)
+        first = True
+        while groups:
+            positions = groups.pop(0)
+            paths = [media[position] for position in positions]
+            if not first:
+                self.rate_limiter.wait(session['name'], self.REQUEST_INTERVAL['Discord'], session['token'])
+            first = False
+            # The text goes with the first message that gets through
+            content = self.content if not text_sent else ''
+            names = ", ".join(os.path.basename(filepath) for filepath in paths)
+            try:
+                response = self.discord_send_group(session, paths, content)
+            except PostCancelled:
+                raise
+            except Exception as e:
+                self.status_update.emit(f"✗ Error sending {names}: {str(e)}")
+                continue
+            
+            if response.status_code in [200, 204]:
+                sent += len(paths)
+                message_ids.append(self.discord_message_id(response))
+                self.note_sent(session['target_key'], [indexes[position] for position in positions] + (['text'] if content else []),
+                               message_ids[-1])
+                text_sent = True
+                self.status_update.emit(f"✓ Sent {len(paths)} attachment(s) ({sent}/{len(media)}): {names}")
+            elif response.status_code == 413 and len(paths) > 1:
+                # Cap was off for this webhook, halve the group rather than dropping files
+                middle = len(positions) // 2
+                groups[:0] = [positions[:middle], positions[middle:]]
+                self.status_update.emit(f"⚠ Discord rejected {len(paths)} attachments as too large, splitting")
+            else:
+                self.status_update.emit(f"✗ Discord failed for {names}: HTTP {response.status_code}")
+                if response.text:
+                    self.status_update.emit(f"Error: {response.text}")
+        
+        if sent:
+            self.status_update.emit(f"✓ Posted to Discord with {sent}/{len(media)} attachments in {len(message_ids)} message(s)")
+        # Only a complete set counts as posted, otherwise the run is offered for retry
+        if sent == len(media) and text_sent:
+            return message_ids
+        return None
+    
+    def discord_login(self, creds, token):
+        return {
+            'webhook_url': creds['webhook_url'],
+            'http': UPLOAD_SCHEDULER.session('Discord')
+        }
+    
+    def discord_embeds_available(self):
+        return self.discord_embed_mode and self.media_host is not None
+    
+    def discord_upload(self, session, filepath, position):
+        if position >= 10:  # Discord max 10 embeds / attachments
+            return None
+        if self.discord_embeds_available():
+            # Embeds are hosted while later files are still being prepared
+            return self.upload_image_for_discord_embed(filepath, session['token'])
+        # Attachments are sent with the message itself
+        return filepath
+    
+    def discord_publish(self, session, media):
+        if session.get('received'):
+            if self.discord_embed_mode:
+                self.status_update.emit("Using Discord embeds mode (hosted images)...")
                 
-                if publish_response.status_code == 200:
-                    self.status_update.emit("✓ Posted to Instagram")
+                if not self.discord_embeds_available():
+                    self.status_update.emit("✗ Discord embeds require a media host (imgBB API key or S3) to be configured")
+                    self.status_update.emit("Please configure imgBB or S3 in settings to use Discord embeds")
+                    self.status_update.emit("Falling back to attachment mode...")
                 else:
-                    error = publish_response.json().get('error', {})
-                    self.status_update.emit(f"✗ Instagram publish failed: {error.get('message', 'Unknown error')}")
-            else:
-                error = container_response.json().get('error', {})
-                self.status_update.emit(f"✗ Instagram container creation failed: {error.get('message', 'Unknown error')}")
+                    if media:
+                        payload = {
+                            "content": self.content,
+                            "embeds": media
+                        }
+                        response = self.discord_post(session, json=payload)
+                        
+                        if response.status_code in [200, 204]:
+                            self.status_update.emit(f"✓ Posted to Discord with {len(media)} embedded images")
+                            return [self.discord_message_id(response)]
+                        else:
+                            self.status_update.emit(f"✗ Discord failed: HTTP {response.status_code}")
+                            if response.text:
+                                self.status_update.emit(f"Error: {response.text}")
+                    else:
+                        response = self.discord_post(session, json={"content": self.content})
+                        if response.status_code in [200, 204]:
+                            self.status_update.emit("✓ Posted to Discord (text only, no images could be embedded)")
+                            return [self.discord_message_id(response)]
+                    return None
+            
+            if self.discord_separate_messages:
+                self.status_update.emit(f"Sending {len(media)} files as separate Discord messages...")
+                already = self.already_sent(session['target_key'])
+                indexes = session.get('indexes', list(range(len(media))))
+                success_count = 0
+                message_ids = list(dict.fromkeys(already.values()))
+                text_sent = True
                 
-        except Exception as e:
-            self.status_update.emit(f"✗ Instagram failed: {str(e)}")
-
-    def post_to_reddit(self, media_files):
-        try:
-            # Validate credentials before creating Reddit instance
-            required_fields = ['client_id', 'client_secret', 'username', 'password', 'user_agent']
-            for field in required_fields:
-                if not self.credentials.get('reddit', {}).get(field):
-                    self.status_update.emit(f"✗ Reddit: Missing {field}")
-                    return
+                if self.content and 'text' in already:
+                    self.status_update.emit("✓ Text already posted to Discord by an earlier attempt")
+                elif self.content:
+                    response = self.discord_post(session, json={"content": self.content})
+                    if response.status_code in [200, 204]:
+                        self.status_update.emit("✓ Posted text to Discord")
+                        message_ids.append(self.discord_message_id(response))
+                        self.note_sent(session['target_key'], ['text'], message_ids[-1])
+                    else:
+                        text_sent = False
+                    session['token'].wait(0.5)
+                
+                for i, filepath in enumerate(media):
+                    if indexes[i] in already:
+                        success_count += 1
+                        self.status_update.emit(f"✓ File {i+1}/{len(media)} already sent: {os.path.basename(filepath)}")
+                        continue
+                    try:
+                        with open(filepath, 'rb') as f:
+                            files = [('file', f)]
+                            filename = os.path.basename(filepath)
+                            
+                            response = self.discord_post(
+                                session,
+                                data={"content": f"📎 {filename}"},
+                                files=files,
+                                timeout=60
+                            )
+                        
+                        if response.status_code in [200, 204]:
+                            success_count += 1
+                            message_ids.append(self.discord_message_id(response))
+                            self.note_sent(session['target_key'], [indexes[i]], message_ids[-1])
+                            self.status_update.emit(f"✓ Sent file {i+1}/{len(media)}: {filename}")
+                        else:
+                            self.status_update.emit(f"✗ Failed to send {filename}: HTTP {response.status_code}")
+                        
+                        if i < len(media) - 1:
+                            session['token'].wait(0.5)
+                    
+                    except Exception as e:
+                        self.status_update.emit(f"✗ Error sending {os.path.basename(filepath)}: {str(e)}")
+                
+                if success_count > 0:
+                    self.status_update.emit(f"✓ Posted to Discord: {success_count}/{len(media)} files sent")
+                # Only a complete set counts as posted, otherwise the run is offered for retry
+                if text_sent and success_count == len(media):
+                    return message_ids
+                return None
             
-            reddit = praw.Reddit(
-                client_id=self.credentials['reddit']['client_id'],
-                client_secret=self.credentials['reddit']['client_secret'],
-                username=self.credentials['reddit']['username'],
-                password=self.credentials['reddit']['password'],
-                user_agent=self.credentials['reddit']['user_agent']
+            return self.discord_send_attachments(session, media)
+        
+        else:
+            response = self.discord_post(session, json={"content": self.content})
+            if response.status_code in [200, 204]:
+                self.status_update.emit("✓ Posted to Discord")
+                return [self.discord_message_id(response)]
+            else:
+                self.status_update.emit(f"✗ Discord failed: {response.status_code}")
+                return None
+    
+    def instagram_login(self, creds, token):
+        return {
+            'access_token': creds['access_token'],
+            'account_id': creds['account_id'],
+            'http': UPLOAD_SCHEDULER.session('Instagram'),
+            # Child containers are created in the background while later files are still being prepared
+            'executor': ThreadPoolExecutor(max_workers=self.INSTAGRAM_WORKERS, thread_name_prefix='instagram')
+        }
+    
+    def instagram_upload(self, session, filepath, position):
+        if position >= 10:  # Instagram carousels hold up to 10 items
+            return None
+        ext = os.path.splitext(filepath)[1].lower()
+        
+        # Instagram fetches media from a URL, so everything goes through the media host first
+        if ext in ['.jpg', '.jpeg', '.png', '.mp4']:
+            carousel = len(self.media_files) > 1
+            return session['executor'].submit(self.instagram_create_item, session, filepath, carousel)
+        else:
+            self.status_update.emit(f"✗ Instagram doesn't support {ext} files")
+        return None
+    
+    def instagram_create_item(self, session, filepath, carousel):
+        """Host one file and create its container, as a carousel child when the post has several files"""
+        media_url = self.host_media(filepath, session['token'])
+        if not media_url:
+            self.status_update.emit(f"✗ Failed to host {os.path.basename(filepath)} for Instagram")
+            return None
+        self.status_update.emit(f"✓ {os.path.basename(filepath)} hosted: {media_url}")
+        
+        is_video = os.path.splitext(filepath)[1].lower() in VIDEO_EXTENSIONS
+        container_data = self.instagram_media_fields(media_url, is_video, carousel)
+        if not carousel:
+            container_data['caption'] = self.content
+        container_id = self.instagram_create_container(session, container_data)
+        if not container_id:
+            return None
+        return {'url': media_url, 'is_video': is_video, 'container_id': container_id}
+    
+    def instagram_media_fields(self, media_url, is_video, carousel):
+        if is_video:
+            # Carousel videos are plain VIDEO items, a video on its own is published as a reel
+            fields = {'video_url': media_url, 'media_type': 'VIDEO' if carousel else 'REELS'}
+        else:
+            fields = {'image_url': media_url}
+        if carousel:
+            fields['is_carousel_item'] = 'true'
+        return fields
+    
+    def instagram_create_container(self, session, container_data):
+        container_data = dict(container_data, access_token=session['access_token'])
+        self.status_update.emit("Creating Instagram media container...")
+        container_response = session['http'].post(
+            f"{self.GRAPH_URL}/{session['account_id']}/media",
+            data=container_data,
+            timeout=self.request_timeout(session['token'])
+        )
+        if container_response.status_code == 200:
+            return container_response.json().get('id')
+        error = container_response.json().get('error', {})
+        self.status_update.emit(f"✗ Instagram container creation failed: {error.get('message', 'Unknown error')}")
+        return None
+    
+    def instagram_wait_ready(self, session, container_ids):
+        """Poll containers until Instagram has processed them, backing off between polls.
+        
+        All pending containers are checked with one multi-id Graph request per poll.
+        Returns the ids that finished; errored or expired containers are left out.
+        """
+        token = session['token']
+        pending = list(container_ids)
+        ready = []
+        delay = 1
+        while pending:
+            token.check()
+            response = session['http'].get(
+                f"{self.GRAPH_URL}/",
+                params={'ids': ','.join(pending), 'fields': 'status_code', 'access_token': session['access_token']},
+                timeout=self.request_timeout(token)
             )
+            if response.status_code != 200:
+                error = response.json().get('error', {})
+                self.status_update.emit(f"⚠ Instagram status check failed: {error.get('message', 'Unknown error')}")
+            else:
+                statuses = response.json()
+                for container_id in list(pending):
+                    status = statuses.get(container_id, {}).get('status_code')
+                    if status == 'FINISHED':
+                        ready.append(container_id)
+                        pending.remove(container_id)
+                    elif status in ['ERROR', 'EXPIRED']:
+                        self.status_update.emit(f"⚠ Instagram could not process container {container_id} ({status})")
+                        pending.remove(container_id)
+            if pending:
+                token.wait(delay)
+                delay = min(delay * 2, 8)
+        # Keep the caller's order, carousel children are shown in the order they are listed
+        return [container_id for container_id in container_ids if container_id in ready]
+    
+    def instagram_stage(self, session, media):
+        """Turn the child containers created in the background into one processed container, ready to publish"""
+        executor = session['executor']
+        try:
+            if not session.get('received'):
+                self.status_update.emit("✗ Instagram requires at least one image or video")
+                return []
             
-            # Get subreddits (comma-separated)
-            subreddits_str = self.credentials['reddit'].get('subreddits', '')
-            if not subreddits_str:
-                self.status_update.emit("✗ Reddit: No subreddits specified")
-                return
-                
-            subreddits = [s.strip() for s in subreddits_str.split(',') if s.strip()]
+            # Collect the child containers created in the background, in posting order
+            items = []
+            for future in media:
+                while not future.done():
+                    session['token'].check()
+                    session['token'].wait(0.2)
+                try:
+                    item = future.result()
+                except Exception as e:
+                    self.status_update.emit(f"⚠ Instagram item failed: {str(e)}")
+                    continue
+                if item:
+                    items.append(item)
+            if not items:
+                return []
             
-            if not subreddits:
-                self.status_update.emit("✗ Reddit: No subreddits specified")
-                return
+            if len(items) > 1:
+                children = self.instagram_wait_ready(session, [item['container_id'] for item in items])
+                if len(children) < len(items):
+                    self.status_update.emit(f"⚠ Only {len(children)}/{len(items)} Instagram items are ready")
+                if len(children) > 1:
+                    self.status_update.emit(f"Creating Instagram carousel with {len(children)} items...")
+                    container_id = self.instagram_create_container(session, {
+                        'media_type': 'CAROUSEL',
+                        'children': ','.join(children),
+                        'caption': self.content
+                    })
+                elif children:
+                    # A carousel needs two items, fall back to a single post
+                    item = next(item for item in items if item['container_id'] == children[0])
+                    container_id = self.instagram_create_container(
+                        session, dict(self.instagram_media_fields(item['url'], item['is_video'], False), caption=self.content))
+                else:
+                    return []
+            elif len(self.media_files) > 1:
+                # Created as a carousel child, but it is the only item that made it
+                container_id = self.instagram_create_container(
+                    session, dict(self.instagram_media_fields(items[0]['url'], items[0]['is_video'], False), caption=self.content))
+            else:
+                container_id = items[0]['container_id']
             
-            # Post to each subreddit
-            success_count = 0
-            for subreddit_name in subreddits:
-                try:
-                    subreddit = reddit.subreddit(subreddit_name)
-                    
-                    # Extract title from content (first line or first 100 chars)
-                    lines = self.content.strip().split('\n')
-                    if len(lines) > 1:
-                        title = lines[0][:300]  # Reddit title limit
-                        text_content = '\n'.join(lines[1:])
-                    else:
-                        title = self.content[:100] + '...' if len(self.content) > 100 else self.content
-                        text_content = self.content
+            if not container_id or not self.instagram_wait_ready(session, [container_id]):
+                return []
+            return [container_id]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def instagram_publish(self, session, containers):
+        if not containers:
+            return None
+        
+        # Publish the media
+        self.status_update.emit("Publishing to Instagram...")
+        publish_response = session['http'].post(
+            f"{self.GRAPH_URL}/{session['account_id']}/media_publish",
+            data={
+                'creation_id': containers[0],
+                'access_token': session['access_token']
+            },
+            timeout=self.request_timeout(session['token'])
+        )
+        
+        if publish_response.status_code == 200:
+            self.status_update.emit("✓ Posted to Instagram")
+            return [publish_response.json().get('id')]
+        else:
+            error = publish_response.json().get('error', {})
+            self.status_update.emit(f"✗ Instagram publish failed: {error.get('message', 'Unknown error')}")
+        return None
+    
+    def reddit_login(self, creds, token):
+        # Validate credentials before creating Reddit instance
+        required_fields = ['client_id', 'client_secret', 'username', 'password', 'user_agent']
+        for field in required_fields:
+            if not creds.get(field):
+                self.status_update.emit(f"✗ Reddit: Missing {field}")
+                return None
+        
+        # Get subreddits (comma-separated)
+        subreddits_str = creds.get('subreddits', '')
+        subreddits = [s.strip() for s in subreddits_str.split(',') if s.strip()]
+        if not subreddits:
+            self.status_update.emit("✗ Reddit: No subreddits specified")
+            return None
+        
+        reddit = praw.Reddit(
+            client_id=creds['client_id'],
+            client_secret=creds['client_secret'],
+            username=creds['username'],
+            password=creds['password'],
+            user_agent=creds['user_agent'],
+            timeout=int(self.request_timeout(token)),
+            # praw uploads images and videos through this session, so they are metered too
+            requestor_kwargs={'session': UPLOAD_SCHEDULER.session('Reddit')}
+        )
+        return {'reddit': reddit, 'subreddits': subreddits, 'username': creds['username']}
+    
+    def reddit_upload(self, session, filepath, position):
+        # praw uploads the file itself when submitting
+        return filepath
+    
+    def reddit_publish(self, session, media_files):
+        reddit = session['reddit']
+        subreddits = session['subreddits']
+        
+        # Post to each subreddit, skipping the ones an earlier run already posted to
+        success_count = 0
+        submission_ids = []
+        for subreddit_name in subreddits:
+            # Subreddits already posted stay recorded if the run stops part way
+            session['token'].check()
+            account = f"{session['username']}/r/{subreddit_name}"
+            previous = self.published_before('Reddit', account)
+            if previous:
+                self.status_update.emit(f"✓ Already posted to r/{subreddit_name} - skipping")
+                submission_ids.extend(previous['post_ids'])
+                success_count += 1
+                continue
+            
+            try:
+                subreddit = reddit.subreddit(subreddit_name)
+                
+                # Extract title from content (first line or first 100 chars)
+                lines = self.content.strip().split('\n')
+                if len(lines) > 1:
+                    title = lines[0][:300]  # Reddit title limit
+                    text_content = '\n'.join(lines[1:])
+                else:
+                    title = self.content[:100] + '...' if len(self.content) > 100 else self.content
+                    text_content = self.content
+                
+                if media_files:
+                    # Reddit only supports one media file per post
+                    filepath = media_files[0]
+                    ext = os.path.splitext(filepath)[1].lower()
                     
-                    if media_files:
-                        # Reddit only supports one media file per post
-                        filepath = media_files[0]
-                        ext = os.path.splitext(filepath)[1].lower()
-                        
-                        if ext in ['.jpg', '.jpeg', '.png', '.gif']:
-                            submission = subreddit.submit_image(
-                                title=title,
-                                image_path=filepath
-                            )
-                            # Add text as comment if there's body text
-                            if text_content and text_content != title:
-                                submission.reply(text_content)
-                        elif ext == '.mp4':
-                            submission = subreddit.submit_video(
-                                title=title,
-                                video_path=filepath
-                            )
-                            if text_content and text_content != title:
-                                submission.reply(text_content)
-                        else:
-                            # Text post with link to media
-                            submission = subreddit.submit(
-                                title=title,
-                                selftext=text_content
-                            )
+                    if ext in ['.jpg', '.jpeg', '.png', '.gif']:
+                        submission = subreddit.submit_image(
+                            title=title,
+                            image_path=filepath
+                        )
+                        # Add text as comment if there's body text
+                        if text_content and text_content != title:
+                            submission.reply(text_content)
+                    elif ext == '.mp4':
+                        submission = subreddit.submit_video(
+                            title=title,
+                            video_path=filepath
+                        )
+                        if text_content and text_content != title:
+                            submission.reply(text_content)
                     else:
-                        # Text-only post
+                        # Text post with link to media
                         submission = subreddit.submit(
                             title=title,
                             selftext=text_content
                         )
-                    
-                    self.status_update.emit(f"✓ Posted to r/{subreddit_name}")
-                    success_count += 1
-                    
-                    # Small delay between posts to avoid rate limiting
-                    if len(subreddits) > 1:
-                        time.sleep(2)
-                        
-                except Exception as e:
-                    self.status_update.emit(f"✗ Failed to post to r/{subreddit_name}: {str(e)}")
-            
-            if success_count > 0:
-                self.status_update.emit(f"✓ Reddit: Posted to {success_count}/{len(subreddits)} subreddits")
-            else:
-                self.status_update.emit("✗ Reddit: Failed to post to any subreddit")
+                else:
+                    # Text-only post
+                    submission = subreddit.submit(
+                        title=title,
+                        selftext=text_content
+                    )
                 
-        except Exception as e:
-            self.status_update.emit(f"✗ Reddit failed: {str(e)}")
\ No newline at end of file
+                self.status_update.emit(f"✓ Posted to r/{subreddit_name}")
+                self.history.record('Reddit', account, self.text_hash, self.media_key, 'success', [submission.id])
+                submission_ids.append(submission.id)
+                success_count += 1
+                
+                # Small delay between posts to avoid rate limiting
+                if len(subreddits) > 1:
+                    session['token'].wait(2)
+            
+            except Exception as e:
+                self.status_update.emit(f"✗ Failed to post to r/{subreddit_name}: {str(e)}")
+        
+        if success_count > 0:
+            self.status_update.emit(f"✓ Reddit: Posted to {success_count}/{len(subreddits)} subreddits")
+        else:
+            self.status_update.emit("✗ Reddit: Failed to post to any subreddit")
+        # Partially posted counts as failed so a retry covers the remaining subreddits
+        return submission_ids if success_count == len(subreddits) else None
@@ -0,0 +1,214 @@
+import os
+import glob
+import json
+import time
+import hashlib
+import threading
+
+class RunJournal:
+    """Write-ahead log of posting runs, so a crash or restart can pick up where a run stopped.
+
+    Every step (run started, derivative prepared, media hosted, media uploaded, message sent,
+    account published, run ended) is one JSON line, flushed and fsynced before the run moves on. Runs are keyed by
+    the post's identity and where and how it goes out, so posting the same text and media to the same
+    platforms again continues the interrupted run, while a run to other platforms starts afresh.
+    A journal belongs to one process at a time: compacting it would drop lines another process
+    appended, so a second process gets an error and has to be given its own path.
+    """
+
+    MAX_AGE = 20 * 3600  # Platforms expire uploaded media ids after about a day
+
+    def __init__(self, path='run_journal.jsonl'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.runs = {}
+        self.file = None
+        self.lock_file = None
+
+    @staticmethod
+    def run_id(text_hash, media_key, platforms, options=()):
+        key = json.dumps([text_hash, media_key, sorted(platforms), list(options)])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    def ensure_open(self):
+        """Replay, clean and compact the journal on first use in a session (called with the lock held)"""
+        if self.file is not None:
+            return
+        self.acquire()
+        self.runs = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line from a crash mid-write
+                    self.apply(event)
+        except FileNotFoundError:
+            pass
+
+        now = time.time()
+        for run_id, run in list(self.runs.items()):
+            if now - run['updated'] > self.MAX_AGE:
+                self.remove_temp_files(run)
+                del self.runs[run_id]
+        self.remove_orphans()
+
+        # Rewrite with only the live runs, swapped in atomically so a crash here loses nothing either
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for run in self.runs.values():
+                for event in run['events']:
+                    f.write(json.dumps(event) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def acquire(self):
+        """Take the journal's lock file for the life of this process, or raise if another process holds it"""
+        if self.lock_file is not None:
+            return
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f"{self.path} is in use by another process")
+        self.lock_file = lock_file
+
+    def apply(self, event):
+        run_id = event['run']
+        kind = event['event']
+        if kind == 'finished':
+            self.runs.pop(run_id, None)
+            return
+        run = self.runs.setdefault(run_id, {
+            'id': run_id, 'params': {}, 'started': event['at'], 'ended': False,
+            'prepared': {}, 'temp': [], 'hosted': {}, 'uploaded': {}, 'sent': {}, 'published': {}, 'events': []
+        })
+        run['events'].append(event)
+        run['updated'] = event['at']
+        if kind == 'started':
+            run['params'] = event['params']
+            run['started'] = event['at']
+            run['ended'] = False
+        elif kind == 'prepared':
+            run['prepared'][(event['platform'], event['source'])] = event['path']
+        elif kind == 'temp':
+            run['temp'].append(event['path'])
+        elif kind == 'hosted':
+            run['hosted'][event['source']] = event['url']
+        elif kind == 'uploaded':
+            run['uploaded'][(event['target'], event['index'])] = {'path': event['path'], 'handle': event['handle'], 'at': event['at']}
+        elif kind == 'sent':
+            for part in event['parts']:
+                run['sent'][(event['target'], part)] = {'message_id': event['message_id'], 'at': event['at']}
+        elif kind == 'published':
+            run['published'][event['target']] = {'status': event['status'], 'post_ids': event['post_ids']}
+        elif kind == 'ended':
+            run['ended'] = True
+
+    def record(self, run_id, kind, **fields):
+        event = dict(fields, run=run_id, event=kind, at=time.time())
+        line = json.dumps(event, default=str)
+        with self.lock:
+            self.ensure_open()
+            self.file.write(line + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.apply(json.loads(line))
+
+    def temp_paths(self, run):
+        sources = set(run['params'].get('media_files', []))
+        # Never delete a source file, whatever the journal says
+        return [path for path in list(run['prepared'].values()) + run['temp'] if path not in sources]
+
+    def remove_temp_files(self, run):
+        for path in self.temp_paths(run):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def remove_orphans(self):
+        """Delete derivatives a crashed run wrote but never got to journal.
+
+        Only files older than MAX_AGE go: a younger one may belong to a run in another process,
+        or to one whose journal line was still being written.
+        """
+        cutoff = time.time() - self.MAX_AGE
+        known = set()
+        sources = set()
+        for run in self.runs.values():
+            known.update(self.temp_paths(run))
+            sources.update(run['params'].get('media_files', []))
+        for source in sources:
+            pattern = glob.escape(os.path.splitext(source)[0]) + '_compressed_*'
+            for path in glob.glob(pattern):
+                if path not in known and path not in sources:
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                    except OSError:
+                        pass
+
+    def resume(self, run_id):
+        """State left by an earlier, unfinished run of the same post, or None"""
+        with self.lock:
+            self.ensure_open()
+            run = self.runs.get(run_id)
+            if not run:
+                return None
+            return {key: (dict(value) if isinstance(value, dict) else value) for key, value in run.items()}
+
+    def interrupted(self):
+        """Runs that started but never recorded an end, i.e. were cut off by a crash or restart"""
+        with self.lock:
+            self.ensure_open()
+            return [dict(run) for run in self.runs.values() if run['params'] and not run['ended']]
+
+    def start(self, run_id, params):
+        self.record(run_id, 'started', params=params)
+
+    def prepared(self, run_id, platform, source, path):
+        self.record(run_id, 'prepared', platform=platform, source=source, path=path)
+
+    def temp(self, run_id, path):
+        self.record(run_id, 'temp', path=path)
+
+    def hosted(self, run_id, source, url):
+        self.record(run_id, 'hosted', source=source, url=url)
+
+    def uploaded(self, run_id, target, index, path, handle):
+        try:
+            json.dumps(handle)
+        except TypeError:
+            return  # Handles that are live objects (blobs, futures) can't be carried over
+        self.record(run_id, 'uploaded', target=target, index=index, path=path, handle=handle)
+
+    def sent(self, run_id, target, parts, message_id):
+        self.record(run_id, 'sent', target=target, parts=parts, message_id=message_id)
+
+    def published(self, run_id, target, status, post_ids):
+        self.record(run_id, 'published', target=target, status=status, post_ids=post_ids)
+
+    def ended(self, run_id, complete):
+        """A complete run is dropped from the journal; otherwise its uploads stay for a retry to reuse"""
+        self.record(run_id, 'finished' if complete else 'ended')
+
+    def discard(self, run_id):
+        with self.lock:
+            self.ensure_open()
+            run = self.runs.get(run_id)
+            if run:
+                self.remove_temp_files(run)
+        self.record(run_id, 'finished')
+
+RUN_JOURNAL = RunJournal()
@@ -0,0 +1,138 @@
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+PHASES = ['compress', 'login', 'upload', 'stage', 'wait', 'publish']
+
+local = threading.local()
+
+def note_retry():
+    """Count a retry against the phase running on this thread, if any"""
+    span = getattr(local, 'span', None)
+    if span is not None:
+        span['retries'] += 1
+
+class RunMetrics:
+    """Timings of one run's phases, per account, for the performance panel.
+
+    Each span is one phase of one target (an account, or a platform for work its accounts share)
+    with its start relative to the run, duration, bytes, retries and, for uploads, how many
+    derivatives were queued behind it. listener, if given, gets a snapshot after every span.
+    """
+
+    def __init__(self, listener=None):
+        self.started = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+        self.listener = listener
+
+    @contextmanager
+    def phase(self, target, platform, phase, label='', nbytes=0, queue_depth=None):
+        """Time the block as one span; the block may update the yielded span ('ok', 'bytes', ...)"""
+        span = {'target': target, 'platform': platform, 'phase': phase, 'label': label,
+                'start': time.time() - self.started, 'duration': 0.0, 'bytes': nbytes,
+                'retries': 0, 'queue': queue_depth, 'ok': True}
+        previous = getattr(local, 'span', None)
+        local.span = span
+        try:
+            yield span
+        except BaseException:
+            span['ok'] = False
+            raise
+        finally:
+            local.span = previous
+            span['duration'] = time.time() - self.started - span['start']
+            with self.lock:
+                self.spans.append(span)
+            if self.listener:
+                try:
+                    self.listener(self.snapshot())
+                except Exception:
+                    pass  # The panel going away never stops a run
+
+    def snapshot(self):
+        with self.lock:
+            return {'started': self.started, 'spans': [dict(span) for span in self.spans]}
+
+class MetricsStore:
+    """Phase timings of past runs in run_metrics.db, for rolling history across runs"""
+
+    KEEP_RUNS = 500
+
+    def __init__(self, db_path='run_metrics.db'):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS spans (
+                    run_started REAL NOT NULL,
+                    target TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    phase TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    retries INTEGER NOT NULL,
+                    queue INTEGER,
+                    ok INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS spans_run ON spans (run_started)")
+            self.conn.commit()
+
+    def record(self, snapshot):
+        rows = [(snapshot['started'], span['target'], span['platform'], span['phase'], span['duration'],
+                 span['bytes'] or 0, span['retries'], span['queue'], int(span['ok'])) for span in snapshot['spans']]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany("""
+                INSERT INTO spans (run_started, target, platform, phase, duration, bytes, retries, queue, ok)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            # Only the most recent runs are kept
+            self.conn.execute("""
+                DELETE FROM spans WHERE run_started < (
+                    SELECT MIN(run_started) FROM (SELECT DISTINCT run_started FROM spans ORDER BY run_started DESC LIMIT ?)
+                )
+            """, (self.KEEP_RUNS,))
+            self.conn.commit()
+
+    def summary(self, runs=20):
+        """Per platform and phase over the last runs: spans, mean and worst duration, bytes/s, retries, failures"""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT platform, phase, COUNT(*), AVG(duration), MAX(duration), SUM(bytes), SUM(duration),
+                       SUM(retries), SUM(1 - ok), MAX(queue)
+                FROM spans WHERE run_started >= (
+                    SELECT COALESCE(MIN(run_started), 0) FROM (SELECT DISTINCT run_started FROM spans ORDER BY run_started DESC LIMIT ?)
+                )
+                GROUP BY platform, phase
+            """, (runs,)).fetchall()
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        summary = [{
+            'platform': platform, 'phase': phase, 'count': count, 'mean': mean, 'worst': worst,
+            'throughput': total_bytes / total_time if total_bytes and total_time else None,
+            'retries': retries, 'failed': failed, 'queue': queue
+        } for platform, phase, count, mean, worst, total_bytes, total_time, retries, failed, queue in rows]
+        summary.sort(key=lambda row: (row['platform'], order.get(row['phase'], len(order))))
+        return summary
+
+    def runs(self, limit=20):
+        """Most recent runs, newest first, with the time each platform spent working (not waiting for its slot) and its failed phases"""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT run_started, platform, SUM(duration), SUM(1 - ok) FROM spans
+                WHERE phase != 'wait' AND run_started IN (SELECT DISTINCT run_started FROM spans ORDER BY run_started DESC LIMIT ?)
+                GROUP BY run_started, platform ORDER BY run_started DESC
+            """, (limit,)).fetchall()
+        runs = {}
+        for started, platform, busy, failed in rows:
+            run = runs.setdefault(started, {'started': datetime.fromtimestamp(started), 'platforms': {}})
+            run['platforms'][platform] = {'busy': busy, 'failed': failed}
+        return list(runs.values())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,215 @@
+import os
+import sys
+import types
+import uuid
+import base64
+import hashlib
+import pytest
+
+import chunked_upload
+import media_hosts
+from chunked_upload import UploadSessions
+from media_hosts import S3Host, ImgBBHost
+
+PART = 5 * 1024 * 1024
+
+class FakeS3:
+    """In-memory S3 endpoint, checking parts the way S3 does"""
+
+    def __init__(self, endpoint_url=None):
+        self.endpoint_url = endpoint_url
+        self.objects = {}
+        self.uploads = {}
+        self.sent = []  # Part numbers in the order they were received
+        self.aborted = []
+        self.fail_parts = set()
+        self.fail_complete = False
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise Exception("404 Not Found")
+        return {'ContentLength': len(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[(Bucket, Key)] = Body.read()
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        if PartNumber in self.fail_parts:
+            raise Exception("connection reset")
+        digest = hashlib.md5(Body).digest()
+        assert base64.b64encode(digest).decode('ascii') == ContentMD5
+        self.sent.append(PartNumber)
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': f'"{digest.hex()}"'}
+
+    def get_paginator(self, name):
+        assert name == 'list_parts'
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Key, UploadId):
+                if UploadId not in fake.uploads:
+                    raise Exception("NoSuchUpload")
+                yield {'Parts': [{'PartNumber': number, 'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+                                 for number, body in sorted(fake.uploads[UploadId].items())]}
+        return Paginator()
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        if self.fail_complete:
+            raise Exception("InvalidPart")
+        stored = self.uploads.pop(UploadId)
+        parts = MultipartUpload['Parts']
+        assert [part['PartNumber'] for part in parts] == sorted(stored)
+        self.objects[(Bucket, Key)] = b''.join(stored[part['PartNumber']] for part in parts)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+        self.uploads.pop(UploadId, None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"{self.endpoint_url}/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+class FakeConfig:
+    def __init__(self, **options):
+        self.options = options
+
+    def merge(self, other):
+        return FakeConfig(**dict(self.options, **other.options))
+
+class FakeMediaCache:
+    def lookup(self, filepath, with_hash=True):
+        with open(filepath, 'rb') as f:
+            return {'hash': hashlib.sha256(f.read()).hexdigest()}
+
+    def get_size(self, filepath):
+        return os.path.getsize(filepath)
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    fake = FakeS3()
+
+    def client(service, config=None, endpoint_url=None, **credentials):
+        assert service == 's3'
+        fake.endpoint_url = endpoint_url
+        return fake
+
+    monkeypatch.setitem(sys.modules, 'boto3', types.SimpleNamespace(client=client))
+    monkeypatch.setitem(sys.modules, 'botocore', types.ModuleType('botocore'))
+    monkeypatch.setitem(sys.modules, 'botocore.config', types.SimpleNamespace(Config=FakeConfig))
+    monkeypatch.setattr(media_hosts, 'MEDIA_CACHE', FakeMediaCache())
+    monkeypatch.setattr(media_hosts, 'UPLOAD_SESSIONS', UploadSessions(str(tmp_path / 'upload_sessions.json')))
+    # Failed parts are retried once, straight away
+    monkeypatch.setattr(media_hosts, 'with_retries', lambda call, label, status=None, stop=None:
+                        chunked_upload.with_retries(call, label, status, stop, retries=1, backoff=0))
+    return fake
+
+def make_file(tmp_path, size, name='clip.mp4'):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+def make_host(**options):
+    return S3Host('media', 'key', 'secret', endpoint_url='http://minio.local:9000', **options)
+
+def test_small_file_is_put_in_one_request(s3, tmp_path):
+    path = make_file(tmp_path, 1024, 'photo.jpg')
+    url = make_host().host(path)
+    key = make_host().object_key(path)
+    assert url.startswith(f"http://minio.local:9000/media/{key}")
+    assert s3.objects[('media', key)] == open(path, 'rb').read()
+    assert s3.sent == []
+
+def test_large_file_is_uploaded_in_parts(s3, tmp_path):
+    path = make_file(tmp_path, 2 * PART + 1234)
+    host = make_host(part_size=PART, public_url='https://cdn.example.com/')
+    url = host.host(path)
+    key = host.object_key(path)
+    assert url == f"https://cdn.example.com/{key}"
+    assert sorted(s3.sent) == [1, 2, 3]
+    assert s3.objects[('media', key)] == open(path, 'rb').read()
+    assert media_hosts.UPLOAD_SESSIONS.get(f"S3:media/{key}") is None
+    # Stored under its content hash, so hosting it again sends nothing
+    assert host.host(path) == url
+    assert sorted(s3.sent) == [1, 2, 3]
+
+def test_failed_part_leaves_upload_to_resume(s3, tmp_path):
+    path = make_file(tmp_path, 2 * PART + 1234)
+    host = make_host(part_size=PART, max_workers=1)
+    key = host.object_key(path)
+    messages = []
+    s3.fail_parts = {2}
+    assert host.host(path, status=messages.append) is None
+    assert any(message.startswith('✗ S3 upload error') for message in messages)
+    assert s3.aborted == []
+    assert media_hosts.UPLOAD_SESSIONS.get(f"S3:media/{key}") is not None
+
+    s3.fail_parts = set()
+    s3.sent = []
+    assert host.host(path, status=messages.append) is not None
+    assert 1 not in s3.sent and 2 in s3.sent
+    assert s3.objects[('media', key)] == open(path, 'rb').read()
+    assert media_hosts.UPLOAD_SESSIONS.get(f"S3:media/{key}") is None
+
+def test_failed_complete_aborts_upload(s3, tmp_path):
+    path = make_file(tmp_path, PART + 1)
+    host = make_host(part_size=PART)
+    key = host.object_key(path)
+    s3.fail_complete = True
+    assert host.host(path) is None
+    assert len(s3.aborted) == 1 and s3.uploads == {}
+    assert media_hosts.UPLOAD_SESSIONS.get(f"S3:media/{key}") is None
+
+def test_stop_cancels_remaining_parts(s3, tmp_path):
+    path = make_file(tmp_path, 3 * PART)
+    host = make_host(part_size=PART, max_workers=1)
+    assert host.host(path, stop=lambda: len(s3.sent) >= 1) is None
+    assert s3.sent == [1]
+
+def test_imgbb_checks_stop_around_request(monkeypatch, tmp_path):
+    monkeypatch.setattr(media_hosts, 'MEDIA_CACHE', FakeMediaCache())
+    path = make_file(tmp_path, 1024, 'photo.jpg')
+    requests_made = []
+
+    class Response:
+        status_code = 200
+
+        def json(self):
+            return {'success': True, 'data': {'url': 'https://i.ibb.co/photo.jpg'}}
+
+    class Http:
+        def post(self, url, data, timeout):
+            requests_made.append(url)
+            return Response()
+
+    host = ImgBBHost('key')
+    host.http = Http()
+    assert host.host(path, stop=lambda: True) is None
+    assert requests_made == []
+
+    # Cancelled while the request was out
+    assert host.host(path, stop=lambda: bool(requests_made)) is None
+    assert len(requests_made) == 1
+
+    assert host.host(path, stop=lambda: False) == 'https://i.ibb.co/photo.jpg'
+
+@pytest.mark.skipif(not os.environ.get('S3_TEST_ENDPOINT'),
+                    reason="set S3_TEST_ENDPOINT, S3_TEST_BUCKET, S3_TEST_ACCESS_KEY and S3_TEST_SECRET_KEY")
+def test_multipart_upload_against_endpoint(monkeypatch, tmp_path):
+    """Runs against a real S3-compatible store, e.g. a local MinIO"""
+    pytest.importorskip('boto3')
+    monkeypatch.setattr(media_hosts, 'MEDIA_CACHE', FakeMediaCache())
+    monkeypatch.setattr(media_hosts, 'UPLOAD_SESSIONS', UploadSessions(str(tmp_path / 'upload_sessions.json')))
+    host = S3Host(os.environ.get('S3_TEST_BUCKET', 'test'), os.environ.get('S3_TEST_ACCESS_KEY'),
+                  os.environ.get('S3_TEST_SECRET_KEY'), endpoint_url=os.environ['S3_TEST_ENDPOINT'],
+                  prefix=f"tests/{uuid.uuid4().hex}/", part_size=PART)
+    path = make_file(tmp_path, 2 * PART + 1234)
+    assert host.host(path) is not None
+    key = host.object_key(path)
+    stored = host.client.get_object(Bucket=host.bucket, Key=key)['Body'].read()
+    assert stored == open(path, 'rb').read()
+    host.client.delete_object(Bucket=host.bucket, Key=key)
@@ -0,0 +1,70 @@
+import os
+import glob
+import shutil
+import tempfile
+import subprocess
+import pytest
+
+import poster
+from poster import MediaProcessor
+from compression_model import CompressionModel
+from moviepy.config import get_setting
+
+FFMPEG = get_setting("FFMPEG_BINARY")
+
+pytestmark = pytest.mark.skipif(not shutil.which(FFMPEG), reason="needs ffmpeg")
+
+def make_clip(path, audio, seconds=45):
+    inputs = ['-f', 'lavfi', '-i', f"testsrc=size=320x240:rate=15:duration={seconds}"]
+    if audio:
+        inputs += ['-f', 'lavfi', '-i', f"sine=frequency=440:duration={seconds}", '-c:a', 'aac']
+    subprocess.run([FFMPEG, '-y', '-loglevel', 'error'] + inputs +
+                   ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '10', str(path)], check=True)
+    return str(path)
+
+def streams(path):
+    output = subprocess.run([FFMPEG, '-hide_banner', '-i', path], capture_output=True, text=True).stderr
+    return [kind for kind in ('Video', 'Audio') if f": {kind}:" in output]
+
+def leftover_work_dirs():
+    return glob.glob(os.path.join(tempfile.gettempdir(), 'social_poster_segments_*'))
+
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, tmp_path):
+    # Short clips and a single-core runner still take the segmented path
+    monkeypatch.setattr(MediaProcessor, 'SEGMENT_MIN_DURATION', 10)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 4)
+    monkeypatch.setattr(poster, 'COMPRESSION_MODEL', CompressionModel(str(tmp_path / 'compression_history.db')))
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+
+@pytest.mark.parametrize('audio', [True, False], ids=['with_audio', 'no_audio'])
+def test_segmented_encode_fits_limit(tmp_path, audio):
+    source = make_clip(tmp_path / 'clip.mp4', audio)
+    max_size = os.path.getsize(source) // 4
+    output = MediaProcessor.compress_video_segmented(source, max_size)
+    assert output and output != source
+    assert os.path.getsize(output) <= max_size
+    assert streams(output) == (['Video', 'Audio'] if audio else ['Video'])
+    info = poster.MediaProbe.probe_video(output)
+    assert abs(info['duration'] - 45) < 1
+    assert leftover_work_dirs() == []
+
+def test_failed_part_falls_back_to_single_pass(monkeypatch, tmp_path):
+    source = make_clip(tmp_path / 'clip.mp4', audio=True)
+    max_size = os.path.getsize(source) // 4
+    run_ffmpeg = MediaProcessor.run_ffmpeg
+    def failing(args, stop=None):
+        if args[1].endswith('part0001.mkv'):
+            raise subprocess.CalledProcessError(1, args, stderr=b"encoder crashed")
+        run_ffmpeg(args, stop)
+    monkeypatch.setattr(MediaProcessor, 'run_ffmpeg', staticmethod(failing))
+    assert MediaProcessor.compress_video_segmented(source, max_size) is None
+    assert leftover_work_dirs() == []
+    assert glob.glob(str(tmp_path / 'clip_compressed_*')) == []
+
+    # A single pass has no second try, so it only has to have compressed; the caller reports an overshoot
+    output = MediaProcessor.compress_video(source, max_size)
+    assert output != source and os.path.exists(output)
+    assert os.path.getsize(output) < os.path.getsize(source) // 2
+    assert streams(output) == ['Video', 'Audio']
+    assert leftover_work_dirs() == []